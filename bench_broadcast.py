@@ -0,0 +1,113 @@
+# Broadcast mode benchmark
+# Runs a GamePad in broadcast mode and several GamePadServers listening to
+# it on the simulator, presses Up with a bouncing contact, and times how
+# long each robot takes to see the press:
+#
+#   latency   press -> report applied by a robot (every robot, every press)
+#   missed    presses a robot never saw before the button was let go
+#
+# There is no connection to set up, so the first press can come straight
+# after the robots start. Advertising packets are lost with --loss like any
+# other packet; a lost one is made up for by the next advertising event.
+#
+# Run on the host:  python bench_broadcast.py --robots 3 --loss 0.2 --json results.json
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+
+import sim
+from sim.bench import now_us, summarise
+
+
+async def run(robots, presses, seed):
+    pad = sim.Board("pad")
+    with pad:
+        from gamepad import GamePad
+        gamepad = GamePad(broadcast=True)
+        asyncio.create_task(gamepad.main())
+
+    from gamepad_protocol import BUTTON_UP
+    servers = []
+    seen = {}  # server index -> time the current press arrived
+
+    def watch(index, server):
+        apply_report = server.apply_report
+
+        def applied(missed=0):
+            apply_report(missed)
+            # A press whose reports were lost still counts once its changed bit arrives
+            if (server.pressed_mask | missed) & BUTTON_UP:
+                seen.setdefault(index, now_us())
+
+        server.apply_report = applied
+
+    for index in range(robots):
+        with sim.Board(f"robot{index}"):
+            from gamepad import GamePadServer
+            server = GamePadServer(broadcast=True)
+            watch(index, server)
+            asyncio.create_task(server.main())
+            servers.append(server)
+
+    up = pad.pin(8)
+    rng = random.Random(seed)
+    samples = []
+    missed = 0
+    for _ in range(presses):
+        await asyncio.sleep(rng.uniform(0.2, 0.4))
+        seen.clear()
+        pressed_at = now_us()
+        await up.play(sim.machine.bounce(0))
+        await asyncio.sleep(rng.uniform(0.05, 0.15))
+        await up.play(sim.machine.bounce(1))
+        for index in range(robots):
+            if index in seen:
+                samples.append(seen[index] - pressed_at)
+            else:
+                missed += 1
+
+    return samples, missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broadcast mode press latency benchmark on the simulator")
+    parser.add_argument("--robots", type=int, default=3)
+    parser.add_argument("--presses", type=int, default=20)
+    parser.add_argument("--loss", type=float, default=0.0, help="packet loss probability")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write machine readable results to this file")
+    args = parser.parse_args()
+
+    sim.install(sim.Radio(loss=args.loss, seed=args.seed))
+    console = io.StringIO()
+    with contextlib.redirect_stdout(console):
+        samples, missed = asyncio.run(run(args.robots, args.presses, args.seed))
+
+    results = {
+        "benchmark": "broadcast_latency",
+        "config": {
+            "robots": args.robots,
+            "presses": args.presses,
+            "loss": args.loss,
+            "seed": args.seed,
+        },
+        "units": "ms",
+        "latency": summarise(samples, 1000),
+        "missed": missed,
+    }
+
+    row = results["latency"]
+    print(f"{'':<10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms, {args.presses} presses x {args.robots} robots)")
+    print(f"{'latency':<10}{row['p50']:9.2f}{row['p95']:9.2f}{row['p99']:9.2f}{row['max']:9.2f}")
+    print(f"missed {missed}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
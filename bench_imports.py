@@ -0,0 +1,106 @@
+# Import cost per entry point
+# Measures the time and heap taken by the first import of each way into the
+# GamePad code, and which of the repo's modules each one drags in.
+#
+# On the host every entry point is imported in a fresh interpreter on the
+# simulator:
+#
+#     python bench_imports.py --json results.json
+#
+# On a Pico a module can only be imported cold once per boot, so set ENTRY
+# below, soft reset (Ctrl-D) and run the script; repeat for each entry point.
+
+import sys
+
+ENTRY = "from gamepad import GamePadServer"
+
+ENTRY_POINTS = (
+    "import gamepad_protocol",
+    "import gamepad_receiver",
+    "import gamepad_controller",
+    "from gamepad import GamePadServer",
+    "from gamepad import GamePad",
+)
+
+# The repo's modules, to show what each entry point loads
+MODULES = (
+    "gamepad", "gamepad_protocol", "gamepad_receiver", "gamepad_controller",
+    "gamepad_display", "ssd1306", "metrics",
+)
+
+
+def loaded():
+    return [name for name in MODULES if name in sys.modules]
+
+
+def device_main():
+    import gc
+    from time import ticks_us, ticks_diff
+
+    gc.collect()
+    free = gc.mem_free()
+    start = ticks_us()
+    exec(ENTRY)
+    elapsed = ticks_diff(ticks_us(), start)
+    gc.collect()
+    print(f"{ENTRY}: {elapsed / 1000:.1f} ms, {free - gc.mem_free()} bytes of heap")
+    print("loaded:", ", ".join(loaded()))
+
+
+def child(entry):
+    import json
+    import time
+    import tracemalloc
+
+    import sim
+    sim.install()
+    with sim.Board("bench"):
+        tracemalloc.start()
+        start = time.perf_counter()
+        exec(entry)
+        elapsed = time.perf_counter() - start
+        kept, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(json.dumps({"ms": elapsed * 1000, "kept_kb": kept / 1024, "loaded": loaded()}))
+
+
+def host_main():
+    import argparse
+    import json
+    import statistics
+    import subprocess
+
+    parser = argparse.ArgumentParser(description="Import time and memory per GamePad entry point")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="write machine readable results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    results = {"benchmark": "import_cost", "config": {"runs": args.runs}, "entry_points": {}}
+    print(f"{'entry point':<36}{'median ms':>10}{'kept KB':>9}  modules loaded")
+    for entry in ENTRY_POINTS:
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", entry], capture_output=True, text=True, check=True
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        row = {
+            "median_ms": statistics.median(run["ms"] for run in runs),
+            "kept_kb": statistics.median(run["kept_kb"] for run in runs),
+            "loaded": runs[-1]["loaded"],
+        }
+        results["entry_points"][entry] = row
+        print(f"{entry:<36}{row['median_ms']:10.2f}{row['kept_kb']:9.1f}  {', '.join(row['loaded'])}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if sys.implementation.name == "micropython":
+    device_main()
+elif __name__ == "__main__":
+    host_main()
@@ -0,0 +1,146 @@
+# Press-to-motor latency benchmark
+# Runs the real GamePad and the test_gamepad.py robot loop against each other
+# on the simulator, presses Up with a bouncing contact, and times every stage
+# until the left motor's PWM duty changes:
+#
+#   scan      press -> debounced change out of ButtonEvents
+#   send      debounced change -> notification queued on the GamePad
+#   link      notification -> report applied by the GamePadServer
+#   consumer  report applied -> motor PWM duty written by the robot loop
+#   total     press -> motor PWM duty written
+#
+# All boards share one event loop on the host, so a blocking call on one of
+# them delays the others too.
+#
+# --profile builds the GamePad with a connection profile ("racing",
+# "battery"); the robot then connects at the profile's interval instead of
+# --interval-ms.
+#
+# Run on the host:  python bench_latency.py --presses 50 --json results.json
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+
+import sim
+from sim.bench import now_us, summarise, wait_until
+
+STAGES = ("scan", "send", "link", "consumer", "total")
+
+
+def stamp(stamps, name, wrapped):
+    """
+    Wraps a method so the first call after each press is timestamped.
+    """
+    if asyncio.iscoroutinefunction(wrapped):
+        async def timed(*args, **kwargs):
+            result = await wrapped(*args, **kwargs)
+            stamps.setdefault(name, now_us())
+            return result
+    else:
+        def timed(*args, **kwargs):
+            stamps.setdefault(name, now_us())
+            return wrapped(*args, **kwargs)
+    return timed
+
+
+async def run(presses, seed, profile=None):
+    pad = sim.Board("pad")
+    robot = sim.Board("robot")
+    stamps = {}
+
+    with pad:
+        from gamepad import GamePad
+        gamepad = GamePad(profile=profile)
+        events = gamepad.button_events
+        events.changed = stamp(stamps, "event", events.changed)
+        notify = gamepad.button_characteristic.notify
+        gamepad.button_characteristic.notify = stamp(stamps, "notify", notify)
+        asyncio.create_task(gamepad.main())
+
+    with robot:
+        import test_gamepad
+        from gamepad import GamePadServer
+        server = GamePadServer()
+        server.apply_report = stamp(stamps, "receive", server.apply_report)
+        asyncio.create_task(test_gamepad.monitor_gamepad(server))
+        asyncio.create_task(server.main())
+        left_pwm = test_gamepad.bot.motors[0].in2
+
+    if profile is None:
+        interval_us = 0
+    else:
+        from gamepad_protocol import PROFILES
+        interval_us = PROFILES[profile][0]
+    await wait_until(
+        lambda: server.connected and server.notifying and server.conn_interval_us == interval_us, timeout_s=15
+    )
+
+    up = pad.pin(8)
+    rng = random.Random(seed)
+    samples = {stage: [] for stage in STAGES}
+    for _ in range(presses):
+        await asyncio.sleep(rng.uniform(0.2, 0.4))
+        stamps.clear()
+        writes = len(left_pwm.history)
+        pressed_at = now_us()
+        asyncio.create_task(up.play(sim.machine.bounce(0)))
+        await wait_until(lambda: any(duty for _, duty in left_pwm.history[writes:]))
+        motor_at = next(t for t, duty in left_pwm.history[writes:] if duty)
+
+        samples["scan"].append(stamps["event"] - pressed_at)
+        samples["send"].append(stamps["notify"] - stamps["event"])
+        samples["link"].append(stamps["receive"] - stamps["notify"])
+        samples["consumer"].append(motor_at - stamps["receive"])
+        samples["total"].append(motor_at - pressed_at)
+
+        # Let go and wait for the robot to stop before the next press
+        await up.play(sim.machine.bounce(1))
+        writes = len(left_pwm.history)
+        await wait_until(lambda: any(duty == 0 for _, duty in left_pwm.history[writes:]))
+
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Press-to-motor latency benchmark on the simulator")
+    parser.add_argument("--presses", type=int, default=20)
+    parser.add_argument("--interval-ms", type=float, default=30.0, help="BLE connection interval")
+    parser.add_argument("--loss", type=float, default=0.0, help="packet loss probability")
+    parser.add_argument("--profile", choices=("racing", "battery"), help="GamePad connection profile")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write machine readable results to this file")
+    args = parser.parse_args()
+
+    sim.install(sim.Radio(interval_ms=args.interval_ms, loss=args.loss, seed=args.seed))
+    console = io.StringIO()
+    with contextlib.redirect_stdout(console):
+        samples = asyncio.run(run(args.presses, args.seed, args.profile))
+
+    results = {
+        "benchmark": "press_to_motor_latency",
+        "config": {
+            "presses": args.presses,
+            "interval_ms": args.interval_ms,
+            "loss": args.loss,
+            "profile": args.profile,
+            "seed": args.seed,
+        },
+        "units": "ms",
+        "stages": {stage: summarise(samples[stage], 1000) for stage in STAGES},
+    }
+
+    print(f"{'stage':<10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms, {args.presses} presses)")
+    for stage in STAGES:
+        row = results["stages"][stage]
+        print(f"{stage:<10}{row['p50']:9.2f}{row['p95']:9.2f}{row['p99']:9.2f}{row['max']:9.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
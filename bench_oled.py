@@ -0,0 +1,129 @@
+# OLED benchmark
+# Counts the bus transactions and bytes a typical GamePad status update costs,
+# and the SPI re-inits and heap allocation per frame of the SPI driver.
+# Uses fake buses, so it runs on any MicroPython board without a display.
+
+import gc
+from ssd1306 import SSD1306_I2C, SSD1306_SPI, claim_spi
+from gamepad_display import Screen
+
+FRAMES = 100
+
+
+class FakeI2C:
+    """Counts what the SSD1306 driver puts on the bus."""
+
+    def __init__(self):
+        self.transactions = 0
+        self.bytes = 0
+
+    def writeto(self, addr, buf):
+        self.transactions += 1
+        self.bytes += len(buf)
+
+    def writevto(self, addr, bufs):
+        self.transactions += 1
+        for buf in bufs:
+            self.bytes += len(buf)
+
+
+class FakeSPI:
+    """Counts SPI configuration changes and writes."""
+
+    def __init__(self):
+        self.inits = 0
+        self.writes = 0
+        self.bytes = 0
+
+    def init(self, **kwargs):
+        self.inits += 1
+
+    def write(self, buf):
+        self.writes += 1
+        self.bytes += len(buf)
+
+
+class FakePin:
+    OUT = 1
+
+    def init(self, mode, value=0):
+        pass
+
+    def __call__(self, value):
+        pass
+
+
+def measure(label, oled, i2c, draw):
+    i2c.transactions = 0
+    i2c.bytes = 0
+    draw(oled)
+    print(f"{label:<22} {i2c.transactions:4} transactions {i2c.bytes:6} bytes")
+
+
+def full_redraw(oled):
+    # What monitor_buttons originally did for every press
+    oled.fill(0)
+    oled.text("A down", 0, 0)
+    oled.text("Connected", 0, 40)
+    oled.show()
+
+
+def status_update(oled):
+    # What monitor_buttons did for every press before the render task
+    oled.fill_rect(0, 0, oled.width, 8, 0)
+    oled.fill_rect(0, 40, oled.width, 8, 0)
+    oled.text("A up", 0, 0)
+    oled.text("Connected", 0, 40)
+    oled.show()
+
+
+def render_event(oled):
+    # What the render task does now, once per frame however many presses it covers
+    screen.event = "B down"
+    screen.render()
+
+
+def render_same(oled):
+    # Screen.render() with nothing changed: fill(0), three text lines, show()
+    screen.render()
+
+
+def unchanged(oled):
+    oled.show()
+
+
+i2c = FakeI2C()
+oled = SSD1306_I2C(128, 64, i2c)
+print(f"{'init_display':<22} {i2c.transactions:4} transactions {i2c.bytes:6} bytes")
+measure("full redraw", oled, i2c, full_redraw)
+measure("status update", oled, i2c, status_update)
+screen = Screen(oled)
+screen.connection = "Connected"
+screen.event = "A up"
+screen.render()
+measure("render, new event", oled, i2c, render_event)
+measure("render, same frame", oled, i2c, render_same)
+measure("show, nothing changed", oled, i2c, unchanged)
+measure("show(full=True)", oled, i2c, lambda oled: oled.show(full=True))
+
+# SPI: re-inits and allocation per frame, with and without another device using the bus
+spi = FakeSPI()
+spi_oled = SSD1306_SPI(128, 64, spi, FakePin(), FakePin(), FakePin())
+for label, shared in (("spi frame", False), ("spi frame, shared bus", True)):
+    spi.inits = 0
+    spi.writes = 0
+    gc.collect()
+    gc.disable()
+    before = gc.mem_free()
+    for frame in range(FRAMES):
+        if shared:
+            claim_spi(spi, spi)  # stands in for another driver reconfiguring the bus
+        # Clear the line first so every frame differs from the one on the display
+        spi_oled.fill_rect(0, 0, 48, 8, 0)
+        spi_oled.text("A down" if frame & 1 else "A up", 0, 0)
+        spi_oled.show()
+    allocated = before - gc.mem_free()
+    gc.enable()
+    assert spi.writes >= FRAMES, "frames were not sent to the bus, nothing was measured"
+    print(f"{label:<22} {spi.inits / FRAMES:4.1f} inits/frame {spi.writes / FRAMES:4.1f} writes/frame "
+          f"{allocated / FRAMES:6.1f} bytes allocated/frame")
@@ -0,0 +1,54 @@
+# Protocol microbenchmark
+# Compares the cost of encoding and decoding one button change in the
+# original text format and in the binary report format.
+# Run on the Pico (or any MicroPython board) with gamepad_protocol.py copied over.
+
+import gc
+from time import ticks_us, ticks_diff
+from gamepad_protocol import (
+    BUTTON_NAMES, DOWN_PAYLOADS, ReportEncoder, ReportDecoder,
+)
+
+ROUNDS = 1000
+
+
+def bench(label, func):
+    gc.collect()
+    before = gc.mem_free()
+    start = ticks_us()
+    for i in range(ROUNDS):
+        func(i)
+    elapsed = ticks_diff(ticks_us(), start)
+    allocated = before - gc.mem_free()
+    print(f"{label:<14} {elapsed / ROUNDS:8.2f} us/op {allocated / ROUNDS:8.1f} bytes/op")
+
+
+def text_encode(i):
+    # What GamePad.monitor_buttons used to build for every event
+    f"{BUTTON_NAMES[i % 11]}_down".encode()
+
+
+def text_decode(i):
+    # What GamePadServer.read_commands used to do with every payload
+    DOWN_PAYLOADS[i % 11].decode("utf-8").strip().lower()
+
+
+encoder = ReportEncoder()
+decoder = ReportDecoder()
+report = bytes(encoder.encode(0b101, 0b100, 1234))
+
+
+def binary_encode(i):
+    encoder.encode(1 << (i % 11), 1 << (i % 11), i)
+
+
+def binary_decode(i):
+    decoder.decode(report)
+
+
+gc.disable()
+bench("text encode", text_encode)
+bench("text decode", text_decode)
+bench("binary encode", binary_encode)
+bench("binary decode", binary_decode)
+gc.enable()
@@ -0,0 +1,113 @@
+# Reconnect time benchmark
+# Runs the real GamePad and GamePadServer against each other on the
+# simulator, drops the link, and times how long the robot takes to get back:
+#
+#   connect   link dropped -> GamePadServer connected again
+#   ready     link dropped -> subscribed to button reports again
+#
+# Modes:
+#
+#   cached    the server reconnects straight to the gamepad it knew and
+#             reuses the GATT handles it found last time
+#   scan      the server has forgotten the gamepad's address and has to
+#             scan for it, but still has its handles
+#   cold      the server has forgotten everything: scan and full discovery
+#
+# The gamepad advertises every 250 ms and starts again as soon as the link
+# drops. A direct connect answers its first advertising event; a scan hears
+# that event and has to wait for the next one to connect, so it costs about
+# one advertising interval more.
+#
+# Run on the host:  python bench_reconnect.py --drops 20 --json results.json
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+
+import sim
+from sim.bench import summarise, wait_until
+
+MODES = ("cached", "scan", "cold")
+STAGES = ("connect", "ready")
+
+
+async def run(drops, seed):
+    pad = sim.Board("pad")
+    robot = sim.Board("robot")
+
+    with pad:
+        from gamepad import GamePad
+        gamepad = GamePad()
+        asyncio.create_task(gamepad.main())
+
+    with robot:
+        from gamepad import GamePadServer
+        server = GamePadServer()
+        asyncio.create_task(server.main())
+
+    await wait_until(lambda: server.connected and server.notifying, timeout_s=15)
+
+    rng = random.Random(seed)
+    samples = {mode: {stage: [] for stage in STAGES} for mode in MODES}
+    for _ in range(drops):
+        for mode in MODES:
+            await asyncio.sleep(rng.uniform(0.2, 0.5))
+            if mode != "cached":
+                server.peer = None
+            if mode == "cold":
+                server.handles.clear()
+            dropped = server.connection
+            began = time.monotonic()
+            await dropped.disconnect()
+            await wait_until(lambda: server.connected and server.connection is not dropped, timeout_s=15)
+            samples[mode]["connect"].append((time.monotonic() - began) * 1000)
+            await wait_until(lambda: server.notifying, timeout_s=15)
+            samples[mode]["ready"].append((time.monotonic() - began) * 1000)
+
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconnect time benchmark on the simulator")
+    parser.add_argument("--drops", type=int, default=10, help="link drops per mode")
+    parser.add_argument("--interval-ms", type=float, default=30.0, help="BLE connection interval")
+    parser.add_argument("--loss", type=float, default=0.0, help="packet loss probability")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write machine readable results to this file")
+    args = parser.parse_args()
+
+    sim.install(sim.Radio(interval_ms=args.interval_ms, loss=args.loss, seed=args.seed))
+    console = io.StringIO()
+    with contextlib.redirect_stdout(console):
+        samples = asyncio.run(run(args.drops, args.seed))
+
+    results = {
+        "benchmark": "reconnect_time",
+        "config": {
+            "drops": args.drops,
+            "interval_ms": args.interval_ms,
+            "loss": args.loss,
+            "seed": args.seed,
+        },
+        "units": "ms",
+        "modes": {
+            mode: {stage: summarise(samples[mode][stage]) for stage in STAGES} for mode in MODES
+        },
+    }
+
+    print(f"{'mode':<8}{'stage':<9}{'p50':>9}{'p95':>9}{'max':>9}  (ms, {args.drops} drops)")
+    for mode in MODES:
+        for stage in STAGES:
+            row = results["modes"][mode][stage]
+            print(f"{mode:<8}{stage:<9}{row['p50']:9.1f}{row['p95']:9.1f}{row['max']:9.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Burgerbot startup benchmark
+# Times importing burgerbot.py, constructing a Burgerbot and sending the
+# first drive command on the simulator, and counts the peripherals set up
+# and the memory still allocated afterwards. Every run starts from a fresh
+# import on a fresh board.
+#
+#   import        import burgerbot
+#   construct     import + Burgerbot()
+#   first drive   import + Burgerbot() + mix(), only the motors get set up
+#   begin         import + Burgerbot().begin(), everything set up front
+#   begin, bare   as begin, for a robot without pen, line sensor or range finder
+#
+# Host times are not Pico times, but the ratios between scenarios carry over.
+#
+# Run on the host:  python bench_startup.py --runs 50 --json results.json
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+import sim
+
+SCENARIOS = ("import", "construct", "first drive", "begin", "begin, bare")
+
+
+def start(scenario):
+    import burgerbot
+    if scenario == "import":
+        return
+    if scenario == "begin, bare":
+        bot = burgerbot.Burgerbot(pen_pin=None, line_pin=None, range_pins=None).begin()
+    else:
+        bot = burgerbot.Burgerbot()
+    if scenario == "first drive":
+        bot.mix(75, 0)
+    elif scenario == "begin":
+        bot.begin()
+
+
+def run_once(scenario, index, trace=False):
+    for module in ("burgerbot", "motor"):
+        sys.modules.pop(module, None)
+    board = sim.Board(f"robot{index}")
+    with board:
+        if trace:
+            tracemalloc.start()
+        began = time.perf_counter()
+        start(scenario)
+        elapsed = time.perf_counter() - began
+        if trace:
+            kept, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        else:
+            kept = None
+    return elapsed * 1000, kept, len(board.pins) + len(board.pwms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Burgerbot import and startup benchmark on the simulator")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--json", help="write machine readable results to this file")
+    args = parser.parse_args()
+
+    sim.install()
+    results = {"benchmark": "burgerbot_startup", "config": {"runs": args.runs}, "scenarios": {}}
+    print(f"{'scenario':<14}{'median ms':>10}{'max ms':>9}{'kept KB':>9}{'peripherals':>13}")
+    for scenario in SCENARIOS:
+        # Tracing memory slows everything down, so it gets a run of its own
+        times = [run_once(scenario, i)[0] for i in range(args.runs)]
+        _, kept, peripherals = run_once(scenario, args.runs, trace=True)
+        row = {
+            "median_ms": statistics.median(times),
+            "max_ms": max(times),
+            "kept_kb": kept / 1024,
+            "peripherals": peripherals,
+        }
+        results["scenarios"][scenario] = row
+        print(f"{scenario:<14}{row['median_ms']:10.3f}{row['max_ms']:9.3f}{row['kept_kb']:9.1f}{row['peripherals']:13}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
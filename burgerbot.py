@@ -5,9 +5,12 @@
 
 # Import necessary modules
 import gc  # Garbage collection utilities
-from machine import Pin, PWM  # Microcontroller pin and PWM control
-from time import sleep, sleep_us, ticks_us  # Timing utilities
-from motor import Motor
+import asyncio
+from array import array
+from machine import Pin, PWM, time_pulse_us  # Microcontroller pin and PWM control
+from micropython import const
+from time import sleep, sleep_us, ticks_us, ticks_ms, ticks_add, ticks_diff  # Timing utilities
+from motor import Motor, MotorRamp, SPEED_STEPS
 
 gc.threshold(50000)  # Configure garbage collection threshold for efficient memory management
 
@@ -45,55 +48,240 @@ class Servo:
         """
         self.value(0)
 
+# Distance per us of echo: sound covers 0.343 mm/us and the echo goes there and back
+MM_PER_US = 0.343 / 2
+
+# Range finder filters
+FILTER_MEDIAN = const(0)
+FILTER_EMA = const(1)
+
 class RangeFinder:
     """
     A class to represent an ultrasonic range finder.
 
+    Run sample_task() to measure in the background: the echo is timed from
+    pin IRQs, so waiting for it never blocks the event loop, and a missing
+    echo just counts as a timeout. Readings are filtered over a small window
+    and the latest result is cached in value, which distance then returns
+    straight away.
+
     Attributes:
         trigger (Pin): The GPIO pin connected to the trigger of the sensor.
         echo (Pin): The GPIO pin connected to the echo of the sensor.
+        timeout_us (int): Longest echo to wait for, set by max_mm.
+        filter (int): FILTER_MEDIAN or FILTER_EMA.
+        value (float): Latest filtered distance in mm, None until the first echo.
+        timeouts (int): Measurements that got no echo in time.
+        running (bool): True while sample_task() runs.
     """
 
-    def __init__(self, trigger_pin: int = 0, echo_pin: int = 1):
+    def __init__(self, trigger_pin: int = 0, echo_pin: int = 1, max_mm: int = 4000,
+                 window: int = 5, filter: int = FILTER_MEDIAN, alpha: int = 64):
         """
         Initializes the RangeFinder with specified trigger and echo pins.
 
         Args:
             trigger_pin (int): The pin number for the trigger signal.
             echo_pin (int): The pin number for the echo signal.
+            max_mm (int): Furthest distance to measure; longer echoes are timeouts.
+            window (int): Number of readings the median filter looks at.
+            filter (int): FILTER_MEDIAN to reject outliers, FILTER_EMA to smooth.
+            alpha (int): EMA weight of each new reading, out of 256.
         """
         self.trigger = Pin(trigger_pin, Pin.OUT)
         self.echo = Pin(echo_pin, Pin.IN)
+        self.timeout_us = int(max_mm / MM_PER_US)
+        self.filter = filter
+        self.alpha = alpha
+        self.value = None
+        self.timeouts = 0
+        self.running = False
+        self._widths = array("L", [0] * window)  # Latest echo widths in us, oldest overwritten first
+        self._sorted = array("L", [0] * window)  # Scratch space for the median
+        self._count = 0
+        self._next = 0
+        self._ema = 0  # Echo width in us, scaled by 256
+        self._rise = None
+        self._width = 0
+        self._flag = asyncio.ThreadSafeFlag()
+
+    def _pulse(self):
+        """
+        Sends the 10 us trigger pulse.
+        """
+        self.trigger.low()
+        sleep_us(2)
+        self.trigger.high()
+        sleep_us(10)
+        self.trigger.low()
+
+    def _echo_edge(self, pin):
+        if pin.value():
+            self._rise = ticks_us()
+        elif self._rise is not None:
+            self._width = ticks_diff(ticks_us(), self._rise)
+            self._rise = None
+            self._flag.set()
+
+    def _add(self, width: int):
+        """
+        Feeds one echo width through the filter and updates value.
+        """
+        if self.filter == FILTER_EMA:
+            if self._count:
+                self._ema += ((width << 8) - self._ema) * self.alpha >> 8
+            else:
+                self._ema = width << 8
+            self._count = 1
+            filtered = self._ema >> 8
+        else:
+            widths = self._widths
+            widths[self._next] = width
+            self._next = (self._next + 1) % len(widths)
+            if self._count < len(widths):
+                self._count += 1
+            # Insertion sort of the readings so far, the window is tiny
+            ordered = self._sorted
+            count = self._count
+            for i in range(count):
+                item = widths[i]
+                j = i
+                while j and ordered[j - 1] > item:
+                    ordered[j] = ordered[j - 1]
+                    j -= 1
+                ordered[j] = item
+            filtered = ordered[count // 2]
+        self.value = round(filtered * MM_PER_US, 1)
+
+    def measure(self):
+        """
+        Takes one unfiltered reading, blocking until the echo ends or times out.
+
+        Returns:
+            float: The distance in millimeters, or None if no echo came back.
+        """
+        self._pulse()
+        width = time_pulse_us(self.echo, 1, self.timeout_us)
+        if width < 0:
+            self.timeouts += 1
+            return None
+        return round(width * MM_PER_US, 1)
+
+    async def sample_task(self, period_ms: int = 100):
+        """
+        Measures every period_ms until cancelled, keeping value up to date.
+
+        Args:
+            period_ms (int): Time between measurements, at least the echo timeout.
+        """
+        timeout_ms = self.timeout_us // 1000 + 1
+        self.echo.irq(handler=self._echo_edge, trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING)
+        self.running = True
+        try:
+            while True:
+                self._rise = None
+                self._flag.clear()
+                self._pulse()
+                try:
+                    await asyncio.wait_for_ms(self._flag.wait(), timeout_ms)
+                    if self._width <= self.timeout_us:
+                        self._add(self._width)
+                    else:
+                        self.timeouts += 1
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                await asyncio.sleep_ms(period_ms)
+        finally:
+            self.echo.irq(handler=None)
+            self.running = False
 
     @property
     def distance(self) -> float:
         """
-        Measures the distance to an object using the ultrasonic sensor.
+        Gets the distance to an object.
+
+        Returns the cached value while sample_task() runs, otherwise takes a
+        single blocking measurement.
 
         Returns:
-            float: The distance to the object in centimeters.
+            float: The distance to the object in millimeters, None if nothing was in range.
         """
-        signalon = 0
-        signaloff = 0
+        if self.running:
+            return self.value
+        return self.measure()
 
-        # Reset the trigger
-        self.trigger.low()
-        sleep_us(2)
+def _scale(value: int, factor: int, total: int = SPEED_STEPS) -> int:
+    """
+    Scales value by factor / total, rounding towards zero.
+    """
+    if value < 0:
+        return -((-value * factor) // total)
+    return (value * factor) // total
 
-        # Send a 10-microsecond pulse
-        self.trigger.high()
-        sleep_us(5)
-        self.trigger.low()
+class DriveMixer:
+    """
+    Mixes throttle and turn into speeds for a pair of drive motors.
+
+    Everything is in whole speed steps (-SPEED_STEPS to SPEED_STEPS), so a
+    control loop can call mix() every tick without any float maths.
 
-        # Measure the echo pulse duration
-        while self.echo.value() == 0:
-            signaloff = ticks_us()
-        while self.echo.value() == 1:
-            signalon = ticks_us()
+    Attributes:
+        left_motor (Motor): The left drive motor.
+        right_motor (Motor): The right drive motor.
+        trim (int): Steps per SPEED_STEPS taken off the right wheel (positive) or the left wheel (negative) to drive straight.
+        deadband (int): Throttle and turn inputs smaller than this are treated as zero.
+        left (int): Left wheel speed from the last mix(), positive drives forward.
+        right (int): Right wheel speed from the last mix(), positive drives forward.
+    """
 
-        elapsed_microseconds = signalon - signaloff
-        distance_cm = (elapsed_microseconds * 0.343) / 2
-        return round(distance_cm, 1)
+    def __init__(self, left_motor, right_motor, trim: int = 0, deadband: int = 0, right_reversed: bool = True):
+        """
+        Args:
+            left_motor (Motor): The left drive motor.
+            right_motor (Motor): The right drive motor.
+            trim (int): See the trim attribute.
+            deadband (int): See the deadband attribute.
+            right_reversed (bool): True if the right motor is mounted mirrored, so it turns backwards to drive forward.
+        """
+        self.left_motor = left_motor
+        self.right_motor = right_motor
+        self.trim = trim
+        self.deadband = deadband
+        self.left = 0
+        self.right = 0
+        self._right_sign = -1 if right_reversed else 1
+
+    def mix(self, throttle: int, turn: int):
+        """
+        Sets both wheels from a throttle and a turn.
+
+        If a wheel would need more than full speed, both wheels are scaled
+        down together so the arc keeps its shape.
+
+        Args:
+            throttle (int): Forward speed in steps, negative drives backward.
+            turn (int): Turn rate in steps, positive turns the way turn_left() does.
+        """
+        deadband = self.deadband
+        if -deadband < throttle < deadband:
+            throttle = 0
+        if -deadband < turn < deadband:
+            turn = 0
+        left = throttle + turn
+        right = throttle - turn
+        biggest = max(abs(left), abs(right))
+        if biggest > SPEED_STEPS:
+            left = _scale(left, SPEED_STEPS, biggest)
+            right = _scale(right, SPEED_STEPS, biggest)
+        trim = self.trim
+        if trim > 0:
+            right = _scale(right, SPEED_STEPS - trim)
+        elif trim < 0:
+            left = _scale(left, SPEED_STEPS + trim)
+        self.left = left
+        self.right = right
+        self.left_motor.set_step(left)
+        self.right_motor.set_step(right * self._right_sign)
 
 class Burgerbot:
     """
@@ -101,31 +289,141 @@ class Burgerbot:
 
     Attributes:
         motors (list): List of Motor objects for the robot.
+        ramp (MotorRamp): Slew-rate limit for the motors, active while ramp.task() runs.
+        mixer (DriveMixer): Throttle and turn mixer for the two drive motors.
         pen_servo (Servo): Servo object to control the pen.
         line_sensor (Pin): GPIO pin for the line sensor.
         range_finder (RangeFinder): Object for measuring distance using an ultrasonic sensor.
         __speed (float): Internal speed value for the motors.
+
+    The hardware is set up the first time it is used, or all at once by
+    begin(), so importing and constructing a Burgerbot touches no pins.
+    Subsystems whose pins are given as None are left out; using one of
+    them raises AttributeError.
+
+    forward(), backward(), turn_left() and turn_right() block for their whole
+    duration. Inside asyncio use set_velocity(), drive() or the *_async()
+    moves instead, and run motion_task() so timed drives stop on time.
     """
 
-    MOTOR_PINS = [(6, 7), (27, 26)]  # Motor PWM and direction pins
-    motors = [Motor(pwm_pin, dir_pin) for pwm_pin, dir_pin in MOTOR_PINS]  # Initialize motor objects
-    pen_servo = Servo(16)  # Initialize pen servo on pin 16
-    line_sensor = Pin(17, Pin.IN)  # Line sensor pin
-    range_finder = RangeFinder(trigger_pin=0, echo_pin=1)  # Ultrasonic range finder
+    MOTOR_PINS = ((6, 7), (27, 26))  # Motor PWM and direction pins
+    PEN_PIN = 16  # Pen servo
+    LINE_PIN = 17  # Line sensor
+    RANGE_PINS = (0, 1)  # Ultrasonic range finder trigger and echo
 
-    def __init__(self):
+    def __init__(self, motor_pins=MOTOR_PINS, pen_pin=PEN_PIN, line_pin=LINE_PIN, range_pins=RANGE_PINS):
         """
         Initializes the BurgerBot with default motor configurations and speed.
-        """
+
+        Args:
+            motor_pins (tuple): (in1, in2) pins of the left and right motors.
+            pen_pin (int): Pen servo pin, None if there is no pen.
+            line_pin (int): Line sensor pin, None if there is no line sensor.
+            range_pins (tuple): Range finder (trigger, echo) pins, None if there is no range finder.
+        """
+        self.motor_pins = motor_pins
+        self.pen_pin = pen_pin
+        self.line_pin = line_pin
+        self.range_pins = range_pins
+        self._motors = None
+        self._ramp = None
+        self._mixer = None
+        self._pen_servo = None
+        self._line_sensor = None
+        self._range_finder = None
         self.speed = 0.5
+        self._stop_at = None  # ticks_ms() deadline of the current timed drive
+        self._move = 0  # Bumped on every new motion, so a finished move can't stop a newer one
+        self._motion = asyncio.Event()
+
+    def begin(self):
+        """
+        Sets up all the fitted hardware now rather than on first use.
+
+        Returns:
+            Burgerbot: The robot, so it can be chained onto the constructor.
+        """
+        self.mixer  # Also creates the motors
+        self.ramp
+        if self.pen_pin is not None:
+            self.pen_servo
+        if self.line_pin is not None:
+            self.line_sensor
+        if self.range_pins is not None:
+            self.range_finder
+        return self
+
+    @property
+    def motors(self) -> list:
+        """
+        The left and right drive motors.
+        """
+        if self._motors is None:
+            self._motors = [Motor(in1_pin, in2_pin) for in1_pin, in2_pin in self.motor_pins]
+        return self._motors
+
+    @property
+    def ramp(self):
+        """
+        Slew-rate limit for the motors, active while ramp.task() runs.
+        """
+        if self._ramp is None:
+            self._ramp = MotorRamp(self.motors)
+        return self._ramp
+
+    @property
+    def mixer(self):
+        """
+        Throttle and turn mixer for the two drive motors.
+        """
+        if self._mixer is None:
+            motors = self.motors
+            self._mixer = DriveMixer(motors[0], motors[1])
+        return self._mixer
+
+    @property
+    def pen_servo(self):
+        """
+        The pen servo.
+        """
+        if self._pen_servo is None:
+            if self.pen_pin is None:
+                raise AttributeError("This Burgerbot has no pen servo")
+            self._pen_servo = Servo(self.pen_pin)
+        return self._pen_servo
+
+    @property
+    def line_sensor(self):
+        """
+        The line sensor pin.
+        """
+        if self._line_sensor is None:
+            if self.line_pin is None:
+                raise AttributeError("This Burgerbot has no line sensor")
+            self._line_sensor = Pin(self.line_pin, Pin.IN)
+        return self._line_sensor
+
+    @property
+    def range_finder(self):
+        """
+        The ultrasonic range finder.
+        """
+        if self._range_finder is None:
+            if self.range_pins is None:
+                raise AttributeError("This Burgerbot has no range finder")
+            trigger_pin, echo_pin = self.range_pins
+            self._range_finder = RangeFinder(trigger_pin=trigger_pin, echo_pin=echo_pin)
+        return self._range_finder
 
     @property
     def distance(self) -> float:
         """
         Gets the distance from the range finder sensor.
 
+        Instant while range_finder.sample_task() is running.
+
         Returns:
-            float: Distance to the nearest object in centimeters.
+            float: Distance to the nearest object in millimeters, None if nothing was in range.
         """
         return self.range_finder.distance
 
@@ -164,6 +462,8 @@ class Burgerbot:
         Args:
             duration (float): Time in seconds to drive forward.
         """
+        self._stop_at = None
+        self._move += 1
         self.motors[0].speed(self.speed)
         self.motors[1].speed(-self.speed)
         sleep(duration)
@@ -175,6 +475,8 @@ class Burgerbot:
         Args:
             duration (float): Time in seconds to drive backward.
         """
+        self._stop_at = None
+        self._move += 1
         self.motors[0].speed(-self.speed)
         self.motors[1].speed(self.speed)
       
@@ -187,6 +489,8 @@ class Burgerbot:
         Args:
             duration (float): Time in seconds to turn left.
         """
+        self._stop_at = None
+        self._move += 1
         self.motors[0].speed(self.speed)
         self.motors[1].speed(self.speed)
         sleep(duration)
@@ -198,6 +502,8 @@ class Burgerbot:
         Args:
             duration (float): Time in seconds to turn right.
         """
+        self._stop_at = None
+        self._move += 1
         self.motors[0].speed(-self.speed)
         self.motors[1].speed(-self.speed)
         sleep(duration)
@@ -206,9 +512,130 @@ class Burgerbot:
         """
         Stops the robot by disabling both motors.
         """
+        self._stop_at = None
+        self._move += 1
         for m in self.motors:
             m.disable()
 
+    def set_velocity(self, left: float, right: float):
+        """
+        Drives the wheels until told otherwise, without blocking.
+
+        Args:
+            left (float): Left wheel speed (-1 to 1), positive drives forward.
+            right (float): Right wheel speed (-1 to 1), positive drives forward.
+        """
+        self.drive(left, right)
+
+    def drive(self, left: float, right: float, duration: float = None):
+        """
+        Drives the wheels and returns straight away.
+
+        Calling it again before the duration is up replaces the move and its
+        deadline, so refreshing it from a control loop keeps the robot going
+        and it stops on its own if the loop stalls.
+
+        Args:
+            left (float): Left wheel speed (-1 to 1), positive drives forward.
+            right (float): Right wheel speed (-1 to 1), positive drives forward.
+            duration (float): Seconds until motion_task() stops the robot, None to keep going.
+        """
+        self.motors[0].speed(left)
+        self.motors[1].speed(-right)
+        self._move += 1
+        if duration is None:
+            self._stop_at = None
+        else:
+            self._stop_at = ticks_add(ticks_ms(), int(duration * 1000))
+        self._motion.set()
+
+    def mix(self, throttle: int, turn: int):
+        """
+        Sets the whole drivetrain from a throttle and a turn, without blocking.
+
+        Replaces any timed drive. Meant to be called once per control tick.
+
+        Args:
+            throttle (int): Forward speed in steps (-SPEED_STEPS to SPEED_STEPS), negative drives backward.
+            turn (int): Turn rate in steps, positive turns the way turn_left() does.
+        """
+        self._stop_at = None
+        self._move += 1
+        self.mixer.mix(throttle, turn)
+
+    async def move(self, left: float, right: float, duration: float):
+        """
+        Drives the wheels for duration seconds, letting other tasks run meanwhile.
+
+        The robot stops at the end unless another motion replaced this one.
+
+        Args:
+            left (float): Left wheel speed (-1 to 1), positive drives forward.
+            right (float): Right wheel speed (-1 to 1), positive drives forward.
+            duration (float): Time in seconds to drive.
+        """
+        self.drive(left, right)
+        move = self._move
+        await asyncio.sleep_ms(int(duration * 1000))
+        if self._move == move:
+            self.stop()
+
+    async def forward_async(self, duration: float = 0.5):
+        """
+        Drives the robot forward for a specified duration without blocking other tasks.
+
+        Args:
+            duration (float): Time in seconds to drive forward.
+        """
+        await self.move(self.speed, self.speed, duration)
+
+    async def backward_async(self, duration: float = 0.5):
+        """
+        Drives the robot backward for a specified duration without blocking other tasks.
+
+        Args:
+            duration (float): Time in seconds to drive backward.
+        """
+        await self.move(-self.speed, -self.speed, duration)
+
+    async def turn_left_async(self, duration: float = 0.5):
+        """
+        Turns the robot left for a specified duration without blocking other tasks.
+
+        Args:
+            duration (float): Time in seconds to turn left.
+        """
+        await self.move(self.speed, -self.speed, duration)
+
+    async def turn_right_async(self, duration: float = 0.5):
+        """
+        Turns the robot right for a specified duration without blocking other tasks.
+
+        Args:
+            duration (float): Time in seconds to turn right.
+        """
+        await self.move(-self.speed, self.speed, duration)
+
+    async def motion_task(self):
+        """
+        Stops timed drives when their duration is up.
+
+        Sleeps until the nearest deadline, or until a new motion is started.
+        """
+        while True:
+            self._motion.clear()
+            if self._stop_at is None:
+                await self._motion.wait()
+                continue
+            remaining = ticks_diff(self._stop_at, ticks_ms())
+            if remaining <= 0:
+                self.stop()
+                continue
+            try:
+                await asyncio.wait_for_ms(self._motion.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
     def left_motor(self, speed: float):
         """
         Sets the speed of the left motor.
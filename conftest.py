@@ -0,0 +1,10 @@
+# pytest configuration
+# The tests in tests/ run the real modules under CPython on the simulator in
+# sim/. The test_*.py scripts at the top level are device scripts for the
+# Pico, so they and the old scripts in archive/ are not collected.
+
+import sim
+
+collect_ignore = ["archive", "test_buttons.py", "test_gamepad.py", "test_oled.py"]
+
+sim.install()
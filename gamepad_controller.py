@@ -0,0 +1,539 @@
+# GamePad controller
+# The pad side: buttons, the debounced button engine, the OLED and the BLE
+# peripheral that sends reports to the robot. The OLED driver is only
+# imported when a GamePad is created.
+
+import sys
+import machine
+import aioble
+import asyncio
+from micropython import const
+import bluetooth
+from time import ticks_ms, ticks_diff
+from array import array
+import metrics
+from gamepad_protocol import (
+    FORMAT_TEXT, FORMAT_BINARY, BUTTON_NAMES, ReportEncoder, DOWN_PAYLOADS, UP_PAYLOADS,
+    PROFILES, PROFILE_CODES, NO_PROFILE, pack_profile, BROADCAST_COMPANY_ID,
+)
+
+# Pinouts
+A_BUTTON = 6
+B_BUTTON = 7
+X_BUTTON = 4
+Y_BUTTON = 5
+UP_BUTTON = 8
+DOWN_BUTTON = 9
+LEFT_BUTTON = 2
+RIGHT_BUTTON = 3
+START_BUTTON = 12
+SELECT_BUTTON = 11
+MENU_BUTTON = 10
+
+# RP2040 SIO GPIO_IN register, bit n is the input level of GPIOn
+SIO_GPIO_IN = const(0xD0000004)
+
+# How often the diagnostics characteristic is refreshed
+DIAGNOSTICS_MS = const(1000)
+
+# Broadcast mode: advertising interval, and how often the state is re-sent
+# with a new sequence number when nothing changes, so robots can tell the
+# pad is still there
+BROADCAST_INTERVAL_US = const(20_000)
+HEARTBEAT_MS = const(250)
+
+class Button:
+    """
+    One button, wired to pull its pin low when pressed.
+
+    Reads are raw pin levels. For debounced state use GamePad.pressed (or a
+    ButtonEvents over a ButtonBank), which never drops a quick repeat press.
+
+    Attributes:
+        pin (Pin): The button's input pin.
+        number (int): GPIO number of the pin.
+    """
+
+    def __init__(self, pin: int):
+        self.pin = machine.Pin(pin, machine.Pin.IN, machine.Pin.PULL_UP)
+        self.number = pin
+        self._was_pressed = False
+
+    async def is_pressed(self) -> bool:
+        """True while the pin reads pressed, without debouncing."""
+        return self.pin.value() == 0
+
+    async def state_changed(self) -> tuple[bool, bool]:
+        """Check for button press/release events, without debouncing."""
+        is_pressed = self.pin.value() == 0
+        if is_pressed and not self._was_pressed:  # Button down
+            self._was_pressed = True
+            return True, False
+        elif not is_pressed and self._was_pressed:  # Button up
+            self._was_pressed = False
+            return False, True
+        return False, False
+
+class ButtonBank:
+    """
+    Reads every button with a single GPIO register read.
+
+    On the RP2040 the whole GPIO_IN register is read once, shifted and masked
+    to the configured pins, then translated to button order with a couple of
+    6-bit lookup tables. Elsewhere (or on the host) each pin is read in turn.
+
+    Attributes:
+        buttons (list): Button objects, bit n of the masks is buttons[n].
+        state (int): Mask of the buttons held down at the last scan().
+    """
+
+    def __init__(self, buttons):
+        self.buttons = buttons
+        self.state = 0
+        numbers = [button.number for button in buttons]
+        self._shift = min(numbers)
+        self._pin_mask = 0
+        for number in numbers:
+            self._pin_mask |= 1 << (number - self._shift)
+
+        # Lookup tables translating 6 GPIO bits at a time into button bits
+        self._tables = []
+        span = max(numbers) - self._shift + 1
+        for offset in range(0, span, 6):
+            table = array("H", [0] * 64)
+            for value in range(64):
+                for index, number in enumerate(numbers):
+                    bit = number - self._shift - offset
+                    if 0 <= bit < 6 and value & (1 << bit):
+                        table[value] |= 1 << index
+            self._tables.append(table)
+        self._direct = sys.platform == "rp2"
+
+    def snapshot(self) -> int:
+        """
+        Reads the buttons without updating state.
+
+        Returns:
+            int: Mask of the buttons held down.
+        """
+        if self._direct:
+            # Buttons pull the pin low when pressed
+            gpio = ~(machine.mem32[SIO_GPIO_IN] >> self._shift) & self._pin_mask
+            pressed = 0
+            for table in self._tables:
+                pressed |= table[gpio & 0x3F]
+                gpio >>= 6
+            return pressed
+        pressed = 0
+        for index, button in enumerate(self.buttons):
+            if button.pin.value() == 0:
+                pressed |= 1 << index
+        return pressed
+
+    def scan(self) -> tuple[int, int]:
+        """
+        Reads the buttons and diffs them against the previous scan, without debouncing.
+
+        Returns:
+            tuple[int, int]: Masks of the buttons pressed and released since the last scan.
+        """
+        pressed = self.snapshot()
+        changed = pressed ^ self.state
+        self.state = pressed
+        return changed & pressed, changed & ~pressed
+
+class Debouncer:
+    """
+    Integrator debounce for every button at once.
+
+    Each button is a bit lane in the last few snapshots. A button is taken as
+    pressed once its lane is set in every sample and as released once it is
+    clear in every sample, which costs one AND and one OR per stored sample
+    however many buttons there are.
+
+    Attributes:
+        samples (int): Number of identical samples needed before a button changes state.
+        state (int): Debounced mask of the buttons held down.
+    """
+
+    def __init__(self, samples: int = 4):
+        self.samples = samples
+        self.state = 0
+        self._history = [0] * samples
+        self._next = 0
+        self._settled = True
+
+    def update(self, raw: int) -> int:
+        """
+        Adds a snapshot and updates the debounced state.
+
+        Args:
+            raw (int): Mask of the buttons read as held down.
+
+        Returns:
+            int: Mask of the buttons whose debounced state changed.
+        """
+        history = self._history
+        history[self._next] = raw
+        self._next = (self._next + 1) % self.samples
+        high = -1
+        low = 0
+        for sample in history:
+            high &= sample
+            low |= sample
+        # high: down in every sample, low: clear bits are up in every sample
+        state = (self.state | high) & low
+        changed = state ^ self.state
+        self.state = state
+        self._settled = high == low
+        return changed
+
+    @property
+    def settled(self) -> bool:
+        """
+        True when every stored sample is identical, so more samples can't change anything.
+        """
+        return self._settled
+
+class ButtonEvents:
+    """
+    Interrupt driven button engine.
+
+    Pin IRQs on every button note the time of the first edge of a burst and
+    set a ThreadSafeFlag. changed() sleeps on the flag, so nothing runs
+    while the buttons are idle. After an edge the bank is sampled every
+    sample_ms into a Debouncer until every lane has settled, then the
+    engine goes back to sleep. The samples say which buttons moved, so the
+    IRQ doesn't keep the button or level.
+
+    Attributes:
+        bank (ButtonBank): The buttons to watch, bit n of the masks is bank.buttons[n].
+        debouncer (Debouncer): Integrator fed with a bank snapshot per sample.
+        sample_ms (int): Time between samples while buttons are settling.
+        pressed (int): Debounced mask of the buttons held down.
+        timestamp (int): ticks_ms() of the first edge behind the last reported change.
+    """
+
+    def __init__(self, bank, samples: int = 4, sample_ms: int = 2):
+        self.bank = bank
+        self.debouncer = Debouncer(samples)
+        self.sample_ms = sample_ms
+        self.pressed = 0
+        self.timestamp = ticks_ms()
+        self._first_edge = None  # ticks_ms() of the first edge not yet accounted for
+        self._active = True  # sample straight away to pick up buttons held at boot
+        self._flag = asyncio.ThreadSafeFlag()
+        for button in bank.buttons:
+            button.pin.irq(
+                trigger=machine.Pin.IRQ_FALLING | machine.Pin.IRQ_RISING,
+                handler=self._handler,
+            )
+
+    def _handler(self, pin):
+        self.record(ticks_ms())
+
+    def record(self, timestamp: int):
+        """
+        Notes one edge and wakes the engine, called from the pin IRQ.
+
+        Only the first edge of a burst is kept; the rest are bounces, or
+        show up in the samples anyway.
+
+        Args:
+            timestamp (int): ticks_ms() when the edge happened.
+        """
+        if self._first_edge is None:
+            self._first_edge = timestamp
+        self._flag.set()
+
+    def _sample(self) -> int:
+        first_edge = self._first_edge
+        debouncer = self.debouncer
+        changed = debouncer.update(self.bank.snapshot())
+        settled = debouncer.settled
+        self._active = not settled
+        if changed:
+            self.pressed = debouncer.state
+            self.timestamp = ticks_ms() if first_edge is None else first_edge
+        if changed or settled:
+            # The burst is over, or was a glitch the debouncer filtered out,
+            # so its time mustn't date the next press. Keep one an IRQ
+            # recorded since the snapshot
+            if self._first_edge == first_edge:
+                self._first_edge = None
+        return changed
+
+    async def changed(self) -> tuple[int, int]:
+        """
+        Waits for debounced button changes.
+
+        Returns:
+            tuple[int, int]: The pressed mask and the mask of buttons that changed.
+        """
+        while True:
+            if self._active:
+                await asyncio.sleep_ms(self.sample_ms)
+            else:
+                await self._flag.wait()
+            changed = self._sample()
+            if changed:
+                return self.pressed, changed
+
+class GamePad:
+    
+    def __init__(self, diagnostics: bool = False, profile: str = None, broadcast: bool = False):
+        """
+        Initialise the GamePad.
+
+        Args:
+            diagnostics (bool): Publish the metrics counters over BLE.
+            profile (str): Connection parameters to ask the robot for, a key of
+                PROFILES ("racing" or "battery"); None leaves them to the robot.
+            broadcast (bool): Advertise the button state to any number of robots
+                instead of accepting a connection.
+        """
+        if profile is not None and profile not in PROFILES:
+            raise ValueError(f"Unknown connection profile {profile!r}")
+        self.buttons = {
+            "A": Button(6),
+            "B": Button(7),
+            "X": Button(4),
+            "Y": Button(5),
+            "Up": Button(8),
+            "Down": Button(9),
+            "Left": Button(2),
+            "Right": Button(3),
+            "Start": Button(12),
+            "Select": Button(11),
+            "Menu": Button(10),
+        }
+        self.button_bank = ButtonBank([self.buttons[name] for name in BUTTON_NAMES])
+        self.button_events = ButtonEvents(self.button_bank)
+        self.led = machine.Pin("LED", machine.Pin.OUT)
+        self.connected = False
+        self.connection = None
+        self.pressed = 0
+        self.format = FORMAT_TEXT
+        self.encoder = ReportEncoder()
+        self.diagnostics = diagnostics
+        self.profile = profile
+        self.broadcast = broadcast
+        self.connections = 0
+        self._unsent = 0  # Changes not yet broadcast
+        self._state_changed = asyncio.Event()
+
+        # UUIDs and constants
+        self._GENERIC_UUID = bluetooth.UUID(0x1848)
+        self._BUTTON_UUID = bluetooth.UUID(0x2A6E)
+        self._FORMAT_UUID = bluetooth.UUID(0x2A6F)
+        self._DIAGNOSTICS_UUID = bluetooth.UUID(0x2A70)
+        self._PPCP_UUID = bluetooth.UUID(0x2A04)
+
+        # BLE Service and Characteristic
+        self.device_info = aioble.Service(self._GENERIC_UUID)
+        self.button_characteristic = aioble.Characteristic(
+            self.device_info,
+            self._BUTTON_UUID,
+            read=True,
+            notify=True,
+        )
+        # The central writes the report format it wants; reads return the newest
+        # we support and which profile, if any, the PPCP characteristic holds
+        profile_code = NO_PROFILE if profile is None else PROFILE_CODES[profile]
+        self._newest_format = bytes((FORMAT_BINARY, profile_code))
+        self.format_characteristic = aioble.Characteristic(
+            self.device_info,
+            self._FORMAT_UUID,
+            read=True,
+            write=True,
+            initial=self._newest_format,
+        )
+        if profile is not None:
+            # MicroPython can't ask for new parameters from the peripheral side,
+            # so the robot reads this and connects with them
+            self.ppcp_characteristic = aioble.Characteristic(
+                self.device_info,
+                self._PPCP_UUID,
+                read=True,
+                initial=pack_profile(PROFILES[profile]),
+            )
+        if diagnostics:
+            # Metrics counters as little endian uint32s, see metrics.COUNTER_NAMES
+            metrics.enable()
+            self._diagnostics_buffer = metrics.pack()
+            self.diagnostics_characteristic = aioble.Characteristic(
+                self.device_info,
+                self._DIAGNOSTICS_UUID,
+                read=True,
+                initial=self._diagnostics_buffer,
+            )
+
+        # Register the service
+        aioble.register_services(self.device_info)
+
+        # Setup OLED, the driver is imported here so only the pad pays for it
+        from machine import I2C
+        from ssd1306 import SSD1306_I2C
+        from gamepad_display import Screen
+        id = 0
+        sda = 0
+        scl = 1
+        i2c = I2C(sda=sda, scl=scl, id=id)
+        self.oled = SSD1306_I2C(128, 64, i2c)
+        self.screen = Screen(self.oled)
+        self.screen.connection = "Disconnected"
+        # Event lines for every button, (released, pressed), built once
+        self._event_text = [(f"{name} up", f"{name} down") for name in BUTTON_NAMES]
+
+        print("GamePad initialized")
+
+    async def monitor_buttons(self):
+        """Wait for button edges and send them to the central."""
+        while True:
+            self.pressed, changed = await self.button_events.changed()
+            if self.broadcast:
+                self._unsent |= changed
+                self._state_changed.set()
+            elif self.connected:
+                try:
+                    if self.format == FORMAT_BINARY:
+                        # One report carries every change from this wake
+                        report = self.encoder.encode(self.pressed, changed, self.button_events.timestamp)
+                        self.button_characteristic.write(report)
+                        self.button_characteristic.notify(self.connection)
+                        if metrics.enabled:
+                            metrics.count(metrics.EVENTS_SENT)
+                    else:
+                        for index in range(len(BUTTON_NAMES)):
+                            bit = 1 << index
+                            if changed & bit:
+                                if self.pressed & bit:
+                                    self.button_characteristic.write(DOWN_PAYLOADS[index])
+                                else:
+                                    self.button_characteristic.write(UP_PAYLOADS[index])
+                                self.button_characteristic.notify(self.connection)
+                                if metrics.enabled:
+                                    metrics.count(metrics.EVENTS_SENT)
+                    if metrics.enabled:
+                        latency = ticks_diff(ticks_ms(), self.button_events.timestamp)
+                        metrics.observe(metrics.BUTTON_TO_NOTIFY, latency * 1000)
+                except Exception as e:
+                    # The central went away mid-send, peripheral_task picks up the disconnect
+                    if metrics.enabled:
+                        metrics.count(metrics.NOTIFY_FAILED)
+                    print(f"Notify failed: {e}")
+
+            # The screen and console only get updated once the central has been told
+            for index, name in enumerate(BUTTON_NAMES):
+                bit = 1 << index
+                if changed & bit:
+                    down = bool(self.pressed & bit)
+                    print(f"Button {name} pressed down" if down else f"Button {name} released")
+                    self.screen.event = self._event_text[index][down]
+
+    async def peripheral_task(self):
+        """Handle BLE advertising and connections."""
+        print("Peripheral task started")
+        while True:
+            self.connected = False
+            async with await aioble.advertise(
+                250_000,
+                name="KevsRobots",
+                services=[self._GENERIC_UUID],
+            ) as self.connection:
+                self.screen.connection = "Connected"
+                print("Connection from", self.connection.device)
+                self.connected = True
+                self.connections += 1
+                if metrics.enabled and self.connections > 1:
+                    metrics.count(metrics.RECONNECTS)
+
+                await self.connection.disconnected(timeout_ms=None)
+                self.format = FORMAT_TEXT
+                self.screen.connection = "Disconnected"
+                print("Disconnected")
+
+    async def broadcast_task(self):
+        """Advertise the button state as manufacturer data, no connections."""
+        print("Broadcast task started")
+        self.screen.connection = "Broadcasting"
+        while True:
+            changed = self._unsent
+            self._unsent = 0
+            timestamp = self.button_events.timestamp if changed else ticks_ms()
+            report = bytes(self.encoder.encode(self.pressed, changed, timestamp))
+            # Flags, name and report take 27 of the advertisement's 31 bytes. The
+            # service UUID's 4 more are past what aioble puts in one and would push
+            # the report into a scan response, which passive scans never get
+            advertiser = asyncio.create_task(aioble.advertise(
+                BROADCAST_INTERVAL_US,
+                connectable=False,
+                name="KevsRobots",
+                manufacturer=(BROADCAST_COMPANY_ID, report),
+            ))
+            if changed and metrics.enabled:
+                metrics.count(metrics.EVENTS_SENT)
+                latency = ticks_diff(ticks_ms(), self.button_events.timestamp)
+                metrics.observe(metrics.BUTTON_TO_NOTIFY, latency * 1000)
+            try:
+                await asyncio.wait_for_ms(self._state_changed.wait(), HEARTBEAT_MS)
+            except asyncio.TimeoutError:
+                pass
+            self._state_changed.clear()
+            # Let the old advertisement stop before the next one starts
+            advertiser.cancel()
+            try:
+                await advertiser
+            except asyncio.CancelledError:
+                pass
+
+    async def format_task(self):
+        """Switch report format when the central asks for one."""
+        while True:
+            await self.format_characteristic.written()
+            value = self.format_characteristic.read()
+            if value and value[0] <= FORMAT_BINARY:
+                self.format = value[0]
+            else:
+                self.format = FORMAT_TEXT
+            # Put the newest format back, so the next central isn't told only text is supported
+            self.format_characteristic.write(self._newest_format)
+            print("Report format", self.format)
+
+    async def diagnostics_task(self):
+        """Refresh the diagnostics characteristic with the metrics counters."""
+        while True:
+            self.diagnostics_characteristic.write(metrics.pack(self._diagnostics_buffer))
+            await asyncio.sleep_ms(DIAGNOSTICS_MS)
+
+    async def blink_task(self):
+        """Blink the LED to indicate connection status."""
+        print("Blink task started")
+        while True:
+            self.led.toggle()
+            blink_interval = 250 if not self.connected else 1000
+            await asyncio.sleep_ms(blink_interval)
+
+    async def main(self):
+        """Run all tasks concurrently."""
+        tasks = [
+            asyncio.create_task(self.blink_task()),
+            asyncio.create_task(self.monitor_buttons()),
+            asyncio.create_task(self.screen.render_task()),
+        ]
+        if self.broadcast:
+            tasks.append(asyncio.create_task(self.broadcast_task()))
+        else:
+            tasks.append(asyncio.create_task(self.peripheral_task()))
+            tasks.append(asyncio.create_task(self.format_task()))
+        if self.diagnostics:
+            tasks.append(asyncio.create_task(self.diagnostics_task()))
+        if metrics.enabled:
+            metrics.watch_connection()
+            tasks.append(asyncio.create_task(metrics.lag_probe()))
+        await asyncio.gather(*tasks)
+
+    def begin(self):
+        """Start the gamepad."""
+        print("GamePad starting")
+        asyncio.run(self.main())
@@ -0,0 +1,91 @@
+# GamePad screen
+# Tasks describe what should be on the OLED by setting fields on a Screen;
+# render_task draws it at a bounded frame rate, so a burst of changes costs
+# one redraw and button handling never waits on the I2C bus.
+
+import asyncio
+
+
+class Screen:
+    """
+    Declarative model of the GamePad OLED.
+
+    Attributes:
+        oled (SSD1306): The display to draw on.
+        frame_ms (int): Minimum time between two redraws.
+        frames (int): Number of redraws so far.
+    """
+
+    def __init__(self, oled, frame_ms: int = 50):
+        """
+        Initializes the screen model.
+
+        Args:
+            oled (SSD1306): The display to draw on.
+            frame_ms (int): Minimum time between two redraws, 50 ms caps the display at 20 fps.
+        """
+        self.oled = oled
+        self.frame_ms = frame_ms
+        self.frames = 0
+        self._status = "GamePad"
+        self._event = ""
+        self._connection = ""
+        self._changed = asyncio.Event()
+        self._changed.set()
+
+    def _update(self, current, value):
+        if value != current:
+            self._changed.set()
+        return value
+
+    @property
+    def status(self) -> str:
+        """Top line, the name of the pad."""
+        return self._status
+
+    @status.setter
+    def status(self, value: str):
+        self._status = self._update(self._status, value)
+
+    @property
+    def event(self) -> str:
+        """Last button event, e.g. "A down"."""
+        return self._event
+
+    @event.setter
+    def event(self, value: str):
+        self._event = self._update(self._event, value)
+
+    @property
+    def connection(self) -> str:
+        """Connection state line."""
+        return self._connection
+
+    @connection.setter
+    def connection(self, value: str):
+        self._connection = self._update(self._connection, value)
+
+    def render(self):
+        """
+        Draws the current model and sends it to the display.
+        """
+        oled = self.oled
+        oled.fill(0)
+        oled.text(self._status, 0, 0)
+        oled.text(self._event, 0, 20)
+        oled.text(self._connection, 0, 40)
+        oled.show()
+        self.frames += 1
+
+    async def render_task(self):
+        """
+        Redraws the display whenever the model changes, at most once per frame_ms.
+
+        Changes made while a frame is being drawn or during the wait that
+        follows it are coalesced into the next frame.
+        """
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            self.render()
+            await asyncio.sleep_ms(self.frame_ms)
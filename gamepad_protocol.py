@@ -0,0 +1,225 @@
+# GamePad wire protocol
+# Shared by the GamePad (remote) and the GamePadServer (robot)
+#
+# Binary report layout (little endian, REPORT_SIZE bytes):
+#   0     version (REPORT_VERSION)
+#   1..2  pressed mask, one bit per button in BUTTON_NAMES order
+#   3..4  changed mask, buttons that changed since the previous report
+#   5     sequence number (wraps at 256)
+#   6..7  timestamp in ms (ticks_ms() & 0xFFFF)
+#
+# The original text payloads ("A_down", "A_up", ...) are kept as FORMAT_TEXT.
+# The GamePad sends text until the central writes FORMAT_BINARY to the
+# format characteristic, so older robots keep working unchanged.
+#
+# Reading the format characteristic returns:
+#   0     newest report format the GamePad supports
+#   1     code of its connection profile (PROFILE_CODES, NO_PROFILE for none)
+# Robots read it on every connection anyway, so the profile code tells one
+# with cached handles whether the PPCP below appeared, changed or went away.
+#
+# A GamePad built with a connection profile publishes it as a Peripheral
+# Preferred Connection Parameters value (PPCP, uint16 little endian each):
+#   0..1  minimum connection interval, 1.25 ms units
+#   2..3  maximum connection interval, 1.25 ms units
+#   4..5  peripheral latency, connection events
+#   6..7  supervision timeout, 10 ms units
+#
+# In broadcast mode the GamePad doesn't accept connections; it advertises
+# the latest binary report as manufacturer data under BROADCAST_COMPANY_ID
+# next to its name, and robots pick it up from a passive scan. Every
+# advertising event repeats the report, so robots drop reports whose sequence
+# number isn't ahead of the last one, modulo 256. A bigger step means reports
+# were lost; a changed bit whose button looks no different went both ways.
+
+from micropython import const
+
+# Report formats, negotiated through the format characteristic
+FORMAT_TEXT = const(0)
+FORMAT_BINARY = const(1)
+
+REPORT_VERSION = const(1)
+REPORT_SIZE = const(8)
+
+# Bit order of the buttons in the pressed and changed masks
+BUTTON_NAMES = ("A", "B", "X", "Y", "Up", "Down", "Left", "Right", "Start", "Select", "Menu")
+BUTTON_BITS = {name: 1 << i for i, name in enumerate(BUTTON_NAMES)}
+BUTTON_MASK = const(0x7FF)
+
+# Button bits, for testing masks without any string work
+BUTTON_A = const(0x001)
+BUTTON_B = const(0x002)
+BUTTON_X = const(0x004)
+BUTTON_Y = const(0x008)
+BUTTON_UP = const(0x010)
+BUTTON_DOWN = const(0x020)
+BUTTON_LEFT = const(0x040)
+BUTTON_RIGHT = const(0x080)
+BUTTON_START = const(0x100)
+BUTTON_SELECT = const(0x200)
+BUTTON_MENU = const(0x400)
+
+# Index of each button in BUTTON_NAMES, by name and by bit
+BUTTON_INDEX = {}
+for _i, _name in enumerate(BUTTON_NAMES):
+    BUTTON_INDEX[_name] = _i
+    BUTTON_INDEX[1 << _i] = _i
+del _i, _name
+
+# Text payloads sent by the GamePad, and the commands the GamePadServer exposes
+DOWN_PAYLOADS = tuple(f"{name}_down".encode() for name in BUTTON_NAMES)
+UP_PAYLOADS = tuple(f"{name}_up".encode() for name in BUTTON_NAMES)
+DOWN_COMMANDS = tuple(f"{name.lower()}_down" for name in BUTTON_NAMES)
+UP_COMMANDS = tuple(f"{name.lower()}_up" for name in BUTTON_NAMES)
+TEXT_COMMANDS = {}
+for _i in range(len(BUTTON_NAMES)):
+    TEXT_COMMANDS[DOWN_COMMANDS[_i]] = (1 << _i, True)
+    TEXT_COMMANDS[UP_COMMANDS[_i]] = (1 << _i, False)
+del _i
+
+
+# Connection parameter profiles a GamePad can ask for:
+# (connection interval in us, peripheral latency, supervision timeout in ms)
+PROFILES = {
+    "racing": (7500, 0, 2000),  # Shortest interval BLE allows, a report waits at most 7.5 ms
+    "battery": (50000, 4, 6000),  # The pad may sleep through 4 events in 5 while idle
+}
+PPCP_SIZE = const(8)
+
+# Profile codes reported on the format characteristic
+NO_PROFILE = const(0)
+PROFILE_CODES = {"racing": 1, "battery": 2}
+
+# Manufacturer data company ID for broadcast reports; 0xFFFF is reserved for testing and internal use
+BROADCAST_COMPANY_ID = const(0xFFFF)
+
+
+def pack_profile(profile) -> bytes:
+    """
+    Encodes a connection profile as a PPCP value.
+
+    Args:
+        profile (tuple): (interval_us, latency, timeout_ms), e.g. PROFILES["racing"].
+
+    Returns:
+        bytes: The PPCP value, with the same minimum and maximum interval.
+    """
+    interval_us, latency, timeout_ms = profile
+    interval = interval_us // 1250
+    timeout = timeout_ms // 10
+    return bytes((
+        interval & 0xFF, interval >> 8,
+        interval & 0xFF, interval >> 8,
+        latency & 0xFF, latency >> 8,
+        timeout & 0xFF, timeout >> 8,
+    ))
+
+
+def unpack_profile(data):
+    """
+    Decodes a PPCP value.
+
+    Args:
+        data (bytes): The value read from the PPCP characteristic.
+
+    Returns:
+        tuple: (interval_us, latency, timeout_ms) using the maximum interval, or None if it states no preference.
+    """
+    if not data or len(data) != PPCP_SIZE:
+        return None
+    interval = data[2] | data[3] << 8
+    if interval == 0xFFFF:
+        return None
+    return interval * 1250, data[4] | data[5] << 8, (data[6] | data[7] << 8) * 10
+
+
+class ReportEncoder:
+    """
+    Packs button state into a binary report.
+
+    The same preallocated buffer is returned by every call to encode(), so it
+    must be sent before the next report is encoded.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray(REPORT_SIZE)
+        self.buffer[0] = REPORT_VERSION
+        self.seq = 0
+
+    def encode(self, pressed: int, changed: int, timestamp: int) -> bytearray:
+        """
+        Encodes a report and advances the sequence number.
+
+        Args:
+            pressed (int): Mask of the buttons currently held down.
+            changed (int): Mask of the buttons that changed since the last report.
+            timestamp (int): Time of the change in ms, only the low 16 bits are sent.
+
+        Returns:
+            bytearray: The encoded report.
+        """
+        buf = self.buffer
+        buf[1] = pressed & 0xFF
+        buf[2] = (pressed >> 8) & 0xFF
+        buf[3] = changed & 0xFF
+        buf[4] = (changed >> 8) & 0xFF
+        buf[5] = self.seq
+        buf[6] = timestamp & 0xFF
+        buf[7] = (timestamp >> 8) & 0xFF
+        self.seq = (self.seq + 1) & 0xFF
+        return buf
+
+
+class ReportDecoder:
+    """
+    Decodes binary reports and text payloads into the same button state.
+
+    Attributes:
+        pressed (int): Mask of the buttons currently held down.
+        changed (int): Mask of the buttons changed by the last decoded payload.
+        seq (int): Sequence number of the last report.
+        timestamp (int): Remote timestamp of the last report, or None for text payloads.
+    """
+
+    def __init__(self):
+        self.pressed = 0
+        self.changed = 0
+        self.seq = 0
+        self.timestamp = None
+
+    def decode(self, data) -> bool:
+        """
+        Decodes a payload received from the GamePad.
+
+        Args:
+            data (bytes): A binary report or a text payload such as b"A_down".
+
+        Returns:
+            bool: True if the payload was understood.
+        """
+        if len(data) == REPORT_SIZE and data[0] == REPORT_VERSION:
+            self.pressed = (data[1] | (data[2] << 8)) & BUTTON_MASK
+            self.changed = (data[3] | (data[4] << 8)) & BUTTON_MASK
+            self.seq = data[5]
+            self.timestamp = data[6] | (data[7] << 8)
+            return True
+        entry = TEXT_COMMANDS.get(bytes(data).decode("utf-8").strip().lower())
+        if entry is None:
+            return False
+        bit, down = entry
+        if down:
+            self.pressed |= bit
+        else:
+            self.pressed &= ~bit
+        self.changed = bit
+        self.seq = (self.seq + 1) & 0xFF
+        self.timestamp = None
+        return True
+
+    def reset(self):
+        """
+        Forgets the button state, e.g. after a disconnect.
+        """
+        self.pressed = 0
+        self.changed = 0
+        self.timestamp = None
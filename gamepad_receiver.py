@@ -0,0 +1,928 @@
+# GamePad receiver
+# The robot side: finds the GamePad, subscribes to its reports and keeps the
+# button state and an event queue for the robot's control loop. Nothing
+# here needs the display or the button hardware.
+
+import machine
+import aioble
+from aioble.client import ClientService, ClientCharacteristic, ClientDescriptor
+import asyncio
+from micropython import const
+import bluetooth
+from time import ticks_ms, ticks_us, ticks_diff
+from array import array
+from collections import deque
+import metrics
+from gamepad_protocol import (
+    FORMAT_TEXT, FORMAT_BINARY, BUTTON_NAMES, BUTTON_BITS, BUTTON_INDEX, ReportDecoder, unpack_profile, NO_PROFILE,
+    REPORT_SIZE, REPORT_VERSION, BROADCAST_COMPANY_ID,
+    DOWN_COMMANDS, UP_COMMANDS,
+    BUTTON_A, BUTTON_B, BUTTON_X, BUTTON_Y, BUTTON_UP, BUTTON_DOWN, BUTTON_LEFT, BUTTON_RIGHT,
+    BUTTON_START, BUTTON_SELECT, BUTTON_MENU,
+)
+
+# Received input events kept for the robot's control loop
+EVENT_QUEUE_SIZE = const(128)
+
+# Notifications aioble holds between reads of the button characteristic
+NOTIFY_QUEUE_SIZE = const(32)
+
+# Input event edges
+EDGE_UP = const(0)
+EDGE_DOWN = const(1)
+
+# Remote timestamp of events that didn't carry one (text payloads, disconnects)
+NO_TIMESTAMP = const(-1)
+
+# What EventQueue does when it is full
+DROP_OLDEST = const(0)
+DROP_NEWEST = const(1)
+
+# Reconnecting: direct connects to the last gamepad before falling back to a scan
+CONNECT_TIMEOUT_MS = const(1000)
+RECONNECT_ATTEMPTS = const(4)
+BACKOFF_MIN_MS = const(100)
+BACKOFF_MAX_MS = const(2000)
+SCAN_MS = const(5000)
+
+# Broadcast mode: scan interval (listening the whole time), how long the
+# gamepad may be silent before every button is released, and how long each
+# scan runs before it is restarted, which frees aioble's per-device results
+BROADCAST_SCAN_US = const(30000)
+BROADCAST_TIMEOUT_MS = const(1000)
+BROADCAST_RESCAN_MS = const(10 * BROADCAST_TIMEOUT_MS)
+
+# Client Characteristic Configuration value that turns notifications on
+_NOTIFY_ON = b"\x01\x00"
+_FLAG_READ = const(0x0002)
+_FLAG_NOTIFY = const(0x0010)
+
+class InputEvent:
+    """
+    One button edge received from the gamepad.
+
+    Attributes:
+        button (int): Index of the button in BUTTON_NAMES.
+        edge (int): EDGE_DOWN or EDGE_UP.
+        remote_ms (int): Gamepad timestamp (16 bit ms) of the edge, or NO_TIMESTAMP.
+        local_ms (int): ticks_ms() when the report arrived.
+    """
+
+    def __init__(self):
+        self.button = 0
+        self.edge = EDGE_UP
+        self.remote_ms = NO_TIMESTAMP
+        self.local_ms = 0
+
+
+class EventQueue:
+    """
+    Fixed size ring of input events, filled by GamePadServer as reports arrive.
+
+    Nothing is allocated per event: the queue is preallocated, and pop() and
+    the async iterator hand out the same InputEvent every time, overwritten
+    with the next record. Copy its fields before taking another event.
+
+    Attributes:
+        size (int): Number of events the queue holds.
+        policy (int): DROP_OLDEST or DROP_NEWEST, what push() does when the queue is full.
+        overflows (int): Events dropped because the queue was full.
+        lost (int): Reports dropped before they were decoded, so their edges may be missing.
+        event (InputEvent): The record returned by pop().
+    """
+
+    def __init__(self, size: int = EVENT_QUEUE_SIZE, policy: int = DROP_OLDEST):
+        self.size = size
+        self.policy = policy
+        self.overflows = 0
+        self.lost = 0
+        self.event = InputEvent()
+        self._buttons = bytearray(size)
+        self._edges = bytearray(size)
+        self._remote = array("l", [0] * size)
+        self._local = array("L", [0] * size)
+        self._head = 0
+        self._count = 0
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return self._count
+
+    def push(self, button: int, edge: int, remote_ms: int, local_ms: int) -> bool:
+        """
+        Adds an event at the back of the queue.
+
+        Returns:
+            bool: False if the event was dropped, or an older one dropped to make room.
+        """
+        stored = True
+        if self._count == self.size:
+            self.overflows += 1
+            stored = False
+            if self.policy == DROP_NEWEST:
+                return stored
+            self._head = (self._head + 1) % self.size
+            self._count -= 1
+        tail = (self._head + self._count) % self.size
+        self._buttons[tail] = button
+        self._edges[tail] = edge
+        self._remote[tail] = remote_ms
+        self._local[tail] = local_ms
+        self._count += 1
+        self._ready.set()
+        return stored
+
+    def pop(self):
+        """
+        Takes the oldest event.
+
+        Returns:
+            InputEvent: The event, or None if the queue is empty.
+        """
+        if not self._count:
+            return None
+        head = self._head
+        event = self.event
+        event.button = self._buttons[head]
+        event.edge = self._edges[head]
+        event.remote_ms = self._remote[head]
+        event.local_ms = self._local[head]
+        self._head = (head + 1) % self.size
+        self._count -= 1
+        return event
+
+    def drain(self, handler) -> int:
+        """
+        Hands every queued event to handler(button, edge, remote_ms, local_ms), oldest first.
+
+        Returns:
+            int: The number of events handled.
+        """
+        handled = 0
+        while self._count:
+            head = self._head
+            self._head = (head + 1) % self.size
+            self._count -= 1
+            handler(self._buttons[head], self._edges[head], self._remote[head], self._local[head])
+            handled += 1
+        return handled
+
+    def clear(self):
+        """
+        Drops every queued event.
+        """
+        self._head = 0
+        self._count = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._count:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.pop()
+
+
+class NotifyQueue:
+    """
+    Notifications aioble holds between reads of the button characteristic.
+
+    Stands in for aioble's one-entry queue. Like a deque with a maximum
+    length it drops the oldest report when full, but every drop is counted
+    in events.lost and in metrics: a press and release lost together leave
+    the pressed mask as it was, so diffing the reports that do arrive can't
+    tell anything went missing.
+
+    Attributes:
+        events (EventQueue): Queue whose lost counter is kept up to date.
+    """
+
+    def __init__(self, events, size: int = NOTIFY_QUEUE_SIZE):
+        self.events = events
+        self._size = size
+        self._queue = deque((), size)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def append(self, data):
+        if len(self._queue) == self._size:
+            self.events.lost += 1
+            if metrics.enabled:
+                metrics.count(metrics.REPORTS_DROPPED)
+        self._queue.append(data)
+
+    def popleft(self):
+        return self._queue.popleft()
+
+
+class GamePadServer:
+    """
+    A class to handle BLE communication and interpret commands from a Bluetooth gamepad remote.
+
+    Attributes:
+        device_name (str): The name of the BLE device.
+        led (Pin): Onboard LED for connection status indication.
+        connected (bool): Tracks the connection status.
+        connection (aioble.Connection): Active BLE connection.
+        command (str): The last received command from the gamepad.
+        pressed_mask (int): Bitmask of the buttons held down on the gamepad, see BUTTON_NAMES.
+        just_pressed (int): Buttons pressed since the previous tick().
+        just_released (int): Buttons released since the previous tick().
+        decoder (ReportDecoder): Button state decoded from the received reports.
+        events (EventQueue): Every button edge received, in order.
+        format (int): Report format negotiated with the gamepad.
+        profile_code (int): Profile code the gamepad reported with its formats, see PROFILE_CODES.
+        notifying (bool): True when reports arrive as notifications rather than reads.
+    """
+
+    def __init__(self, device_name="KevsRobots", broadcast=False):
+        """
+        Initializes the BLE server with the specified device name.
+
+        Args:
+            device_name (str): The name of the BLE device to advertise.
+            broadcast (bool): Follow a GamePad in broadcast mode from a passive
+                scan instead of connecting to it.
+        """
+#         import aioble
+#         import bluetooth
+#         from micropython import const
+
+        self.device_name = device_name
+        self.led = machine.Pin("LED", machine.Pin.OUT)
+        self.connected = False
+        self.connection = None
+        self.peer = None  # The last gamepad connected to, tried first on reconnect
+        self._link_up = asyncio.Event()
+        self.command = None
+        self.pressed_mask = 0
+        self.just_pressed = 0
+        self.just_released = 0
+        self._pressed_edges = 0
+        self._released_edges = 0
+        # ticks_ms() when each button went down
+        self._down_at = array("L", [0] * len(BUTTON_NAMES))
+        self.decoder = ReportDecoder()
+        self.events = EventQueue()
+        self.format = FORMAT_TEXT
+        self.profile_code = NO_PROFILE
+        self._format_value = None  # Read from the format characteristic, cached with the handles
+        self.notifying = False
+        # GATT handles found on each gamepad, by address, so reconnects skip discovery
+        self.handles = {}
+        # Connection parameters each gamepad asked for, (interval_us, latency, timeout_ms) by address
+        self.profiles = {}
+        self.conn_interval_us = 0  # Interval asked for on this connection, 0 if left to the stack
+        self.broadcast = broadcast
+        self.heard_ms = 0  # ticks_ms() of the last new broadcast report
+        self._last_seq = -1  # Sequence number of the last broadcast report, -1 before the first
+        self.tasks = []
+
+        # UUIDs and constants
+        self._REMOTE_UUID = bluetooth.UUID(0x1848)
+        self._BUTTON_UUID = bluetooth.UUID(0x2A6E)
+        self._FORMAT_UUID = bluetooth.UUID(0x2A6F)
+        self._CCCD_UUID = bluetooth.UUID(0x2902)
+        self._PPCP_UUID = bluetooth.UUID(0x2A04)
+        self._BLE_APPEARANCE_GENERIC_REMOTE_CONTROL = const(384)
+
+        # Services and Characteristics
+        self.remote_service = aioble.Service(self._REMOTE_UUID)
+        self.button_characteristic = aioble.Characteristic(
+            self.remote_service, self._BUTTON_UUID, read=True, notify=True
+        )
+
+        # Register the services
+        aioble.register_services(self.remote_service)
+        
+    async def peripheral_task(self):
+        print("Peripheral task started")
+        while True:
+            self.connection = await self.connect_remote()
+            self.peer = self.connection.device
+            self.connected = True
+            if metrics.enabled and self.conn_interval_us:
+                metrics.record(metrics.CONN_INTERVAL_US, self.conn_interval_us)
+            self._link_up.set()
+            print(f"Connected to {self.connection.device}")
+            try:
+                # Keep connection active until disconnected
+                async with self.connection:
+                    await self.connection.disconnected(timeout_ms=None)
+                    print("Disconnected from remote.")
+            except Exception as e:
+                print(f"Error during connection: {e}")
+            finally:
+                self.connected = False
+                self._link_up.clear()
+
+    async def connect_remote(self):
+        """
+        Connects to the gamepad, trying the last one directly before scanning.
+
+        A gamepad that dropped out usually comes straight back, so the last
+        address gets RECONNECT_ATTEMPTS direct connects with doubling pauses
+        between them. Only then does it scan.
+
+        Returns:
+            aioble.DeviceConnection: The new connection.
+        """
+        if self.peer is not None:
+            backoff = BACKOFF_MIN_MS
+            for attempt in range(RECONNECT_ATTEMPTS):
+                try:
+                    print(f"Reconnecting to {self.peer}...")
+                    return await self.connect(self.peer)
+                except Exception as e:
+                    print(f"Reconnect attempt {attempt + 1} failed: {e}")
+                if attempt < RECONNECT_ATTEMPTS - 1:
+                    await asyncio.sleep_ms(backoff)
+                    backoff = min(backoff * 2, BACKOFF_MAX_MS)
+        while True:
+            device = await self.find_remote()
+            try:
+                print(f"Connecting to {device}...")
+                return await self.connect(device)
+            except Exception as e:
+                print(f"Error during connection: {e}")
+
+    async def connect(self, device):
+        """
+        Connects to a gamepad, at the connection interval it asked for if it has.
+
+        MicroPython only lets the central choose connection parameters, and
+        only when connecting, so this is where a gamepad's profile applies.
+
+        Args:
+            device (aioble.Device): The gamepad.
+
+        Returns:
+            aioble.DeviceConnection: The new connection.
+        """
+        profile = self.profiles.get(bytes(device.addr))
+        if profile is None:
+            connection = await device.connect(timeout_ms=CONNECT_TIMEOUT_MS)
+            self.conn_interval_us = 0
+        else:
+            connection = await device.connect(
+                timeout_ms=CONNECT_TIMEOUT_MS,
+                min_conn_interval_us=profile[0],
+                max_conn_interval_us=profile[0],
+            )
+            self.conn_interval_us = profile[0]
+        return connection
+
+    async def blink_task(self):
+        print('blink task started')
+        toggle = True
+        while True:
+            self.led.value(toggle)
+            toggle = not toggle
+            blink = 1000
+            if self.connected:
+                blink = 1000
+            else:
+                blink = 250
+            await asyncio.sleep_ms(blink)
+
+    async def read_commands(self):
+        print("Waiting for notifications...")
+        while True:
+            await self._link_up.wait()
+            connection = self.connection
+            try:
+                characteristic = await self.attach(connection)
+
+                if characteristic is None:
+                    # Dropped on purpose to reconnect at the gamepad's interval
+                    self._link_up.clear()
+                elif self.notifying:
+                    # Wait for notifications, the radio is idle between presses
+                    while self.connected:
+                        value = await characteristic.notified()
+                        timing = metrics.enabled
+                        if timing:
+                            start = ticks_us()
+                        if value and self.decoder.decode(value):
+                            self.apply_report()
+                        if timing:
+                            metrics.elapsed(metrics.REPORT_HANDLING, start)
+                            metrics.count(metrics.REPORTS_RECEIVED)
+#                             print(f"Received command: {self.command}")
+                else:
+                    # Remote can't notify, poll the characteristic instead
+                    while self.connected:
+                        value = await characteristic.read()
+                        timing = metrics.enabled
+                        if timing:
+                            start = ticks_us()
+                        if value and self.decoder.decode(value):
+                            self.apply_report()
+                        if timing:
+                            metrics.elapsed(metrics.REPORT_HANDLING, start)
+                            metrics.count(metrics.REPORTS_RECEIVED)
+            except asyncio.CancelledError:
+                raise
+            except aioble.DeviceDisconnectedError:
+                # The gamepad went away, peripheral_task reconnects. Unless it
+                # already has, wait for that rather than retrying the dead link
+                if self.connection is connection:
+                    self._link_up.clear()
+            except Exception as e:
+                print(f"Error during notification handling: {e}")
+                # Drop a link that can't deliver reports so peripheral_task reconnects
+                if self.connection is connection:
+                    self._link_up.clear()
+                try:
+                    if connection.is_connected():
+                        await connection.disconnect()
+                except Exception as e:
+                    print(f"Error while disconnecting: {e}")
+            self.format = FORMAT_TEXT
+            self.notifying = False
+            self.decoder.reset()
+            self.release_all()
+
+    async def attach(self, connection):
+        """
+        Finds the button characteristic, agrees the report format and subscribes.
+
+        The handles discovered on a gamepad are kept in handles and reused
+        when it reconnects, so reports flow after a single write to the
+        CCCD. Before that write, the format characteristic, which the
+        negotiation reads anyway, has to return exactly the value cached
+        with the handles: its newest format and profile code. Any other
+        attribute, or a gamepad whose profile changed, fails that check and
+        full discovery runs again, looking up the PPCP characteristic too.
+        A gamepad without a format characteristic has nothing only it could
+        return, so its handles aren't cached. Text reports that arrive
+        before binary ones are agreed decode as usual.
+
+        Args:
+            connection (aioble.DeviceConnection): Connection to the gamepad.
+
+        Returns:
+            aioble.ClientCharacteristic: The remote's button characteristic, None
+            if the connection was dropped to reconnect with the gamepad's profile.
+        """
+        addr = bytes(connection.device.addr)
+        handles = self.handles.get(addr)
+        if handles is not None:
+            button, cccd, format_characteristic, ppcp, format_value = self.restore(connection, handles)
+            try:
+                # Check the handles with a read before writing to any of them. A
+                # CCCD reads 0x0000 on a new connection, so it can't pass for the
+                # format value, which starts with FORMAT_BINARY
+                self.format = await self.negotiate_format(format_characteristic, format_value)
+                self.notifying = await self.subscribe(button, cccd)
+                if await self.apply_profile(connection, ppcp):
+                    return None
+                return button
+            except (aioble.GattError, ValueError) as e:
+                print(f"Cached handles are stale, rediscovering: {e}")
+                del self.handles[addr]
+                # The gamepad changed, and its profile may have too
+                self.profiles.pop(addr, None)
+
+        service = await connection.service(self._REMOTE_UUID)
+        button = await service.characteristic(self._BUTTON_UUID)
+        cccd = None
+        if button.properties & _FLAG_NOTIFY:
+            cccd = await button.descriptor(self._CCCD_UUID)
+        format_characteristic = await service.characteristic(self._FORMAT_UUID)
+        self.notifying = await self.subscribe(button, cccd)
+        self.format = await self.negotiate_format(format_characteristic)
+        ppcp = await service.characteristic(self._PPCP_UUID)
+        if format_characteristic:
+            self.handles[addr] = self.remember(service, button, cccd, format_characteristic, ppcp)
+        if await self.apply_profile(connection, ppcp):
+            return None
+        return button
+
+    def remember(self, service, button, cccd, format_characteristic, ppcp):
+        """
+        Packs the handles of the remote's attributes and its format value into an entry for handles.
+
+        Args:
+            service (aioble.ClientService): The remote's service.
+            button (aioble.ClientCharacteristic): Its button characteristic.
+            cccd (aioble.ClientDescriptor): The button characteristic's CCCD, None if it can't notify.
+            format_characteristic (aioble.ClientCharacteristic): Its format characteristic.
+            ppcp (aioble.ClientCharacteristic): Its PPCP characteristic, None if it has none.
+
+        Returns:
+            tuple: The entry: the handles, with 0 for a missing CCCD or PPCP, then
+            the value read from the format characteristic.
+        """
+        # The handles are private in aioble; these names are the ones its
+        # client.py uses as of micropython-lib aioble 0.5, and restore()
+        # passes them back to its constructors. Check both when updating aioble.
+        return (
+            service._start_handle,
+            service._end_handle,
+            button._end_handle,
+            button._value_handle,
+            button.properties,
+            cccd._value_handle if cccd else 0,
+            format_characteristic._end_handle,
+            format_characteristic._value_handle,
+            format_characteristic.properties,
+            ppcp._value_handle if ppcp else 0,
+            self._format_value,
+        )
+
+    def restore(self, connection, handles):
+        """
+        Rebuilds the remote's characteristics from cached handles, without any radio traffic.
+
+        Args:
+            connection (aioble.DeviceConnection): Connection to the gamepad.
+            handles (tuple): An entry from handles.
+
+        Returns:
+            tuple: (button characteristic, its CCCD or None, format characteristic,
+            PPCP characteristic or None, format value when cached)
+        """
+        (start, end, button_end, button_value, button_properties, cccd,
+         format_end, format_handle, format_properties, ppcp, format_value) = handles
+        service = ClientService(connection, start, end, self._REMOTE_UUID)
+        button = ClientCharacteristic(service, button_end, button_value, button_properties, self._BUTTON_UUID)
+        if cccd:
+            cccd = ClientDescriptor(button, cccd, self._CCCD_UUID)
+        else:
+            cccd = None
+        format_characteristic = ClientCharacteristic(
+            service, format_end, format_handle, format_properties, self._FORMAT_UUID
+        )
+        if ppcp:
+            ppcp = ClientCharacteristic(service, ppcp, ppcp, _FLAG_READ, self._PPCP_UUID)
+        else:
+            ppcp = None
+        return button, cccd, format_characteristic, ppcp, format_value
+
+    async def apply_profile(self, connection, characteristic):
+        """
+        Reads the connection parameters the gamepad prefers and, if this
+        connection isn't using them, drops it so peripheral_task reconnects
+        with them. That happens once per gamepad; later connections use
+        them from the start, and skip the read. A gamepad that no longer
+        has a profile is reconnected with the stack's parameters.
+
+        Args:
+            connection (aioble.DeviceConnection): Connection to the gamepad.
+            characteristic (aioble.ClientCharacteristic): The remote's PPCP characteristic, None if it has none.
+
+        Returns:
+            bool: True if the connection was dropped to reconnect.
+        """
+        addr = bytes(connection.device.addr)
+        profile = self.profiles.get(addr)
+        if profile is not None and profile[0] == self.conn_interval_us:
+            # Connected with it already
+            return False
+        profile = None
+        if characteristic:
+            profile = unpack_profile(await characteristic.read())
+        if profile is None:
+            self.profiles.pop(addr, None)
+            if not self.conn_interval_us:
+                return False
+            print("Reconnecting with the default connection interval")
+            await connection.disconnect()
+            return True
+        self.profiles[addr] = profile
+        if profile[0] == self.conn_interval_us:
+            return False
+        print(f"Reconnecting with a {profile[0]} us connection interval")
+        await connection.disconnect()
+        return True
+
+    async def subscribe(self, characteristic, cccd):
+        """
+        Subscribes to button notifications from the gamepad.
+
+        Args:
+            characteristic (aioble.ClientCharacteristic): The remote's button characteristic.
+            cccd (aioble.ClientDescriptor): Its Client Characteristic Configuration descriptor, None if it can't notify.
+
+        Returns:
+            bool: True if notifications are enabled, False if the remote has to be polled.
+        """
+        # aioble keeps only the newest unread notification; keep a whole burst instead
+        characteristic._notify_event = asyncio.ThreadSafeFlag()
+        characteristic._notify_queue = NotifyQueue(self.events)
+        if cccd is None:
+            print("Notifications unavailable, polling instead")
+            return False
+        # What characteristic.subscribe() does, minus finding the CCCD again
+        characteristic._register_with_connection()
+        await cccd.write(_NOTIFY_ON, True)
+        return True
+
+    async def negotiate_format(self, characteristic, expected=None):
+        """
+        Asks the gamepad for binary reports if it supports them, and notes
+        its profile code in profile_code.
+
+        Args:
+            characteristic (aioble.ClientCharacteristic): The remote's format characteristic, None if it has none.
+            expected (bytes): Raise ValueError unless the value read is exactly this, to validate cached handles.
+
+        Returns:
+            int: The report format the gamepad will send.
+        """
+        self.profile_code = NO_PROFILE
+        self._format_value = None
+        if not characteristic:
+            # Older remotes only speak text
+            return FORMAT_TEXT
+        supported = await characteristic.read()
+        if expected is not None and supported != expected:
+            raise ValueError(f"format characteristic read {bytes(supported)}, cached {expected}")
+        self._format_value = bytes(supported)
+        if len(supported) > 1:
+            self.profile_code = supported[1]
+        if not supported or supported[0] < FORMAT_BINARY:
+            return FORMAT_TEXT
+        await characteristic.write(bytes((FORMAT_BINARY,)), True)
+        return FORMAT_BINARY
+
+    def apply_report(self, missed: int = 0):
+        """
+        Updates the button state and the last command from the decoded report.
+
+        Every edge is also queued on events. A binary report can carry
+        several changes; presses are applied after releases so a held button
+        wins over one that was just let go.
+
+        Args:
+            missed (int): Mask of buttons that went both ways since the last
+                report applied, ending where they started; each gets both edges.
+        """
+        decoder = self.decoder
+        pressed = decoder.pressed
+        edges = pressed ^ self.pressed_mask
+        if edges or missed:
+            now = ticks_ms()
+            down = edges & pressed
+            remote = NO_TIMESTAMP if decoder.timestamp is None else decoder.timestamp
+            for index in range(len(BUTTON_NAMES)):
+                bit = 1 << index
+                if missed & bit:
+                    if pressed & bit:
+                        self.events.push(index, EDGE_UP, remote, now)
+                        self._down_at[index] = now
+                        self.events.push(index, EDGE_DOWN, remote, now)
+                    else:
+                        self.events.push(index, EDGE_DOWN, remote, now)
+                        self.events.push(index, EDGE_UP, remote, now)
+                elif edges & bit:
+                    if down & bit:
+                        self._down_at[index] = now
+                        self.events.push(index, EDGE_DOWN, remote, now)
+                    else:
+                        self.events.push(index, EDGE_UP, remote, now)
+            self._pressed_edges |= down | missed
+            self._released_edges |= (edges & ~pressed) | missed
+            self.pressed_mask = pressed
+        changed = decoder.changed
+        command = self.command
+        for index in range(len(UP_COMMANDS)):
+            bit = 1 << index
+            if changed & bit and not pressed & bit:
+                command = UP_COMMANDS[index]
+        for index in range(len(DOWN_COMMANDS)):
+            bit = 1 << index
+            if changed & bit and pressed & bit:
+                command = DOWN_COMMANDS[index]
+        self.command = command
+
+    def release_all(self):
+        """
+        Lets go of every button, e.g. when the gamepad disconnects.
+        """
+        now = ticks_ms()
+        for index in range(len(BUTTON_NAMES)):
+            if self.pressed_mask & (1 << index):
+                self.events.push(index, EDGE_UP, NO_TIMESTAMP, now)
+        self._released_edges |= self.pressed_mask
+        self.pressed_mask = 0
+        self.command = None
+
+    def tick(self):
+        """
+        Starts a control tick.
+
+        Moves the presses and releases seen since the previous tick into
+        just_pressed and just_released, so a control loop sees every edge
+        exactly once however often it runs.
+        """
+        self.just_pressed = self._pressed_edges
+        self.just_released = self._released_edges
+        self._pressed_edges = 0
+        self._released_edges = 0
+
+    def pressed(self, button) -> bool:
+        """
+        Checks whether a button is held down.
+
+        Args:
+            button (int | str): A button bit such as BUTTON_UP, or a name from BUTTON_NAMES.
+
+        Returns:
+            bool: True while the button is held.
+        """
+        if type(button) is str:
+            button = BUTTON_BITS[button]
+        return bool(self.pressed_mask & button)
+
+    def held_ms(self, button) -> int:
+        """
+        How long a button has been held down.
+
+        Args:
+            button (int | str): A single button bit such as BUTTON_UP, or a name from BUTTON_NAMES.
+
+        Returns:
+            int: Milliseconds since the button went down, 0 if it isn't held.
+        """
+        index = BUTTON_INDEX[button]
+        if not self.pressed_mask & (1 << index):
+            return 0
+        return ticks_diff(ticks_ms(), self._down_at[index])
+
+    @property
+    def is_up(self):
+        return bool(self.pressed_mask & BUTTON_UP)
+
+    @property
+    def is_down(self):
+        return bool(self.pressed_mask & BUTTON_DOWN)
+
+    @property
+    def is_left(self):
+        return bool(self.pressed_mask & BUTTON_LEFT)
+
+    @property
+    def is_right(self):
+        return bool(self.pressed_mask & BUTTON_RIGHT)
+
+    @property
+    def is_a(self):
+        return bool(self.pressed_mask & BUTTON_A)
+
+    @property
+    def is_b(self):
+        return bool(self.pressed_mask & BUTTON_B)
+    
+    @property
+    def is_x(self):
+        return bool(self.pressed_mask & BUTTON_X)
+    
+    @property
+    def is_y(self):
+        return bool(self.pressed_mask & BUTTON_Y)
+    
+    @property
+    def is_menu(self):
+        return bool(self.pressed_mask & BUTTON_MENU)
+    
+    @property
+    def is_start(self):
+        return bool(self.pressed_mask & BUTTON_START)
+
+    @property
+    def is_select(self):
+        return bool(self.pressed_mask & BUTTON_SELECT)
+            
+    async def listen_task(self):
+        """
+        Follows a GamePad in broadcast mode from a continuous passive scan.
+
+        The first gamepad heard advertising device_name with reports under
+        BROADCAST_COMPANY_ID is followed until it
+        has been silent for BROADCAST_TIMEOUT_MS; any number of robots can
+        listen to the same one. aioble keeps a result for every device a
+        scan hears, so the scan is restarted every BROADCAST_RESCAN_MS to
+        keep that from growing in a busy room. A restarted scan reports the
+        current advertisement again, which receive_broadcast drops as a repeat.
+        """
+        print("Listening for broadcasts...")
+        while True:
+            async with aioble.scan(
+                BROADCAST_RESCAN_MS, interval_us=BROADCAST_SCAN_US, window_us=BROADCAST_SCAN_US
+            ) as scanner:
+                async for result in scanner:
+                    if self.peer is not None and result.device != self.peer:
+                        continue
+                    if result.name() != self.device_name:
+                        continue
+                    for _, data in result.manufacturer(BROADCAST_COMPANY_ID):
+                        self.receive_broadcast(result.device, data)
+
+    def receive_broadcast(self, device, data) -> bool:
+        """
+        Applies a broadcast report, unless it is a repeat of the last one or older.
+
+        Sequence numbers are compared modulo 256, so a report more than half
+        the range behind the last one counts as old; a gamepad that restarts
+        its count is followed again once the watchdog gives up on it. A gap
+        means reports were lost: they are counted in events.lost, and a button
+        whose changed bit is set without its state differing from ours went
+        both ways in between, so both edges are applied.
+
+        Args:
+            device (aioble.Device): The gamepad that sent it.
+            data (bytes): The manufacturer data, a binary report.
+
+        Returns:
+            bool: True if the report was new.
+        """
+        if len(data) != REPORT_SIZE or data[0] != REPORT_VERSION:
+            return False
+        last = self._last_seq
+        ahead = (data[5] - last) & 0xFF
+        if last >= 0 and (ahead == 0 or ahead >= 0x80):
+            return False
+        timing = metrics.enabled
+        if timing:
+            start = ticks_us()
+        decoder = self.decoder
+        decoder.decode(data)
+        self._last_seq = decoder.seq
+        missed = 0
+        if last >= 0:
+            # Without a previous report there is nothing to compare changed against
+            missed = decoder.changed & ~(decoder.pressed ^ self.pressed_mask)
+            if ahead > 1:
+                self.events.lost += ahead - 1
+                if timing:
+                    metrics.count(metrics.REPORTS_DROPPED, ahead - 1)
+        self.heard_ms = ticks_ms()
+        if not self.connected:
+            print(f"Following {device}")
+            self.peer = device
+            self.connected = True
+        self.apply_report(missed)
+        if timing:
+            metrics.elapsed(metrics.REPORT_HANDLING, start)
+            metrics.count(metrics.REPORTS_RECEIVED)
+        return True
+
+    async def broadcast_watchdog(self):
+        """
+        Lets go of every button once the followed gamepad goes quiet, and
+        follows whichever gamepad is heard next.
+        """
+        while True:
+            await asyncio.sleep_ms(BROADCAST_TIMEOUT_MS // 4)
+            if self.connected and ticks_diff(ticks_ms(), self.heard_ms) > BROADCAST_TIMEOUT_MS:
+                print("Gamepad went quiet")
+                self.connected = False
+                self.peer = None
+                self._last_seq = -1
+                self.decoder.reset()
+                self.release_all()
+
+    async def find_remote(self):
+        """
+        Scans for the gamepad, stopping at the first one advertising the remote service.
+
+        Returns:
+            aioble.Device: The gamepad to connect to.
+        """
+        print("Scanning for BLE devices...")
+        while True:
+            async with aioble.scan(SCAN_MS, interval_us=30000, window_us=30000, active=True) as scanner:
+                async for result in scanner:
+                    if self._REMOTE_UUID in result.services() and result.name() == self.device_name:
+                        print(f"Found {self.device_name}")
+                        return result.device  # Return the device for direct connection
+            print("Device not found. Retrying in 2 seconds...")
+            await asyncio.sleep(2)
+
+    async def main(self):
+        while True:
+            """ Run all tasks concurrently """
+            
+            print('starting tasks')
+            try:
+                if self.broadcast:
+                    self.tasks.append(asyncio.create_task(self.listen_task()))
+                    self.tasks.append(asyncio.create_task(self.broadcast_watchdog()))
+                else:
+                    read_commands_task = asyncio.create_task(self.read_commands())
+                    peripheral_task = asyncio.create_task(self.peripheral_task())
+
+                    self.tasks.append(peripheral_task)
+                    self.tasks.append(read_commands_task)
+                if metrics.enabled:
+                    metrics.watch_connection()
+                    self.tasks.append(asyncio.create_task(metrics.lag_probe()))
+                await asyncio.gather(*self.tasks)
+            except Exception as e:
+                print(f"Error in main task: {e}")
+                for task in self.tasks:
+                    task.cancel()
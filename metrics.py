@@ -0,0 +1,226 @@
+# Runtime metrics
+# Counters, fixed-bucket duration histograms and an event loop lag probe for
+# the GamePad and the robot. Everything is preallocated. Hooks check
+# `metrics.enabled` before doing any work, so with metrics off they cost a
+# single attribute lookup.
+#
+# From the REPL:
+#
+#     import metrics
+#     metrics.enable()
+#     ...
+#     metrics.report()
+
+import asyncio
+from array import array
+from micropython import const
+from time import ticks_us, ticks_diff
+
+enabled = False
+
+# Counters
+EVENTS_SENT = const(0)
+NOTIFY_FAILED = const(1)
+RECONNECTS = const(2)
+OLED_FLUSHES = const(3)
+OLED_BYTES = const(4)
+REPORTS_RECEIVED = const(5)
+CONN_UPDATES = const(6)
+# Current values rather than counts, set with record()
+CONN_INTERVAL_US = const(7)
+CONN_LATENCY = const(8)
+SUPERVISION_TIMEOUT_MS = const(9)
+REPORTS_DROPPED = const(10)
+COUNTER_NAMES = (
+    "events_sent",
+    "notify_failed",
+    "reconnects",
+    "oled_flushes",
+    "oled_bytes",
+    "reports_received",
+    "conn_updates",
+    "conn_interval_us",
+    "conn_latency",
+    "supervision_timeout_ms",
+    "reports_dropped",
+)
+
+# aioble IRQ event carrying new connection parameters
+_IRQ_CONNECTION_UPDATE = const(27)
+
+# Histograms, durations in microseconds
+BUTTON_TO_NOTIFY = const(0)
+OLED_SHOW = const(1)
+REPORT_HANDLING = const(2)
+LOOP_LAG = const(3)
+HISTOGRAM_NAMES = (
+    "button_to_notify_us",
+    "oled_show_us",
+    "report_handling_us",
+    "loop_lag_us",
+)
+
+# Upper bounds of the histogram buckets; anything slower lands in a final overflow bucket
+BUCKETS_US = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+_BUCKET_COUNT = len(BUCKETS_US) + 1
+
+counters = array("L", [0] * len(COUNTER_NAMES))
+_buckets = array("L", [0] * (len(HISTOGRAM_NAMES) * _BUCKET_COUNT))
+_totals = array("L", [0] * len(HISTOGRAM_NAMES))
+_maxima = array("L", [0] * len(HISTOGRAM_NAMES))
+
+
+def enable(on: bool = True):
+    """
+    Turns metric collection on or off.
+    """
+    global enabled
+    enabled = on
+
+
+def reset():
+    """
+    Zeroes every counter and histogram.
+    """
+    for i in range(len(counters)):
+        counters[i] = 0
+    for i in range(len(_buckets)):
+        _buckets[i] = 0
+    for i in range(len(_totals)):
+        _totals[i] = 0
+        _maxima[i] = 0
+
+
+def count(counter: int, amount: int = 1):
+    """
+    Adds amount to a counter.
+    """
+    counters[counter] += amount
+
+
+def record(counter: int, value: int):
+    """
+    Sets a counter that holds a current value, such as CONN_INTERVAL_US.
+    """
+    counters[counter] = value
+
+
+def observe(histogram: int, duration_us: int):
+    """
+    Records one duration in a histogram.
+    """
+    if duration_us < 0:
+        duration_us = 0
+    bucket = 0
+    while bucket < len(BUCKETS_US) and duration_us > BUCKETS_US[bucket]:
+        bucket += 1
+    _buckets[histogram * _BUCKET_COUNT + bucket] += 1
+    _totals[histogram] += 1
+    if duration_us > _maxima[histogram]:
+        _maxima[histogram] = duration_us
+
+
+def elapsed(histogram: int, start_us: int):
+    """
+    Records the time since start_us (a ticks_us() value) in a histogram.
+    """
+    observe(histogram, ticks_diff(ticks_us(), start_us))
+
+
+async def lag_probe(period_ms: int = 10):
+    """
+    Measures how late the event loop wakes a task that sleeps for period_ms.
+    """
+    while True:
+        start = ticks_us()
+        await asyncio.sleep_ms(period_ms)
+        if enabled:
+            observe(LOOP_LAG, ticks_diff(ticks_us(), start) - period_ms * 1000)
+
+
+def _connection_update(event, data):
+    if event == _IRQ_CONNECTION_UPDATE and enabled:
+        _, interval, latency, timeout, status = data
+        if status == 0:
+            count(CONN_UPDATES)
+            record(CONN_INTERVAL_US, interval * 1250)
+            record(CONN_LATENCY, latency)
+            record(SUPERVISION_TIMEOUT_MS, timeout * 10)
+
+
+_watching = False
+
+
+def watch_connection():
+    """
+    Records the connection parameters every time the BLE stack reports a
+    connection update. aioble is only imported here, so the rest of the
+    module works without Bluetooth.
+    """
+    global _watching
+    if _watching:
+        return
+    import aioble
+    aioble.core.register_irq_handler(_connection_update, None)
+    _watching = True
+
+
+def snapshot() -> dict:
+    """
+    Returns the current counters and histograms.
+
+    Returns:
+        dict: {"counters": {name: value}, "histograms": {name: {"count", "max", "buckets"}}}
+    """
+    histograms = {}
+    for index, name in enumerate(HISTOGRAM_NAMES):
+        start = index * _BUCKET_COUNT
+        histograms[name] = {
+            "count": _totals[index],
+            "max": _maxima[index],
+            "buckets": list(_buckets[start:start + _BUCKET_COUNT]),
+        }
+    return {
+        "counters": {name: counters[index] for index, name in enumerate(COUNTER_NAMES)},
+        "histograms": histograms,
+    }
+
+
+def report():
+    """
+    Prints a readable snapshot.
+    """
+    for index, name in enumerate(COUNTER_NAMES):
+        print(f"{name:<22}{counters[index]:>10}")
+    labels = [f"<={bound}" for bound in BUCKETS_US] + [">" + str(BUCKETS_US[-1])]
+    for index, name in enumerate(HISTOGRAM_NAMES):
+        if not _totals[index]:
+            continue
+        start = index * _BUCKET_COUNT
+        print(f"{name}: {_totals[index]} samples, max {_maxima[index]} us")
+        for bucket in range(_BUCKET_COUNT):
+            hits = _buckets[start + bucket]
+            if hits:
+                print(f"  {labels[bucket]:>9} us {hits:>8}")
+
+
+def pack(buf: bytearray = None) -> bytearray:
+    """
+    Packs the counters as little endian uint32s, e.g. for a diagnostics characteristic.
+
+    Args:
+        buf (bytearray): Buffer to reuse, 4 bytes per counter.
+
+    Returns:
+        bytearray: The packed counters.
+    """
+    if buf is None:
+        buf = bytearray(4 * len(COUNTER_NAMES))
+    for index in range(len(COUNTER_NAMES)):
+        value = counters[index]
+        offset = 4 * index
+        buf[offset] = value & 0xFF
+        buf[offset + 1] = (value >> 8) & 0xFF
+        buf[offset + 2] = (value >> 16) & 0xFF
+        buf[offset + 3] = (value >> 24) & 0xFF
+    return buf
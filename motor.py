@@ -1,12 +1,27 @@
+import asyncio
+from array import array
 from machine import Pin, PWM
+from micropython import const
+
+# Speed resolution, speeds are whole steps from -SPEED_STEPS to SPEED_STEPS
+SPEED_STEPS = const(100)
+
+# PWM duty for each speed step, so setting a speed needs no float maths
+DUTY = array("H", [(step * 65535) // SPEED_STEPS for step in range(SPEED_STEPS + 1)])
 
 class Motor:
     """
     A class to represent a motor controlled via the DRV8833 driver.
 
+    Pins are only written when their value changes, so setting the same
+    speed every control tick costs nothing.
+
     Attributes:
         in1 (Pin): The first input pin for motor control.
         in2 (PWM): The second input pin (PWM) for speed control.
+        step (int): Speed being driven, in steps (-SPEED_STEPS to SPEED_STEPS).
+        target (int): Speed asked for; differs from step while a MotorRamp is slewing.
+        ramp (MotorRamp): The ramp slewing this motor, None when speeds apply straight away.
     """
 
     def __init__(self, in1_pin: int, in2_pin: int):
@@ -20,6 +35,52 @@ class Motor:
         self.in1 = Pin(in1_pin, Pin.OUT)
         self.in2 = PWM(Pin(in2_pin))
         self.in2.freq(1000)  # Set PWM frequency to 1kHz
+        self.step = 0
+        self.target = 0
+        self.ramp = None
+        self._direction = None  # Last level written to in1, None until the first write
+        self._duty = None  # Last duty written to in2
+
+    def _write(self, direction: int, duty: int):
+        """
+        Drives the pins, skipping any that already hold the value.
+        """
+        if direction != self._direction:
+            self.in1.value(direction)
+            self._direction = direction
+        if duty != self._duty:
+            self.in2.duty_u16(duty)
+            self._duty = duty
+
+    def apply(self, step: int):
+        """
+        Drives the motor at a speed straight away, ignoring any ramp.
+
+        Args:
+            step (int): Speed in steps (-SPEED_STEPS to SPEED_STEPS). Negative values reverse direction.
+        """
+        self.step = step
+        if step < 0:
+            self._write(0, DUTY[-step])  # Reverse direction
+        else:
+            self._write(1, DUTY[step])  # Forward direction
+
+    def set_step(self, step: int):
+        """
+        Sets the motor speed in whole steps.
+
+        Args:
+            step (int): Speed in steps (-SPEED_STEPS to SPEED_STEPS). Negative values reverse direction.
+        """
+        if step > SPEED_STEPS:
+            step = SPEED_STEPS
+        elif step < -SPEED_STEPS:
+            step = -SPEED_STEPS
+        self.target = step
+        if self.ramp is None:
+            self.apply(step)
+        elif step != self.step:
+            self.ramp.wake()
 
     def speed(self, value: float):
         """
@@ -28,28 +89,113 @@ class Motor:
         Args:
             value (float): Speed value (-1 to 1). Negative values reverse direction.
         """
-        if value < 0:
-            self.in1.low()  # Reverse direction
-        else:
-            self.in1.high()  # Forward direction
-        self.in2.duty_u16(int(abs(value) * 65535))  # Set PWM duty cycle (0-65535)
+        self.set_step(int(value * SPEED_STEPS))
 
     def brake(self):
         """
         Brakes the motor by setting both inputs HIGH.
         """
-        self.in1.high()
-        self.in2.duty_u16(65535)
+        self.step = self.target = 0
+        self._write(1, 65535)
 
     def coast(self):
         """
         Coasts the motor by setting both inputs LOW.
         """
-        self.in1.low()
-        self.in2.duty_u16(0)
-    
+        self.step = self.target = 0
+        self._write(0, 0)
+
     def disable(self):
         self.coast()
-    
+
     def stop(self):
-        self.coast()
\ No newline at end of file
+        self.coast()
+
+class MotorRamp:
+    """
+    Limits how fast a group of motors change speed.
+
+    While task() runs, Motor.speed() and set_step() only set a target; the
+    task moves every motor towards its target by a bounded number of steps
+    each period, so reversing goes through zero instead of jumping from full
+    forward to full reverse. The task sleeps while every motor is at its
+    target. Stopping (coast, brake) is never ramped.
+
+    Attributes:
+        motors (list): The motors to slew.
+        period_ms (int): Time between ramp steps.
+        accel_steps (int): Most the speed may grow per period.
+        decel_steps (int): Most the speed may shrink per period.
+    """
+
+    def __init__(self, motors, accel: float = 4.0, decel: float = None, period_ms: int = 10):
+        """
+        Args:
+            motors (list): The motors to slew.
+            accel (float): Fastest speed increase, in full speeds per second.
+            decel (float): Fastest speed decrease, in full speeds per second; defaults to accel.
+            period_ms (int): Time between ramp steps.
+        """
+        self.motors = motors
+        self.period_ms = period_ms
+        self.accel_steps = max(1, int(accel * SPEED_STEPS * period_ms / 1000))
+        if decel is None:
+            decel = accel
+        self.decel_steps = max(1, int(decel * SPEED_STEPS * period_ms / 1000))
+        self._event = asyncio.Event()
+
+    def wake(self):
+        """
+        Tells the ramp a target changed.
+        """
+        self._event.set()
+
+    def update(self) -> bool:
+        """
+        Moves every motor one period closer to its target.
+
+        Returns:
+            bool: True while any motor is still short of its target.
+        """
+        moving = False
+        accel = self.accel_steps
+        decel = self.decel_steps
+        for motor in self.motors:
+            step = motor.step
+            target = motor.target
+            if step == target:
+                continue
+            if step > 0 and target < step or step < 0 and target > step:
+                limit = decel  # Slowing down, possibly on the way to reversing
+            else:
+                limit = accel
+            if target > step:
+                step = target if target - step <= limit else step + limit
+                if motor.step < 0 < step:
+                    step = 0  # Stop at zero before reversing
+            else:
+                step = target if step - target <= limit else step - limit
+                if step < 0 < motor.step:
+                    step = 0
+            motor.apply(step)
+            if step != target:
+                moving = True
+        return moving
+
+    async def task(self):
+        """
+        Slews the motors towards their targets until cancelled.
+        """
+        for motor in self.motors:
+            motor.ramp = self
+        try:
+            while True:
+                self._event.clear()
+                if self.update():
+                    await asyncio.sleep_ms(self.period_ms)
+                else:
+                    await self._event.wait()
+        finally:
+            for motor in self.motors:
+                motor.ramp = None
+                motor.apply(motor.target)
@@ -0,0 +1,151 @@
+# Host-side hardware simulation
+# Drop-in fakes for the MicroPython modules the GamePad and BurgerBot code
+# imports (machine, micropython, framebuf, bluetooth, aioble), so the real
+# modules can be imported, benchmarked and regression tested under CPython.
+#
+# Usage:
+#
+#     import sim
+#     sim.install()
+#
+#     pad = sim.Board("pad")
+#     robot = sim.Board("robot")
+#
+#     async def main():
+#         with pad:
+#             from gamepad import GamePad
+#             gamepad = GamePad()
+#             asyncio.create_task(gamepad.main())
+#         with robot:
+#             ...
+#
+# Everything created inside `with board:` (pins, PWM, I2C buses, BLE
+# services, and asyncio tasks, which inherit the context) belongs to that
+# board. Code running outside any board uses sim.default_board.
+
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from sim.board import Board, current_board, default_board
+from sim.radio import Radio
+from sim import machine, micropython, framebuf, bluetooth, aioble
+
+__all__ = ["Board", "Radio", "current_board", "default_board", "install", "ticks_ms", "ticks_us"]
+
+# MicroPython ticks wrap at 2**30 on the rp2 port
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+# Heap size reported by gc.mem_free(), roughly what a Pico W leaves free
+HEAP_SIZE = 180_000
+
+_epoch = time.monotonic_ns()
+
+
+def ticks_ms() -> int:
+    return ((time.monotonic_ns() - _epoch) // 1_000_000) & TICKS_MAX
+
+
+def ticks_us() -> int:
+    return ((time.monotonic_ns() - _epoch) // 1_000) & TICKS_MAX
+
+
+def ticks_add(ticks: int, delta: int) -> int:
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(ticks1: int, ticks2: int) -> int:
+    return ((ticks1 - ticks2 + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def sleep_ms(ms: int):
+    time.sleep(ms / 1000)
+
+
+def sleep_us(us: int):
+    time.sleep(us / 1_000_000)
+
+
+class ThreadSafeFlag:
+    """
+    asyncio.ThreadSafeFlag for CPython.
+
+    Simulated IRQ handlers run on the event loop thread, so an Event that
+    clears itself when a waiter wakes is all that is needed.
+    """
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+async def _sleep_ms(ms: int):
+    await asyncio.sleep(ms / 1000)
+
+
+async def _wait_for_ms(aw, timeout: int):
+    return await asyncio.wait_for(aw, timeout / 1000)
+
+
+def _mem_alloc() -> int:
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return 0
+
+
+def _mem_free() -> int:
+    return HEAP_SIZE - _mem_alloc()
+
+
+def install(radio: Radio = None, trace_alloc: bool = False):
+    """
+    Makes the fakes importable under their MicroPython names.
+
+    time, asyncio and gc get the MicroPython-only functions the code uses
+    (ticks_ms, sleep_ms, ThreadSafeFlag, gc.threshold, gc.mem_free, ...).
+
+    Args:
+        radio (Radio): Radio shared by the boards, replaces the default one.
+        trace_alloc (bool): Start tracemalloc so gc.mem_free() reflects Python allocations.
+    """
+    sys.modules["machine"] = machine
+    sys.modules["micropython"] = micropython
+    sys.modules["framebuf"] = framebuf
+    sys.modules["bluetooth"] = bluetooth
+    sys.modules["aioble"] = aioble
+    sys.modules["aioble.client"] = aioble
+
+    time.ticks_ms = ticks_ms
+    time.ticks_us = ticks_us
+    time.ticks_add = ticks_add
+    time.ticks_diff = ticks_diff
+    time.sleep_ms = sleep_ms
+    time.sleep_us = sleep_us
+
+    asyncio.sleep_ms = _sleep_ms
+    asyncio.wait_for_ms = _wait_for_ms
+    asyncio.ThreadSafeFlag = ThreadSafeFlag
+
+    if not hasattr(gc, "threshold"):
+        gc.threshold = lambda *args: -1
+    gc.mem_alloc = _mem_alloc
+    gc.mem_free = _mem_free
+    if trace_alloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    if radio is not None:
+        default_board.radio = radio
+        Radio.default = radio
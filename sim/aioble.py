@@ -0,0 +1,858 @@
+# Fake aioble
+# An in-process BLE stack with the aioble API the GamePad code uses. Boards
+# advertise, scan and connect to each other through a sim.radio.Radio, and
+# GATT traffic is timed by connection events with configurable packet loss.
+
+import asyncio
+from collections import deque
+
+from sim.bluetooth import UUID, FLAG_READ, FLAG_WRITE, FLAG_NOTIFY, FLAG_INDICATE
+from sim.board import current_board
+from sim.radio import CENTRAL_TO_PERIPHERAL, PERIPHERAL_TO_CENTRAL, Link, LinkClosed
+
+ADDR_PUBLIC = 0
+ADDR_RANDOM = 1
+
+# aioble keeps one pending write per characteristic unless capture is set
+_WRITE_CAPTURE_QUEUE_LIMIT = 10
+
+# Client Characteristic Configuration descriptor, added to every notify/indicate characteristic
+_CCCD_UUID = 0x2902
+_CCCD_NOTIFY = 1
+_CCCD_INDICATE = 2
+
+# Largest random delay added to each advertising event
+ADV_DELAY_MAX_MS = 10
+
+# Advertising and scan response payloads are each limited to 31 bytes
+_ADV_PAYLOAD_MAX_LEN = 31
+
+# Advertising PDU types, as reported in scan results
+_ADV_IND = 0x00
+_ADV_SCAN_IND = 0x02
+_ADV_NONCONN_IND = 0x03
+_ADV_SCAN_RSP = 0x04
+
+# Advertising data field types
+_ADV_TYPE_FLAGS = 0x01
+_ADV_TYPE_UUID16_COMPLETE = 0x03
+_ADV_TYPE_UUID128_COMPLETE = 0x07
+_ADV_TYPE_NAME = 0x09
+_ADV_TYPE_APPEARANCE = 0x19
+_ADV_TYPE_MANUFACTURER = 0xFF
+
+# ATT error codes
+_INVALID_HANDLE = 0x01
+_READ_NOT_PERMITTED = 0x02
+_WRITE_NOT_PERMITTED = 0x03
+
+
+class DeviceDisconnectedError(Exception):
+    pass
+
+
+class GattError(Exception):
+    def __init__(self, status=0):
+        self._status = status
+
+
+class _Core:
+    """
+    Stands in for aioble.core: other modules can hook the BLE IRQ events.
+    """
+
+    def __init__(self):
+        self.irq_handlers = []
+
+    def register_irq_handler(self, irq, shutdown=None):
+        self.irq_handlers.append(irq)
+
+    def dispatch(self, event, data):
+        for handler in self.irq_handlers:
+            result = handler(event, data)
+            if result is not None:
+                return result
+
+
+core = _Core()
+
+
+class Stack:
+    """
+    BLE state of one board.
+
+    Attributes:
+        board (Board): The board the stack runs on.
+        services (list): Services registered with register_services().
+        attributes (dict): GATT database, attribute handle -> characteristic or descriptor.
+        connections (list): Open DeviceConnection objects.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.radio = board.radio
+        self.services = []
+        self.attributes = {}
+        self.connections = []
+        self.advertisement = None
+        self.radio.stacks[board.addr] = self
+        self._handles = 0
+
+    def next_handle(self) -> int:
+        self._handles += 1
+        return self._handles
+
+
+def _stack() -> Stack:
+    board = current_board.get()
+    if board.ble is None:
+        board.ble = Stack(board)
+    return board.ble
+
+
+def config(*args, **kwargs):
+    if args and not kwargs:
+        return None
+
+
+def stop():
+    pass
+
+
+# Server (GATT server, usually on the peripheral)
+
+
+class Service:
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.characteristics = []
+
+
+class BaseCharacteristic:
+    def __init__(self, service, uuid, read=False, write=False, write_no_response=False,
+                 notify=False, indicate=False, initial=None, capture=False):
+        service.characteristics.append(self)
+        self.uuid = uuid
+        self.service = service
+        self.can_read = read
+        self.can_write = write or write_no_response
+        self.can_notify = notify
+        self.can_indicate = indicate
+        self._value = bytes(initial) if initial is not None else b""
+        self._capture = capture
+        self._write_queue = deque((), _WRITE_CAPTURE_QUEUE_LIMIT if capture else 1)
+        self._write_waiters = []
+        self._handle = None
+        self._end_handle = None
+
+    def _properties(self) -> int:
+        return (
+            (FLAG_READ if self.can_read else 0)
+            | (FLAG_WRITE if self.can_write else 0)
+            | (FLAG_NOTIFY if self.can_notify else 0)
+            | (FLAG_INDICATE if self.can_indicate else 0)
+        )
+
+    def read(self):
+        return self._value
+
+    def write(self, data, send_update=False):
+        self._value = bytes(data)
+        if send_update:
+            for connection in _stack().connections:
+                self.notify(connection)
+
+    async def written(self, timeout_ms=None):
+        while not self._write_queue:
+            waiter = asyncio.get_running_loop().create_future()
+            self._write_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, None if timeout_ms is None else timeout_ms / 1000)
+            finally:
+                if waiter in self._write_waiters:
+                    self._write_waiters.remove(waiter)
+        connection, data = self._write_queue.popleft()
+        if self._capture:
+            return connection, data
+        return connection
+
+    def _remote_read(self, connection):
+        return self._value
+
+    def _remote_write(self, connection, data):
+        self._value = bytes(data)
+        self._write_queue.append((connection, self._value))
+        waiters = self._write_waiters
+        self._write_waiters = []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+class Characteristic(BaseCharacteristic):
+    def notify(self, connection, data=None):
+        """
+        Sends a notification; like MicroPython it is sent whether or not the client subscribed.
+        """
+        if connection is None or not connection.is_connected():
+            raise OSError(128)  # ENOTCONN
+        payload = self._value if data is None else bytes(data)
+        link = connection._link
+        link.notifications += 1
+        link.radio.notifications += 1
+        link.deliver(PERIPHERAL_TO_CENTRAL, connection._peer._on_notify, self._handle, payload)
+
+    def indicate(self, connection, data=None, timeout_ms=1000):
+        self.notify(connection, data)
+
+
+class Descriptor(BaseCharacteristic):
+    def __init__(self, characteristic, uuid, read=False, write=False, initial=None):
+        super().__init__(characteristic.service, uuid, read=read, write=write, initial=initial)
+
+
+class _ClientConfig:
+    """
+    The CCCD the stack adds after a notify or indicate characteristic's value.
+
+    Like MicroPython, notifications go out whether or not a client enabled
+    them. Each connection has its own value, which starts at 0x0000 as the
+    spec requires for clients that aren't bonded.
+
+    Attributes:
+        values (dict): Value written over each connection, by the peripheral's connection object.
+    """
+
+    uuid = UUID(_CCCD_UUID)
+    can_read = True
+    can_write = True
+
+    def __init__(self):
+        self.values = {}
+
+    def _remote_read(self, connection):
+        return self.values.get(connection, b"\x00\x00")
+
+    def _remote_write(self, connection, data):
+        self.values[connection] = bytes(data)
+
+
+def register_services(*services):
+    """
+    Lays services out in the GATT database like the real stack: each
+    service, then each characteristic's declaration, value and CCCD, in
+    order. Registering again replaces the whole database.
+    """
+    stack = _stack()
+    stack.services = list(services)
+    stack.attributes = {}
+    stack._handles = 0
+    for service in services:
+        service._start_handle = stack.next_handle()
+        for characteristic in service.characteristics:
+            stack.next_handle()  # Characteristic declaration
+            characteristic._handle = stack.next_handle()
+            stack.attributes[characteristic._handle] = characteristic
+            if characteristic.can_notify or characteristic.can_indicate:
+                stack.attributes[stack.next_handle()] = _ClientConfig()
+            characteristic._end_handle = stack._handles
+        service._end_handle = stack._handles
+
+
+# Devices and connections
+
+
+class Device:
+    """
+    A remote device, identified by its address.
+    """
+
+    def __init__(self, addr_type, addr):
+        self.addr_type = addr_type
+        self.addr = bytes(addr)
+
+    def addr_hex(self) -> str:
+        return ":".join(f"{b:02x}" for b in self.addr)
+
+    def __eq__(self, other):
+        return isinstance(other, Device) and self.addr_type == other.addr_type and self.addr == other.addr
+
+    def __hash__(self):
+        return hash((self.addr_type, self.addr))
+
+    def __repr__(self):
+        return f"Device(ADDR_{'RANDOM' if self.addr_type else 'PUBLIC'}, {self.addr_hex()})"
+
+    async def connect(self, timeout_ms=10000, scan_duration_ms=None,
+                      min_conn_interval_us=None, max_conn_interval_us=None):
+        """
+        Connects to the device once it is advertising as connectable.
+
+        Raises:
+            asyncio.TimeoutError: If the device doesn't advertise within timeout_ms.
+        """
+        stack = _stack()
+        radio = stack.radio
+
+        async def wait_for_advertiser():
+            while True:
+                advertisement = radio.advertisers.get(self.addr)
+                if advertisement is not None and advertisement.connectable:
+                    # The initiator answers the next advertising event it hears
+                    await advertisement.next_event()
+                    if radio.advertisers.get(self.addr) is advertisement:
+                        return advertisement
+                    continue
+                await radio.advertising_changed()
+
+        advertisement = await asyncio.wait_for(wait_for_advertiser(), timeout_ms / 1000)
+        # then the first connection event follows
+        interval_ms = radio.interval_ms
+        if min_conn_interval_us is not None:
+            interval_ms = max(min_conn_interval_us, 7500) / 1000
+        link = Link(radio, interval_ms)
+        await asyncio.sleep(interval_ms / 1000)
+        peripheral = radio.stacks[self.addr]
+        central_side = DeviceConnection(stack, Device(ADDR_RANDOM, self.addr), link)
+        peripheral_side = DeviceConnection(peripheral, Device(ADDR_RANDOM, stack.board.addr), link)
+        central_side._peer = peripheral_side
+        peripheral_side._peer = central_side
+        advertisement.connected(peripheral_side)
+        return central_side
+
+
+class DeviceConnection:
+    """
+    One side of a connection.
+
+    Attributes:
+        device (Device): The device at the other end.
+    """
+
+    def __init__(self, stack, device, link):
+        self._stack = stack
+        self.device = device
+        self._link = link
+        self._peer = None
+        self._connected = True
+        self._disconnect_waiters = []
+        self._characteristics = {}  # handle -> ClientCharacteristic
+        stack.connections.append(self)
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def _check(self):
+        if not self._connected:
+            raise DeviceDisconnectedError()
+
+    def _close(self):
+        if not self._connected:
+            return
+        self._connected = False
+        self._link.closed = True
+        if self in self._stack.connections:
+            self._stack.connections.remove(self)
+        for characteristic in self._characteristics.values():
+            characteristic._wake()
+        waiters = self._disconnect_waiters
+        self._disconnect_waiters = []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _request(self):
+        # One ATT request and its response
+        try:
+            await self._link.request()
+        except LinkClosed:
+            raise DeviceDisconnectedError()
+
+    async def disconnect(self, timeout_ms=2000):
+        peer = self._peer
+        self._close()
+        if peer is not None:
+            peer._close()
+
+    async def disconnected(self, timeout_ms=None, disconnect=False):
+        if disconnect:
+            await self.disconnect()
+        if not self._connected:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._disconnect_waiters.append(waiter)
+        await asyncio.wait_for(waiter, None if timeout_ms is None else timeout_ms / 1000)
+
+    async def exchange_mtu(self, mtu=None, timeout_ms=1000):
+        await self._request()
+        return mtu or 23
+
+    async def service(self, uuid, timeout_ms=2000):
+        async for service in self.services(uuid, timeout_ms):
+            return service
+        return None
+
+    async def services(self, uuid=None, timeout_ms=2000):
+        self._check()
+        await self._request()
+        for service in self._peer._stack.services:
+            if uuid is None or service.uuid == uuid:
+                yield ClientService(self, service._start_handle, service._end_handle, service.uuid)
+
+    def _attributes(self, start_handle, end_handle):
+        # The peer's GATT database between two handles, inclusive
+        attributes = self._peer._stack.attributes
+        for handle in sorted(attributes):
+            if start_handle <= handle <= end_handle:
+                yield handle, attributes[handle]
+
+    def _on_notify(self, handle, data):
+        characteristic = self._characteristics.get(handle)
+        if characteristic is not None:
+            characteristic._on_notify(data)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.disconnect()
+
+    def __repr__(self):
+        return f"DeviceConnection({self.device!r})"
+
+
+# Client (GATT client, usually on the central)
+
+
+class ClientService:
+    """
+    A service on the remote device, like aioble's it is just its handle range.
+    """
+
+    def __init__(self, connection, start_handle, end_handle, uuid):
+        self.connection = connection
+        self._start_handle = start_handle
+        self._end_handle = end_handle
+        self.uuid = uuid
+
+    async def characteristic(self, uuid, timeout_ms=2000):
+        async for characteristic in self.characteristics(uuid, timeout_ms):
+            return characteristic
+        return None
+
+    async def characteristics(self, uuid=None, timeout_ms=2000):
+        self.connection._check()
+        await self.connection._request()
+        for handle, attribute in self.connection._attributes(self._start_handle, self._end_handle):
+            if isinstance(attribute, Characteristic) and (uuid is None or attribute.uuid == uuid):
+                yield ClientCharacteristic(
+                    self, attribute._end_handle, handle, attribute._properties(), attribute.uuid
+                )
+
+
+class BaseClientCharacteristic:
+    """
+    Reads and writes one attribute handle on the remote device.
+
+    The handle is only looked up when a request reaches the peer, so a stale
+    handle fails with GattError like it would against a real stack.
+    """
+
+    def __init__(self, value_handle, properties, uuid):
+        self._value_handle = value_handle
+        self.properties = properties
+        self.uuid = uuid
+
+    def _attribute(self):
+        # Runs on the peer's side of the link
+        return self.connection._peer._stack.attributes.get(self._value_handle)
+
+    async def read(self, timeout_ms=1000):
+        connection = self.connection
+        connection._check()
+        link = connection._link
+        link.gatt_ops += 1
+        link.radio.gatt_ops += 1
+        try:
+            await link.transfer(CENTRAL_TO_PERIPHERAL)
+            attribute = self._attribute()
+            value = None
+            if attribute is not None and attribute.can_read:
+                value = attribute._remote_read(connection._peer)
+            await link.transfer(PERIPHERAL_TO_CENTRAL)
+        except LinkClosed:
+            raise DeviceDisconnectedError()
+        if attribute is None:
+            raise GattError(_INVALID_HANDLE)
+        if value is None:
+            raise GattError(_READ_NOT_PERMITTED)
+        return value
+
+    async def write(self, data, response=None, timeout_ms=1000):
+        connection = self.connection
+        connection._check()
+        link = connection._link
+        link.gatt_ops += 1
+        link.radio.gatt_ops += 1
+        try:
+            await link.transfer(CENTRAL_TO_PERIPHERAL)
+            attribute = self._attribute()
+            if attribute is not None and attribute.can_write:
+                attribute._remote_write(connection._peer, data)
+            if response:
+                await link.transfer(PERIPHERAL_TO_CENTRAL)
+        except LinkClosed:
+            raise DeviceDisconnectedError()
+        # Failed writes without response go unnoticed, as over the air
+        if response and attribute is None:
+            raise GattError(_INVALID_HANDLE)
+        if response and not attribute.can_write:
+            raise GattError(_WRITE_NOT_PERMITTED)
+
+
+class ClientCharacteristic(BaseClientCharacteristic):
+    """
+    A characteristic on the remote device.
+
+    Notifications are kept in a one-entry queue like aioble's, so one that is
+    not collected with notified() before the next arrives is replaced. Like
+    aioble, notifications only reach the characteristic once subscribe() or
+    notified() has registered it with the connection.
+    """
+
+    def __init__(self, service, end_handle, value_handle, properties, uuid):
+        self.service = service
+        self.connection = service.connection
+        self._end_handle = end_handle
+        super().__init__(value_handle, properties, uuid)
+        self._notify_queue = deque((), 1)
+        self._notify_waiters = []
+        self.subscribed = False
+
+    def _register_with_connection(self):
+        self.connection._characteristics[self._value_handle] = self
+
+    def _on_notify(self, data):
+        self._notify_queue.append(data)
+        self._wake()
+
+    def _wake(self):
+        waiters = self._notify_waiters
+        self._notify_waiters = []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def descriptor(self, uuid, timeout_ms=2000):
+        async for descriptor in self.descriptors(uuid, timeout_ms):
+            return descriptor
+        return None
+
+    async def descriptors(self, uuid=None, timeout_ms=2000):
+        self.connection._check()
+        await self.connection._request()
+        for handle, attribute in self.connection._attributes(self._value_handle + 1, self._end_handle):
+            if uuid is None or attribute.uuid == uuid:
+                yield ClientDescriptor(self, handle, attribute.uuid)
+
+    async def subscribe(self, notify=True, indicate=False):
+        self._register_with_connection()
+        cccd = await self.descriptor(UUID(_CCCD_UUID))
+        if cccd is None:
+            raise ValueError("CCCD not found")
+        await cccd.write(bytes((_CCCD_NOTIFY * notify + _CCCD_INDICATE * indicate, 0)), True)
+        self.subscribed = notify or indicate
+
+    async def notified(self, timeout_ms=None):
+        self._register_with_connection()
+        while not self._notify_queue:
+            self.connection._check()
+            waiter = asyncio.get_running_loop().create_future()
+            self._notify_waiters.append(waiter)
+            await asyncio.wait_for(waiter, None if timeout_ms is None else timeout_ms / 1000)
+        return self._notify_queue.popleft()
+
+    async def indicated(self, timeout_ms=None):
+        return await self.notified(timeout_ms)
+
+
+class ClientDescriptor(BaseClientCharacteristic):
+    """
+    A descriptor on the remote device.
+    """
+
+    def __init__(self, characteristic, dsc_handle, uuid):
+        self.characteristic = characteristic
+        self.connection = characteristic.connection
+        super().__init__(dsc_handle, FLAG_READ | FLAG_WRITE, uuid)
+
+
+# Advertising and scanning
+
+
+def _append(adv_data, resp_data, adv_type, value):
+    # aioble's packing: a field goes in the advertisement while the total stays
+    # under the limit, then in the scan response, which is only sent to active scans
+    data = bytes((len(value) + 1, adv_type)) + value
+    if len(data) + len(adv_data) < _ADV_PAYLOAD_MAX_LEN:
+        adv_data += data
+        return resp_data
+    if len(data) + (len(resp_data) if resp_data else 0) < _ADV_PAYLOAD_MAX_LEN:
+        if not resp_data:
+            resp_data = bytearray()
+        resp_data += data
+        return resp_data
+    raise ValueError("Advertising payload too long")
+
+
+class Advertisement:
+    """
+    What a board is currently advertising.
+
+    Attributes:
+        adv_type (int): _ADV_IND, _ADV_SCAN_IND or _ADV_NONCONN_IND, as MicroPython picks it.
+        adv_data (bytes): The advertising payload.
+        resp_data (bytes): The scan response payload, None if there is none.
+    """
+
+    def __init__(self, stack, interval_us, connectable, adv_data=None, resp_data=None, limited_disc=False,
+                 name=None, services=None, appearance=0, manufacturer=None):
+        self.stack = stack
+        self.interval_us = interval_us
+        self.connectable = connectable
+        if not adv_data and not resp_data:
+            # Built from the keyword arguments in aioble's order
+            adv_data = bytearray()
+            flags = (0x01 if limited_disc else 0x02) + 0x18
+            resp_data = _append(adv_data, resp_data, _ADV_TYPE_FLAGS, bytes((flags,)))
+            for uuid in services or ():
+                uuid = bytes(uuid)
+                adv_type = _ADV_TYPE_UUID16_COMPLETE if len(uuid) == 2 else _ADV_TYPE_UUID128_COMPLETE
+                resp_data = _append(adv_data, resp_data, adv_type, uuid)
+            if name:
+                resp_data = _append(adv_data, resp_data, _ADV_TYPE_NAME, name.encode())
+            if appearance:
+                resp_data = _append(adv_data, resp_data, _ADV_TYPE_APPEARANCE, appearance.to_bytes(2, "little"))
+            if manufacturer:
+                resp_data = _append(
+                    adv_data, resp_data, _ADV_TYPE_MANUFACTURER,
+                    manufacturer[0].to_bytes(2, "little") + bytes(manufacturer[1]),
+                )
+        self.adv_data = bytes(adv_data) if adv_data else b""
+        self.resp_data = bytes(resp_data) if resp_data else None
+        if connectable:
+            self.adv_type = _ADV_IND
+        elif self.resp_data:
+            self.adv_type = _ADV_SCAN_IND
+        else:
+            self.adv_type = _ADV_NONCONN_IND
+        self._connection = asyncio.get_running_loop().create_future()
+        self._initiators = []
+
+    def connected(self, connection):
+        if not self._connection.done():
+            self._connection.set_result(connection)
+
+    async def next_event(self):
+        """
+        Waits until an initiator hears one of this advertisement's events, or it stops.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self._initiators.append(waiter)
+        await waiter
+
+    def _wake_initiators(self, stopped=False):
+        waiters = self._initiators
+        self._initiators = []
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            if not stopped and self.stack.radio.lost():
+                self._initiators.append(waiter)  # Missed it, wait for the next event
+            else:
+                waiter.set_result(None)
+
+    async def broadcast(self):
+        # One advertising packet per interval to every scanner and initiator in
+        # range, each event pushed back by the 0-10 ms random advDelay the spec adds
+        radio = self.stack.radio
+        addr = self.stack.board.addr
+        while True:
+            radio.advertisements += 1
+            for scanner in list(radio.scanners):
+                scanner._hear(addr, self)
+            self._wake_initiators()
+            await asyncio.sleep(self.interval_us / 1_000_000 + radio.random.uniform(0, ADV_DELAY_MAX_MS / 1000))
+
+
+async def advertise(interval_us, adv_data=None, resp_data=None, connectable=True, limited_disc=False,
+                    include_tx_power=False, name=None, services=None, appearance=0, manufacturer=None,
+                    timeout_ms=None):
+    """
+    Advertises until a central connects.
+
+    Raises:
+        ValueError: If the fields don't fit in the advertisement and scan response.
+
+    Returns:
+        DeviceConnection: The new connection (None for non-connectable advertising that timed out).
+    """
+    stack = _stack()
+    radio = stack.radio
+    advertisement = Advertisement(
+        stack, interval_us, connectable, adv_data, resp_data, limited_disc, name, services, appearance, manufacturer
+    )
+    stack.advertisement = advertisement
+    radio.start_advertising(stack.board.addr, advertisement)
+    broadcaster = asyncio.create_task(advertisement.broadcast())
+    try:
+        timeout = None if timeout_ms is None else timeout_ms / 1000
+        if connectable:
+            return await asyncio.wait_for(advertisement._connection, timeout)
+        if timeout is not None:
+            await asyncio.sleep(timeout)
+        else:
+            await asyncio.Event().wait()
+        return None
+    finally:
+        broadcaster.cancel()
+        radio.stop_advertising(stack.board.addr, advertisement)
+        advertisement._wake_initiators(stopped=True)
+        if stack.advertisement is advertisement:
+            stack.advertisement = None
+
+
+class ScanResult:
+    """
+    A device heard by a scan, decoded from the payloads actually received.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.adv_data = None
+        self.resp_data = None
+        self.rssi = None
+        self.connectable = False
+
+    def _update(self, adv_type, rssi, adv_data) -> bool:
+        # aioble's rules: a result is reported again when its data changed, and
+        # a scannable, non-connectable one only once it has scan response data
+        updated = False
+        if rssi != self.rssi:
+            self.rssi = rssi
+            updated = True
+        if adv_type in (_ADV_IND, _ADV_NONCONN_IND):
+            if adv_data != self.adv_data:
+                self.adv_data = adv_data
+                self.connectable = adv_type == _ADV_IND
+                updated = True
+        elif adv_type == _ADV_SCAN_IND:
+            if adv_data != self.adv_data and self.resp_data:
+                updated = True
+            self.adv_data = adv_data
+        elif adv_type == _ADV_SCAN_RSP and adv_data:
+            if adv_data != self.resp_data:
+                self.resp_data = adv_data
+                updated = True
+        return updated
+
+    def _decode_field(self, *adv_type):
+        for payload in (self.adv_data, self.resp_data):
+            if not payload:
+                continue
+            i = 0
+            while i + 1 < len(payload):
+                if payload[i + 1] in adv_type:
+                    yield payload[i + 2:i + payload[i] + 1]
+                i += 1 + payload[i]
+
+    def name(self):
+        for name in self._decode_field(_ADV_TYPE_NAME):
+            return str(name, "utf-8") if name else ""
+
+    def services(self):
+        for uuid in self._decode_field(_ADV_TYPE_UUID16_COMPLETE, _ADV_TYPE_UUID128_COMPLETE):
+            yield UUID(uuid)
+
+    def manufacturer(self, filter=None):
+        for data in self._decode_field(_ADV_TYPE_MANUFACTURER):
+            if len(data) < 2:
+                continue
+            company = int.from_bytes(data[:2], "little")
+            if filter is None or company == filter:
+                yield company, bytes(data[2:])
+
+    def __repr__(self):
+        return f"ScanResult({self.device!r}, {self.name()!r})"
+
+
+class scan:
+    """
+    Scans for advertisements for duration_ms (0 scans until the block exits). Only
+    an active scan receives scan responses.
+    """
+
+    def __init__(self, duration_ms, interval_us=1280000, window_us=11250, active=False, **kwargs):
+        self._duration_ms = duration_ms
+        self._active = active
+        self._duty = min(window_us / interval_us, 1.0) if interval_us else 1.0
+        self._results = {}
+        self._queue = deque()
+        self._waiter = None
+        self._radio = None
+        self._deadline = None
+
+    async def __aenter__(self):
+        self._radio = _stack().radio
+        self._radio.scanners.append(self)
+        loop = asyncio.get_running_loop()
+        self._deadline = loop.time() + self._duration_ms / 1000 if self._duration_ms else None
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.cancel()
+
+    def cancel(self):
+        if self._radio is not None and self in self._radio.scanners:
+            self._radio.scanners.remove(self)
+
+    def _hear(self, addr, advertisement):
+        if self._duty < 1.0 and self._radio.random.random() > self._duty:
+            return
+        if self._radio.lost():
+            return
+        result = self._results.get(addr)
+        if result is None:
+            result = self._results[addr] = ScanResult(Device(ADDR_RANDOM, addr))
+        self._report(result, advertisement.adv_type, advertisement.adv_data)
+        # Only an active scan asks scannable advertisers for their scan response
+        if self._active and advertisement.adv_type != _ADV_NONCONN_IND and not self._radio.lost():
+            self._report(result, _ADV_SCAN_RSP, advertisement.resp_data)
+
+    def _report(self, result, adv_type, adv_data):
+        if result._update(adv_type, -50, adv_data):
+            self._queue.append(result)
+            if self._waiter is not None and not self._waiter.done():
+                self._waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+        while not self._queue:
+            if self not in self._radio.scanners:
+                raise StopAsyncIteration
+            timeout = None
+            if self._deadline is not None:
+                timeout = self._deadline - loop.time()
+                if timeout <= 0:
+                    self.cancel()
+                    raise StopAsyncIteration
+            self._waiter = loop.create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout)
+            except asyncio.TimeoutError:
+                self.cancel()
+                raise StopAsyncIteration
+        return self._queue.popleft()
@@ -0,0 +1,46 @@
+# Benchmark helpers
+# Timing, waiting and summary statistics shared by the bench_*.py scripts
+# and the tests that run on the simulator.
+
+import asyncio
+import time
+
+
+def now_us() -> int:
+    return time.monotonic_ns() // 1000
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarise(samples, scale: float = 1):
+    """
+    Summary statistics of a list of samples, each divided by scale.
+
+    Returns:
+        dict: p50, p95, p99, max and mean.
+    """
+    return {
+        "p50": percentile(samples, 0.50) / scale,
+        "p95": percentile(samples, 0.95) / scale,
+        "p99": percentile(samples, 0.99) / scale,
+        "max": max(samples) / scale,
+        "mean": sum(samples) / len(samples) / scale,
+    }
+
+
+async def wait_until(condition, timeout_s: float = 5.0):
+    """
+    Polls condition() on the event loop until it is true.
+
+    Raises:
+        TimeoutError: If it is still false after timeout_s.
+    """
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met in time")
+        await asyncio.sleep(0.0005)
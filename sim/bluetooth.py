@@ -0,0 +1,66 @@
+# Fake bluetooth module
+# Only the parts aioble users touch directly: UUID and the characteristic flags.
+
+FLAG_BROADCAST = 0x0001
+FLAG_READ = 0x0002
+FLAG_WRITE_NO_RESPONSE = 0x0004
+FLAG_WRITE = 0x0008
+FLAG_NOTIFY = 0x0010
+FLAG_INDICATE = 0x0020
+
+
+class UUID:
+    """
+    bluetooth.UUID, from a 16-bit integer, a 128-bit string or their little endian bytes.
+    """
+
+    def __init__(self, value):
+        if isinstance(value, UUID):
+            value = value._value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            value = bytes(value)
+            if len(value) == 2:
+                value = int.from_bytes(value, "little")
+            else:
+                value = value[::-1].hex()
+                value = f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+        if isinstance(value, str):
+            value = value.lower()
+        self._value = value
+
+    def __eq__(self, other):
+        return isinstance(other, UUID) and self._value == other._value
+
+    def __hash__(self):
+        return hash(self._value)
+
+    def __bytes__(self):
+        if isinstance(self._value, int):
+            return self._value.to_bytes(2, "little")
+        return bytes.fromhex(self._value.replace("-", ""))[::-1]
+
+    def __repr__(self):
+        if isinstance(self._value, int):
+            return f"UUID(0x{self._value:04x})"
+        return f"UUID('{self._value}')"
+
+
+class BLE:
+    """
+    Placeholder for bluetooth.BLE; the simulated aioble does not go through it.
+    """
+
+    def __init__(self):
+        self._active = False
+
+    def active(self, value=None):
+        if value is not None:
+            self._active = bool(value)
+        return self._active
+
+    def config(self, *args, **kwargs):
+        if args and not kwargs:
+            return None
+
+    def irq(self, handler):
+        pass
@@ -0,0 +1,73 @@
+# Simulated boards
+# Each Board is one Pico: its own pins, PWM slices, buses and BLE stack.
+
+import contextvars
+
+
+class Board:
+    """
+    A simulated microcontroller.
+
+    Use it as a context manager; hardware and BLE objects created inside the
+    block, and asyncio tasks started there, belong to this board.
+
+    Attributes:
+        name (str): Name used for the board's BLE address.
+        radio (Radio): The radio the board's BLE stack talks through.
+        pins (dict): Pin objects by id, shared by every Pin(id) on this board.
+        pwms (dict): PWM objects by pin id.
+        i2c_buses (list): I2C buses created on the board.
+        spi_buses (list): SPI buses created on the board.
+        ble (sim.aioble.Stack): The board's BLE stack, created on first use.
+    """
+
+    def __init__(self, name: str = "board", radio=None):
+        from sim.radio import Radio
+
+        self.name = name
+        self.radio = radio if radio is not None else Radio.default
+        self.pins = {}
+        self.pwms = {}
+        self.i2c_buses = []
+        self.spi_buses = []
+        self.ble = None
+        self._tokens = []
+
+    @property
+    def addr(self) -> bytes:
+        """
+        Static random BLE address derived from the board name.
+        """
+        value = 0
+        for char in self.name.encode():
+            value = (value * 131 + char) & 0xFFFFFFFFFFFF
+        return bytes(((value >> (8 * i)) & 0xFF for i in range(6))) if value else bytes(6)
+
+    def pin(self, id):
+        """
+        Returns the board's Pin with this id, creating it as an input if needed.
+        """
+        from sim.machine import Pin
+
+        if id not in self.pins:
+            token = current_board.set(self)
+            try:
+                Pin(id, Pin.IN)
+            finally:
+                current_board.reset(token)
+        return self.pins[id]
+
+    def __enter__(self):
+        self._tokens.append(current_board.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        current_board.reset(self._tokens.pop())
+        return False
+
+    def __repr__(self):
+        return f"<Board {self.name}>"
+
+
+default_board = Board("default")
+current_board = contextvars.ContextVar("current_board", default=default_board)
@@ -0,0 +1,149 @@
+# Fake framebuf module
+# MONO_VLSB only, which is what the SSD1306 uses: each byte is a column of 8
+# vertical pixels, least significant bit at the top, rows of bytes are pages.
+#
+# text() uses placeholder glyphs derived from the character code rather than
+# the MicroPython 8x8 font: they have the same footprint (8x8, blank for a
+# space), which is what the display benchmarks care about.
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+RGB565 = 1
+GS2_HMSB = 5
+GS4_HMSB = 2
+GS8 = 6
+
+
+def _glyph(char: str) -> bytes:
+    code = ord(char)
+    if code == 32:
+        return bytes(8)
+    seed = (code * 2654435761) & 0xFFFFFFFF
+    columns = bytearray(8)
+    for x in range(1, 7):
+        seed = (seed * 1103515245 + 12345) & 0xFFFFFFFF
+        columns[x] = ((seed >> 16) & 0x7E) | 0x02
+    return bytes(columns)
+
+
+class FrameBuffer:
+    """
+    framebuf.FrameBuffer for MONO_VLSB buffers.
+    """
+
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError("only MONO_VLSB is simulated")
+        self._fb_buffer = buffer
+        self._fb_width = width
+        self._fb_height = height
+        self._fb_stride = width if stride is None else stride
+
+    def _set(self, x, y, c):
+        if 0 <= x < self._fb_width and 0 <= y < self._fb_height:
+            index = (y >> 3) * self._fb_stride + x
+            if c:
+                self._fb_buffer[index] |= 1 << (y & 7)
+            else:
+                self._fb_buffer[index] &= ~(1 << (y & 7)) & 0xFF
+
+    def _get(self, x, y):
+        if 0 <= x < self._fb_width and 0 <= y < self._fb_height:
+            return (self._fb_buffer[(y >> 3) * self._fb_stride + x] >> (y & 7)) & 1
+        return 0
+
+    def fill(self, c):
+        value = 0xFF if c else 0x00
+        buffer = self._fb_buffer
+        for i in range(len(buffer)):
+            buffer[i] = value
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            return self._get(x, y)
+        self._set(x, y, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(y, 0), min(y + h, self._fb_height)):
+            for xx in range(max(x, 0), min(x + w, self._fb_width)):
+                self._set(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+        else:
+            self.hline(x, y, w, c)
+            self.hline(x, y + h - 1, w, c)
+            self.vline(x, y, h, c)
+            self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self._set(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def ellipse(self, x, y, xr, yr, c, f=False, m=0xF):
+        for yy in range(-yr, yr + 1):
+            for xx in range(-xr, xr + 1):
+                inside = (xx * xx) * (yr * yr) + (yy * yy) * (xr * xr) <= (xr * xr) * (yr * yr)
+                if inside and (f or not self._inside(xx, yy, xr - 1, yr - 1)):
+                    self._set(x + xx, y + yy, c)
+
+    @staticmethod
+    def _inside(xx, yy, xr, yr):
+        if xr <= 0 or yr <= 0:
+            return False
+        return (xx * xx) * (yr * yr) + (yy * yy) * (xr * xr) <= (xr * xr) * (yr * yr)
+
+    def poly(self, x, y, coords, c, f=False):
+        points = [(x + coords[i], y + coords[i + 1]) for i in range(0, len(coords), 2)]
+        for i, (x1, y1) in enumerate(points):
+            x2, y2 = points[(i + 1) % len(points)]
+            self.line(x1, y1, x2, y2, c)
+
+    def text(self, s, x, y, c=1):
+        for i, char in enumerate(s):
+            glyph = _glyph(char)
+            for col in range(8):
+                bits = glyph[col]
+                for row in range(8):
+                    if bits >> row & 1:
+                        self._set(x + 8 * i + col, y + row, c)
+
+    def scroll(self, xstep, ystep):
+        width = self._fb_width
+        height = self._fb_height
+        pixels = [[self._get(xx, yy) for xx in range(width)] for yy in range(height)]
+        for yy in range(height):
+            for xx in range(width):
+                sx = xx - xstep
+                sy = yy - ystep
+                if 0 <= sx < width and 0 <= sy < height:
+                    self._set(xx, yy, pixels[sy][sx])
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for yy in range(fbuf._fb_height):
+            for xx in range(fbuf._fb_width):
+                c = fbuf._get(xx, yy)
+                if c != key:
+                    self._set(x + xx, y + yy, c)
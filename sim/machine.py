@@ -0,0 +1,409 @@
+# Fake machine module
+# Pins take scripted input waveforms and record every output write, PWM
+# records duty changes, and the buses record (and optionally time) traffic.
+
+import asyncio
+import random
+import time
+
+from sim.board import current_board
+
+
+def _now_us() -> int:
+    return time.monotonic_ns() // 1000
+
+
+class Pin:
+    """
+    machine.Pin on a simulated board.
+
+    Pin(id) returns the same object every time for a given board, so tests
+    can grab a pin the code under test created with board.pin(id).
+
+    Attributes:
+        id: The pin id (GPIO number or a name such as "LED").
+        mode (int): IN, OUT or OPEN_DRAIN.
+        pull (int): PULL_UP, PULL_DOWN or None.
+        history (list): (monotonic us, level) for every output write.
+        writes (int): Number of output writes, including ones that left the level unchanged.
+    """
+
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    ALT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __new__(cls, id, *args, **kwargs):
+        board = current_board.get()
+        pin = board.pins.get(id)
+        if pin is None:
+            pin = super().__new__(cls)
+            pin.id = id
+            pin.board = board
+            pin.mode = Pin.IN
+            pin.pull = None
+            pin._level = 0
+            pin._driven = None
+            pin._irq_handler = None
+            pin._irq_trigger = 0
+            pin.history = []
+            pin.writes = 0
+            pin._on_write = None
+            pin._pulse = None
+            board.pins[id] = pin
+        return pin
+
+    def __init__(self, id, mode=-1, pull=-1, *, value=None, **kwargs):
+        self.init(mode, pull, value=value)
+
+    def init(self, mode=-1, pull=-1, *, value=None, **kwargs):
+        if mode != -1:
+            self.mode = mode
+        if pull != -1:
+            self.pull = pull
+        if value is not None:
+            self.value(value)
+        self._update_input()
+
+    def _update_input(self):
+        if self.mode == Pin.OUT:
+            return
+        if self._driven is not None:
+            level = self._driven
+        elif self.pull == Pin.PULL_UP:
+            level = 1
+        else:
+            level = 0
+        self._set_level(level)
+
+    def _set_level(self, level: int):
+        previous = self._level
+        self._level = level
+        if level != previous and self._irq_handler is not None:
+            if (level and self._irq_trigger & Pin.IRQ_RISING) or (
+                not level and self._irq_trigger & Pin.IRQ_FALLING
+            ):
+                self._irq_handler(self)
+
+    def value(self, value=None):
+        if value is None:
+            return self._level
+        value = 1 if value else 0
+        self.writes += 1
+        self.history.append((_now_us(), value))
+        if self.mode == Pin.OUT or self.mode == Pin.OPEN_DRAIN:
+            self._set_level(value)
+        if self._on_write is not None:
+            self._on_write(value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    high = on
+    low = off
+
+    def toggle(self):
+        self.value(not self._level)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._irq_handler = handler
+        self._irq_trigger = trigger
+
+    # Scripting, not part of machine.Pin
+
+    def drive(self, level):
+        """
+        Drives an input pin from outside, like a button or a sensor would.
+
+        Args:
+            level (int): 0 or 1, or None to release the pin to its pull.
+        """
+        self._driven = None if level is None else (1 if level else 0)
+        self._update_input()
+
+    async def play(self, waveform):
+        """
+        Drives the pin through a waveform.
+
+        Args:
+            waveform (iterable): (delay_ms, level) steps, each applied delay_ms after the previous one.
+        """
+        for delay_ms, level in waveform:
+            if delay_ms:
+                await asyncio.sleep(delay_ms / 1000)
+            self.drive(level)
+
+    def __repr__(self):
+        return f"Pin({self.id!r})"
+
+
+class Ultrasonic:
+    """
+    An HC-SR04 style range finder wired to two simulated pins.
+
+    Each trigger pulse makes the sensor drive an echo pulse as wide as the
+    round trip to an object distance_cm away, plus up to jitter_us either
+    way. The echo shows up both as pin edges (and IRQs) on the event loop
+    and to a blocking time_pulse_us() on the echo pin.
+
+    Attributes:
+        distance_cm (float): Distance to the object, None when nothing is in range.
+        jitter_us (float): Largest random error added to each echo.
+        missing (float): Probability that an echo never comes back.
+        triggers (int): Trigger pulses seen.
+    """
+
+    ECHO_DELAY_US = 450  # Trigger to echo start, while the sensor sends its burst
+    EDGE_LEAD_S = 0.002  # How early echo edges are scheduled on the event loop
+
+    def __init__(self, trigger, echo, distance_cm: float = 100.0, jitter_us: float = 0, missing: float = 0.0, seed=None):
+        self.trigger = trigger
+        self.echo = echo
+        self.distance_cm = distance_cm
+        self.jitter_us = jitter_us
+        self.missing = missing
+        self.random = random.Random(seed)
+        self.triggers = 0
+        self._armed = False
+        trigger._on_write = self._trigger_written
+
+    def _trigger_written(self, level):
+        if level:
+            self._armed = True
+            return
+        if not self._armed:
+            return
+        self._armed = False
+        self.triggers += 1
+        echo = self.echo
+        if self.distance_cm is None or self.random.random() < self.missing:
+            echo._pulse = None
+            return
+        width = self.distance_cm * 2 / 0.0343
+        if self.jitter_us:
+            width += self.random.uniform(-self.jitter_us, self.jitter_us)
+        width = max(int(width), 1)
+        echo._pulse = (self.ECHO_DELAY_US, width)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        rise = time.monotonic() + self.ECHO_DELAY_US / 1e6
+        loop.call_at(rise - self.EDGE_LEAD_S, self._edge, loop, 1, rise, rise + width / 1e6)
+
+    def _edge(self, loop, level, when, fall=None):
+        # The event loop only wakes to the nearest ms, so edges are scheduled
+        # early and the rest is waited out here, keeping IRQ timestamps exact
+        while time.monotonic() < when:
+            pass
+        self.echo.drive(level)
+        if fall is not None:
+            if fall - time.monotonic() > self.EDGE_LEAD_S:
+                loop.call_at(fall - self.EDGE_LEAD_S, self._edge, loop, 0, fall)
+            else:
+                self._edge(loop, 0, fall)
+
+
+def time_pulse_us(pin, pulse_level, timeout_us=1000000):
+    """
+    machine.time_pulse_us() for pulses scheduled by a simulated sensor.
+
+    Blocks for as long as the real call would.
+
+    Returns:
+        int: The pulse width in us, -2 if no pulse started within timeout_us, -1 if it lasted longer.
+    """
+    pulse = pin._pulse
+    pin._pulse = None
+    if pulse is None:
+        time.sleep(timeout_us / 1e6)
+        return -2
+    delay_us, width_us = pulse
+    if delay_us > timeout_us:
+        time.sleep(timeout_us / 1e6)
+        return -2
+    if width_us > timeout_us:
+        time.sleep((delay_us + timeout_us) / 1e6)
+        return -1
+    time.sleep((delay_us + width_us) / 1e6)
+    return width_us
+
+
+def bounce(level, edges: int = 5, spacing_ms: float = 0.2, settle_ms: float = 0):
+    """
+    Waveform of a contact bouncing before it settles at level.
+
+    Returns:
+        list: (delay_ms, level) steps for Pin.play().
+    """
+    steps = []
+    for edge in range(edges):
+        steps.append((spacing_ms if edge else settle_ms, level if edge % 2 == 0 else 1 - level))
+    steps.append((spacing_ms, level))
+    return steps
+
+
+class PWM:
+    """
+    machine.PWM on a simulated board.
+
+    Attributes:
+        pin (Pin): The output pin.
+        history (list): (monotonic us, duty_u16) for every duty write.
+        writes (int): Number of duty writes.
+    """
+
+    def __new__(cls, pin, *args, **kwargs):
+        board = pin.board
+        pwm = board.pwms.get(pin.id)
+        if pwm is None:
+            pwm = super().__new__(cls)
+            pwm.pin = pin
+            pwm._freq = 0
+            pwm._duty = 0
+            pwm.history = []
+            pwm.writes = 0
+            board.pwms[pin.id] = pwm
+        return pwm
+
+    def __init__(self, pin, *, freq=None, duty_u16=None, **kwargs):
+        if freq is not None:
+            self.freq(freq)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        value = int(value)
+        if not 0 <= value <= 65535:
+            raise ValueError("duty must be 0-65535")
+        self._duty = value
+        self.writes += 1
+        self.history.append((_now_us(), value))
+
+    def deinit(self):
+        pass
+
+    def __repr__(self):
+        return f"PWM({self.pin!r})"
+
+
+class I2C:
+    """
+    machine.I2C that records traffic.
+
+    Transfers block for as long as the bytes would take on a real bus at
+    freq, so the cost of display updates shows up in event loop timings.
+
+    Attributes:
+        transactions (int): Number of writeto/writevto calls.
+        bytes (int): Bytes written, addresses excluded.
+        log (list): (addr, bytes) of every transfer when record is True.
+        record (bool): Keep a copy of every transfer in log.
+        blocking (bool): Sleep for the simulated transfer time.
+    """
+
+    def __init__(self, id=0, *, scl=None, sda=None, freq=400_000, timeout=50_000):
+        self.id = id
+        self.freq = freq
+        self.transactions = 0
+        self.bytes = 0
+        self.log = []
+        self.record = False
+        self.blocking = True
+        current_board.get().i2c_buses.append(self)
+
+    def _transfer(self, addr, data):
+        self.transactions += 1
+        self.bytes += len(data)
+        if self.record:
+            self.log.append((addr, bytes(data)))
+        if self.blocking:
+            # 9 clocks per byte, plus the address byte
+            time.sleep(9 * (len(data) + 1) / self.freq)
+
+    def writeto(self, addr, buf, stop=True):
+        self._transfer(addr, buf)
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        data = b"".join(bytes(buf) for buf in vector)
+        self._transfer(addr, data)
+        return len(data)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return bytes(nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        for i in range(len(buf)):
+            buf[i] = 0
+
+    def scan(self):
+        return [0x3C]
+
+
+class SPI:
+    """
+    machine.SPI that records configuration changes and writes.
+
+    Attributes:
+        inits (int): Number of init() calls.
+        writes (int): Number of write() calls.
+        bytes (int): Bytes written.
+    """
+
+    def __init__(self, id=0, baudrate=1_000_000, *, polarity=0, phase=0, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.inits = 0
+        self.writes = 0
+        self.bytes = 0
+        current_board.get().spi_buses.append(self)
+
+    def init(self, baudrate=None, *, polarity=0, phase=0, **kwargs):
+        self.inits += 1
+        if baudrate is not None:
+            self.baudrate = baudrate
+
+    def write(self, buf):
+        self.writes += 1
+        self.bytes += len(buf)
+
+    def deinit(self):
+        pass
+
+
+def freq(value=None):
+    return 125_000_000
+
+
+def unique_id():
+    return current_board.get().addr
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
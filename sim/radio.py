@@ -0,0 +1,175 @@
+# Simulated radio
+# Connection-event timing, packet loss and traffic counters for the
+# in-process aioble. Packets are only exchanged at connection events, one
+# connection interval apart; a lost packet is retried at the next event, so
+# loss shows up as latency, as it does on a real BLE link.
+
+import asyncio
+import math
+import random
+import time
+
+# Directions of travel on a link
+CENTRAL_TO_PERIPHERAL = 0
+PERIPHERAL_TO_CENTRAL = 1
+
+
+class LinkClosed(Exception):
+    pass
+
+
+class Radio:
+    """
+    The air between simulated boards.
+
+    Attributes:
+        interval_ms (float): Connection interval used when the central doesn't ask for one.
+        loss (float): Probability that any one packet is lost and has to be retried.
+        stacks (dict): BLE stacks by address.
+        advertisers (dict): Current advertisements by address.
+        scanners (list): Active scanners.
+        gatt_ops (int): GATT requests (reads, writes, discovery, subscribes) sent.
+        notifications (int): Notifications sent.
+        advertisements (int): Advertising packets sent.
+        packets_lost (int): Packets that had to be retried.
+    """
+
+    default = None
+
+    def __init__(self, interval_ms: float = 30.0, loss: float = 0.0, seed=None):
+        self.interval_ms = interval_ms
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.stacks = {}
+        self.advertisers = {}
+        self.scanners = []
+        self._waiters = []
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.gatt_ops = 0
+        self.notifications = 0
+        self.advertisements = 0
+        self.packets_lost = 0
+
+    def lost(self) -> bool:
+        """
+        Rolls the dice for one packet.
+        """
+        if self.loss and self.random.random() < self.loss:
+            self.packets_lost += 1
+            return True
+        return False
+
+    async def advertising_changed(self):
+        """
+        Waits until a board starts advertising.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def start_advertising(self, addr, advertisement):
+        self.advertisers[addr] = advertisement
+        waiters = self._waiters
+        self._waiters = []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def stop_advertising(self, addr, advertisement):
+        if self.advertisers.get(addr) is advertisement:
+            del self.advertisers[addr]
+
+
+class Link:
+    """
+    Timing of one connection.
+
+    Attributes:
+        radio (Radio): The radio the link runs on.
+        interval_ms (float): Connection interval.
+        latency (int): Peripheral latency (events the peripheral may skip when idle).
+        supervision_timeout_ms (int): Supervision timeout.
+        gatt_ops (int): GATT requests sent on this link.
+        notifications (int): Notifications sent on this link.
+        closed (bool): True once either side disconnected.
+    """
+
+    def __init__(self, radio: Radio, interval_ms: float, latency: int = 0, supervision_timeout_ms: int = 4000):
+        self.radio = radio
+        self.interval_ms = interval_ms
+        self.latency = latency
+        self.supervision_timeout_ms = supervision_timeout_ms
+        self.anchor = time.monotonic()
+        self.gatt_ops = 0
+        self.notifications = 0
+        self.closed = False
+        self._last = [0.0, 0.0]
+
+    def next_event(self, after: float) -> float:
+        """
+        Time of the first connection event strictly after `after`.
+        """
+        interval = self.interval_ms / 1000
+        count = math.floor((after - self.anchor) / interval) + 1
+        return self.anchor + count * interval
+
+    def delivery_time(self, direction: int) -> float:
+        """
+        When a packet queued now in this direction reaches the other side.
+
+        Packets in the same direction are delivered in order, a hair apart
+        so the event loop can't reorder packets sharing a connection event.
+        """
+        when = self.next_event(time.monotonic())
+        while self.radio.lost():
+            when += self.interval_ms / 1000
+        when = max(when, self._last[direction] + 1e-6)
+        self._last[direction] = when
+        return when
+
+    async def transfer(self, direction: int):
+        """
+        Waits for one packet to cross the link.
+
+        Raises:
+            LinkClosed: If the link was closed before or while the packet was in flight.
+        """
+        if self.closed:
+            raise LinkClosed()
+        delay = self.delivery_time(direction) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.closed:
+            raise LinkClosed()
+
+    async def request(self):
+        """
+        Waits for an ATT request from the central and its response.
+        """
+        self.gatt_ops += 1
+        self.radio.gatt_ops += 1
+        await self.transfer(CENTRAL_TO_PERIPHERAL)
+        await self.transfer(PERIPHERAL_TO_CENTRAL)
+
+    def deliver(self, direction: int, callback, *args):
+        """
+        Schedules callback to run when a packet sent now arrives, unless the link closes first.
+        """
+        loop = asyncio.get_running_loop()
+        # The event loop clock is time.monotonic(), so schedule on it directly
+        when = self.delivery_time(direction)
+
+        def arrive():
+            if not self.closed:
+                callback(*args)
+
+        loop.call_at(when, arrive)
+
+
+Radio.default = Radio()
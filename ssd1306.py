@@ -3,6 +3,12 @@
 from micropython import const
 import framebuf
 
+try:
+    import metrics
+    from time import ticks_us
+except ImportError:
+    metrics = None
+
 
 # register definitions
 SET_CONTRAST = const(0x81)
@@ -23,6 +29,29 @@ SET_PRECHARGE = const(0xD9)
 SET_VCOM_DESEL = const(0xDB)
 SET_CHARGE_PUMP = const(0x8D)
 
+# Longest command sequence sent in a single transfer
+CMD_BUFFER_SIZE = const(32)
+
+# Last driver to configure each shared SPI bus, keyed by id(spi)
+_spi_owners = {}
+
+
+def claim_spi(spi, owner):
+    """
+    Records that owner has configured spi for itself.
+
+    Drivers sharing an SPI bus call this whenever they (re)configure it, so
+    the others know to re-init the bus before their next transfer.
+
+    Returns:
+        bool: True if owner already held the bus and it needs no re-init.
+    """
+    key = id(spi)
+    if _spi_owners.get(key) is owner:
+        return True
+    _spi_owners[key] = owner
+    return False
+
 # Subclassing FrameBuffer provides support for graphics primitives
 # http://docs.micropython.org/en/latest/pyboard/library/framebuf.html
 class SSD1306(framebuf.FrameBuffer):
@@ -32,11 +61,21 @@ class SSD1306(framebuf.FrameBuffer):
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        # Columns touched on each page since the last show(), x0 > x1 when clean
+        self._dirty_x0 = bytearray(b"\xff" * self.pages)
+        self._dirty_x1 = bytearray(self.pages)
+        # Copy of the frame the display is showing, so unchanged bytes are never resent
+        self.shadow = bytearray(len(self.buffer))
+        self._view = memoryview(self.buffer)
+        self._shadow_view = memoryview(self.shadow)
+        self.bytes_sent = 0
+        # Column and page window, filled in by show() and sent as one command sequence
+        self._window = bytearray((SET_COL_ADDR, 0, 0, SET_PAGE_ADDR, 0, 0))
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
     def init_display(self):
-        for cmd in (
+        self.write_cmds((
             SET_DISP | 0x00,  # off
             # address setting
             SET_MEM_ADDR,
@@ -66,11 +105,10 @@ class SSD1306(framebuf.FrameBuffer):
             # charge pump
             SET_CHARGE_PUMP,
             0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01,
-        ):  # on
-            self.write_cmd(cmd)
+            SET_DISP | 0x01,  # on
+        ))
         self.fill(0)
-        self.show()
+        self.show(full=True)  # display RAM is random at power up, whatever the shadow says
 
     def poweroff(self):
         self.write_cmd(SET_DISP | 0x00)
@@ -79,31 +117,179 @@ class SSD1306(framebuf.FrameBuffer):
         self.write_cmd(SET_DISP | 0x01)
 
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self.write_cmds((SET_CONTRAST, contrast))
 
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
+    def write_cmds(self, cmds):
+        # Drivers that can batch commands override this
+        for cmd in cmds:
+            self.write_cmd(cmd)
+
     def clear(self):
         # Clear the display
         self.fill(0)
         self.show()
-        
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
-        if self.width == 64:
-            # displays with width of 64 pixels are shifted by 32
-            x0 += 32
-            x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+
+    def mark_dirty(self, x0, y0, x1, y1):
+        # Record that the rectangle (x0, y0)-(x1, y1) needs sending
+        if x0 > x1:
+            x0, x1 = x1, x0
+        if y0 > y1:
+            y0, y1 = y1, y0
+        if x1 < 0 or y1 < 0 or x0 >= self.width or y0 >= self.height:
+            return
+        x0 = max(x0, 0)
+        x1 = min(x1, self.width - 1)
+        for page in range(max(y0, 0) // 8, min(y1, self.height - 1) // 8 + 1):
+            if self._dirty_x0[page] > self._dirty_x1[page]:
+                self._dirty_x0[page] = x0
+                self._dirty_x1[page] = x1
+            else:
+                if x0 < self._dirty_x0[page]:
+                    self._dirty_x0[page] = x0
+                if x1 > self._dirty_x1[page]:
+                    self._dirty_x1[page] = x1
+
+    def mark_all_dirty(self):
+        for page in range(self.pages):
+            self._dirty_x0[page] = 0
+            self._dirty_x1[page] = self.width - 1
+
+    # Drawing primitives record the area they touch so show() can skip the rest
+    def fill(self, c):
+        self.mark_all_dirty()
+        super().fill(c)
+
+    def pixel(self, x, y, *c):
+        if c:
+            self.mark_dirty(x, y, x, y)
+        return super().pixel(x, y, *c)
+
+    def hline(self, x, y, w, c):
+        self.mark_dirty(x, y, x + w - 1, y)
+        super().hline(x, y, w, c)
+
+    def vline(self, x, y, h, c):
+        self.mark_dirty(x, y, x, y + h - 1)
+        super().vline(x, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        self.mark_dirty(x1, y1, x2, y2)
+        super().line(x1, y1, x2, y2, c)
+
+    def rect(self, x, y, w, h, c, *f):
+        self.mark_dirty(x, y, x + w - 1, y + h - 1)
+        super().rect(x, y, w, h, c, *f)
+
+    def fill_rect(self, x, y, w, h, c):
+        self.mark_dirty(x, y, x + w - 1, y + h - 1)
+        super().fill_rect(x, y, w, h, c)
+
+    def ellipse(self, x, y, xr, yr, c, *args):
+        self.mark_dirty(x - xr, y - yr, x + xr, y + yr)
+        super().ellipse(x, y, xr, yr, c, *args)
+
+    def poly(self, *args):
+        self.mark_all_dirty()
+        super().poly(*args)
+
+    def text(self, s, x, y, *c):
+        self.mark_dirty(x, y, x + 8 * len(s) - 1, y + 7)
+        super().text(s, x, y, *c)
+
+    def scroll(self, xstep, ystep):
+        self.mark_all_dirty()
+        super().scroll(xstep, ystep)
+
+    def blit(self, *args):
+        self.mark_all_dirty()
+        super().blit(*args)
+
+    def _diff_span(self, start, x0, x1):
+        # Narrows columns x0..x1 of the page at start to the bytes that differ from the shadow
+        view = self._view
+        shadow = self._shadow_view
+        if view[start + x0:start + x1 + 1] == shadow[start + x0:start + x1 + 1]:
+            return 255, 0
+        # Skip matching 8 column blocks (one character) from each end, then single bytes
+        while x1 - x0 >= 8 and view[start + x0:start + x0 + 8] == shadow[start + x0:start + x0 + 8]:
+            x0 += 8
+        while view[start + x0] == shadow[start + x0]:
+            x0 += 1
+        while x1 - x0 >= 8 and view[start + x1 - 7:start + x1 + 1] == shadow[start + x1 - 7:start + x1 + 1]:
+            x1 -= 8
+        while view[start + x1] == shadow[start + x1]:
+            x1 -= 1
+        return x0, x1
+
+    def show(self, full=False):
+        """
+        Sends the changed part of the framebuffer to the display.
+
+        Args:
+            full (bool): Send the whole framebuffer whatever has changed.
+        """
+        if metrics is None or not metrics.enabled:
+            self._flush(full)
+            return
+        start = ticks_us()
+        sent = self.bytes_sent
+        self._flush(full)
+        metrics.elapsed(metrics.OLED_SHOW, start)
+        metrics.count(metrics.OLED_FLUSHES)
+        metrics.count(metrics.OLED_BYTES, self.bytes_sent - sent)
+
+    def _flush(self, full):
+        """
+        Sends the changed part of the framebuffer to the display.
+
+        The areas drawn on since the last call are compared with a shadow copy
+        of the frame already sent, and only the bytes that differ go out. Each
+        page with changes gets its own column window; runs of fully changed
+        pages go out as one transfer.
+
+        Args:
+            full (bool): Send the whole framebuffer whatever has changed.
+        """
+        width = self.width
+        if full:
+            self.mark_all_dirty()
+        else:
+            for page in range(self.pages):
+                if self._dirty_x0[page] <= self._dirty_x1[page]:
+                    x0, x1 = self._diff_span(page * width, self._dirty_x0[page], self._dirty_x1[page])
+                    self._dirty_x0[page] = x0
+                    self._dirty_x1[page] = x1
+        offset = 32 if self.width == 64 else 0  # 64 pixel wide displays are shifted by 32
+        buffer = self._view
+        page = 0
+        while page < self.pages:
+            x0 = self._dirty_x0[page]
+            x1 = self._dirty_x1[page]
+            if x0 > x1:
+                page += 1
+                continue
+            last = page
+            if x0 == 0 and x1 == width - 1:
+                while last + 1 < self.pages and self._dirty_x0[last + 1] == 0 \
+                        and self._dirty_x1[last + 1] == width - 1:
+                    last += 1
+            window = self._window
+            window[1] = x0 + offset
+            window[2] = x1 + offset
+            window[4] = page
+            window[5] = last
+            self.write_cmds(window)
+            start = page * width + x0
+            end = last * width + x1 + 1
+            self.write_data(buffer[start:end])
+            self._shadow_view[start:end] = buffer[start:end]
+            for clean in range(page, last + 1):
+                self._dirty_x0[clean] = 255
+                self._dirty_x1[clean] = 0
+            page = last + 1
 
 
 class SSD1306_I2C(SSD1306):
@@ -112,16 +298,36 @@ class SSD1306_I2C(SSD1306):
         self.addr = addr
         self.temp = bytearray(2)
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
+        # Control byte plus up to CMD_BUFFER_SIZE commands, sent in one transaction
+        self.cmd_buffer = bytearray(1 + CMD_BUFFER_SIZE)
+        self.cmd_buffer[0] = 0x00  # Co=0, D/C#=0
+        self.cmd_view = memoryview(self.cmd_buffer)
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
         self.temp[0] = 0x80  # Co=1, D/C#=0
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
+        self.bytes_sent += 2
+
+    def write_cmds(self, cmds):
+        buf = self.cmd_buffer
+        count = 0
+        for cmd in cmds:
+            count += 1
+            buf[count] = cmd
+            if count == CMD_BUFFER_SIZE:
+                self.i2c.writeto(self.addr, self.cmd_view[:count + 1])
+                self.bytes_sent += count + 1
+                count = 0
+        if count:
+            self.i2c.writeto(self.addr, self.cmd_view[:count + 1])
+            self.bytes_sent += count + 1
 
     def write_data(self, buf):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
+        self.bytes_sent += 1 + len(buf)
 
 
 class SSD1306_SPI(SSD1306):
@@ -134,6 +340,11 @@ class SSD1306_SPI(SSD1306):
         self.dc = dc
         self.res = res
         self.cs = cs
+        self.spi_inits = 0
+        # Single command byte and batched commands, both sent without allocating
+        self.cmd_byte = bytearray(1)
+        self.cmd_buffer = bytearray(CMD_BUFFER_SIZE)
+        self.cmd_view = memoryview(self.cmd_buffer)
         import time
 
         self.res(1)
@@ -143,18 +354,46 @@ class SSD1306_SPI(SSD1306):
         self.res(1)
         super().__init__(width, height, external_vcc)
 
+    def claim_bus(self):
+        # Only reconfigure the bus when another driver has used it since our last transfer
+        if not claim_spi(self.spi, self):
+            self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+            self.spi_inits += 1
+
     def write_cmd(self, cmd):
-        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cmd_byte[0] = cmd
+        self.write_command_bytes(self.cmd_byte)
+
+    def write_cmds(self, cmds):
+        if isinstance(cmds, bytearray):
+            # Already a buffer (like the show() window), send it as it is
+            self.write_command_bytes(cmds)
+            return
+        buf = self.cmd_buffer
+        count = 0
+        for cmd in cmds:
+            buf[count] = cmd
+            count += 1
+            if count == CMD_BUFFER_SIZE:
+                self.write_command_bytes(self.cmd_view[:count])
+                count = 0
+        if count:
+            self.write_command_bytes(self.cmd_view[:count])
+
+    def write_command_bytes(self, buf):
+        self.claim_bus()
         self.cs(1)
         self.dc(0)
         self.cs(0)
-        self.spi.write(bytearray([cmd]))
+        self.spi.write(buf)
         self.cs(1)
+        self.bytes_sent += len(buf)
 
     def write_data(self, buf):
-        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.claim_bus()
         self.cs(1)
         self.dc(1)
         self.cs(0)
         self.spi.write(buf)
-        self.cs(1)
\ No newline at end of file
+        self.cs(1)
+        self.bytes_sent += len(buf)
@@ -3,7 +3,7 @@
 # Button Test
 
 import asyncio
-from gamepad import GamePad
+from gamepad import GamePad, BUTTON_START
 
 async def test_gamepad():
     gamepad = GamePad()
@@ -15,11 +15,10 @@ async def test_gamepad():
 
 async def monitor_start_button(gamepad):
     """Exit the program when the start button is pressed."""
-    while True:
-        if await gamepad.buttons["Start"].is_pressed():  # Await the asynchronous method
-            print("Start button pressed. Exiting...")
-            break
-        await asyncio.sleep(0.1)  # Avoid busy-waiting
+    # gamepad.pressed is the debounced state the gamepad sends to the robot
+    while not gamepad.pressed & BUTTON_START:
+        await asyncio.sleep(0.02)  # Avoid busy-waiting
+    print("Start button pressed. Exiting...")
 
 if __name__ == "__main__":
     asyncio.run(test_gamepad())
@@ -1,50 +1,59 @@
 import asyncio
-from gamepad import GamePadServer
+from gamepad import (
+    GamePadServer, BUTTON_A, BUTTON_B, BUTTON_X, BUTTON_Y, BUTTON_UP, BUTTON_DOWN,
+    BUTTON_LEFT, BUTTON_RIGHT, BUTTON_START, BUTTON_SELECT, BUTTON_MENU,
+)
 from burgerbot import Burgerbot
+from motor import SPEED_STEPS
 
 bot = Burgerbot()
 bot.speed = 0.75
 
+# Control loop period
+CONTROL_MS = 20
+
 async def monitor_gamepad(gamepad):
     """
-    Monitor the gamepad for commands and act on them.
+    Drive the robot from the gamepad's buttons at a fixed rate.
+
+    Up/Down set the throttle and Left/Right the turn, so holding two of them
+    drives an arc. The other buttons act once per press.
     """
-    
-    # This is ugly code - there are better ways of doing this, but it works
+    speed = int(bot.speed * SPEED_STEPS)
     while True:
+        gamepad.tick()
+        held = gamepad.pressed_mask
+        throttle = 0
+        if held & BUTTON_UP:
+            throttle += speed
+        if held & BUTTON_DOWN:
+            throttle -= speed
+        turn = 0
+        if held & BUTTON_LEFT:
+            turn += speed
+        if held & BUTTON_RIGHT:
+            turn -= speed
+        bot.mix(throttle, turn)
 
-        if gamepad.is_up:
-            print('Robot forward')
-            bot.forward()
-        elif gamepad.is_down:
-            print('Robot backward')
-            bot.backward()
-        elif gamepad.is_left:
-            print('Robot left')
-            bot.turn_left()
-        elif gamepad.is_right:
-            print('Robot right')
-            bot.turn_right()
-        elif gamepad.is_a:
-            print('A button pressed - pen up')
-            bot.pen_up()
-        elif gamepad.is_b:
-            print('B button pressed - pen down')
-            bot.pen_down()
-        elif gamepad.is_x:
-            print('X button pressed')
-        elif gamepad.is_y:
-            print('Y button pressed')
-        elif gamepad.is_start:
-            print('Start button pressed')
-        elif gamepad.is_select:
-            print('Select button pressed')
-        elif gamepad.is_menu:
-            print('Menu button pressed')
-        else:
-            pass
-            bot.stop()
-        await asyncio.sleep(0.1)  # Avoid tight looping
+        pressed = gamepad.just_pressed
+        if pressed:
+            if pressed & BUTTON_A:
+                print('A button pressed - pen up')
+                bot.pen_up()
+            if pressed & BUTTON_B:
+                print('B button pressed - pen down')
+                bot.pen_down()
+            if pressed & BUTTON_X:
+                print('X button pressed')
+            if pressed & BUTTON_Y:
+                print('Y button pressed')
+            if pressed & BUTTON_START:
+                print('Start button pressed')
+            if pressed & BUTTON_SELECT:
+                print('Select button pressed')
+            if pressed & BUTTON_MENU:
+                print('Menu button pressed')
+        await asyncio.sleep_ms(CONTROL_MS)
 
 
 async def main():
@@ -56,18 +65,21 @@ async def main():
     #Create the background tasks
     blink = asyncio.create_task(gamepad.blink_task())
     monitor = asyncio.create_task(monitor_gamepad(gamepad))
+    ramp = asyncio.create_task(bot.ramp.task())
 
     # Add the tasks to the tasks queue
     gamepad.tasks.append(monitor)
     gamepad.tasks.append(blink)
+    gamepad.tasks.append(ramp)
     
     await gamepad.main()
     
 # Run the main coroutine
-while True:
-    try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        print("Exiting...")
-        import sys
-        sys.exit()
+if __name__ == "__main__":
+    while True:
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            print("Exiting...")
+            import sys
+            sys.exit()
@@ -0,0 +1,117 @@
+# Shared fixtures for the simulator tests
+
+import asyncio
+
+import pytest
+
+import metrics
+import sim
+from sim.bench import wait_until
+
+
+class Pair:
+    """
+    A GamePad and a GamePadServer on their own boards, sharing one radio.
+
+    Attributes:
+        radio (Radio): The radio both boards talk through.
+        pad (Board): The gamepad's board, for its pins and BLE stack.
+        gamepad (GamePad): The gamepad last started on the pad.
+        server (GamePadServer): The server last started on a robot.
+    """
+
+    def __init__(self, radio):
+        self.radio = radio
+        self.pad = sim.Board("pad", radio)
+        self.gamepad = None
+        self.server = None
+        self._pad_task = None
+
+    def start_pad(self, profile=None, broadcast=False, run=True):
+        """
+        Starts a GamePad on the pad board, stopping the one before it.
+
+        Args:
+            run (bool): Start its main(); False leaves the tasks to the test.
+        """
+        self.stop_pad()
+        with self.pad:
+            from gamepad import GamePad
+            self.gamepad = GamePad(profile=profile, broadcast=broadcast)
+            if run:
+                self._pad_task = asyncio.create_task(self.gamepad.main())
+        return self.gamepad
+
+    def stop_pad(self):
+        """
+        Stops the GamePad's main(), as if the pad was switched off.
+        """
+        if self._pad_task is not None:
+            self._pad_task.cancel()
+            self._pad_task = None
+
+    def start_robot(self, name="robot", broadcast=False):
+        """
+        Starts a GamePadServer on a new robot board.
+
+        Its main() only runs at the caller's next await, so attributes can
+        still be patched on the server that comes back.
+        """
+        with sim.Board(name, self.radio):
+            from gamepad import GamePadServer
+            self.server = GamePadServer(broadcast=broadcast)
+            asyncio.create_task(self.server.main())
+        return self.server
+
+    async def connect(self, profile=None, broadcast=False):
+        """
+        Starts both ends and waits until the robot follows the pad.
+
+        Connected robots have also stored the pad's handles, so the
+        subscription and format negotiation are done.
+
+        Returns:
+            tuple[GamePad, GamePadServer]: The two ends.
+        """
+        self.start_pad(profile, broadcast)
+        server = self.start_robot(broadcast=broadcast)
+        await wait_until(lambda: server.connected and (broadcast or server.handles))
+        await asyncio.sleep(0.1)
+        return self.gamepad, server
+
+    async def reconnect(self):
+        """
+        Drops the link and waits for reports to flow on the next one.
+
+        Returns:
+            int: GATT operations the new connection took.
+        """
+        server = self.server
+        connection = server.connection
+        await connection.disconnect()
+        await wait_until(lambda: server.connection is not connection and server.notifying)
+        await asyncio.sleep(0.1)
+        return server.connection._link.gatt_ops
+
+
+@pytest.fixture
+def radio():
+    """
+    A fresh radio, so counters and advertisers don't leak between tests.
+    """
+    return sim.Radio(interval_ms=7.5, seed=1)
+
+
+@pytest.fixture
+def gamepad_pair(radio):
+    """
+    Makes Pairs on the test's radio, or on the radio given.
+    """
+    return lambda other=None: Pair(radio if other is None else other)
+
+
+@pytest.fixture(autouse=True)
+def no_metrics():
+    yield
+    metrics.enable(False)
+    metrics.reset()
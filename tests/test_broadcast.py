@@ -0,0 +1,290 @@
+# Broadcast mode: repeat and loss handling, name matching and scan restarts
+
+import asyncio
+
+import pytest
+
+import sim
+from sim.bench import wait_until
+import gamepad_receiver
+from gamepad_protocol import BUTTON_UP, BUTTON_INDEX, BROADCAST_COMPANY_ID, REPORT_SIZE, ReportEncoder
+from gamepad_receiver import EDGE_DOWN, EDGE_UP
+
+TAPS = 5
+
+
+@pytest.fixture
+def server():
+    with sim.Board("robot"):
+        from gamepad import GamePadServer
+        return GamePadServer(broadcast=True)
+
+
+def test_repeated_report_is_dropped(server):
+    encoder = ReportEncoder()
+    press = bytes(encoder.encode(BUTTON_UP, BUTTON_UP, 100))
+    release = bytes(encoder.encode(0, BUTTON_UP, 200))
+
+    assert server.receive_broadcast("pad", press)
+    assert not server.receive_broadcast("pad", press)
+    assert server.pressed_mask == BUTTON_UP
+    assert server.receive_broadcast("pad", release)
+    assert not server.receive_broadcast("pad", release)
+    assert not server.receive_broadcast("pad", press[:-1])
+
+    events = []
+    server.events.drain(lambda button, edge, remote_ms, local_ms: events.append((button, edge)))
+    up = BUTTON_INDEX["Up"]
+    assert events == [(up, EDGE_DOWN), (up, EDGE_UP)]
+
+
+def drain(server):
+    events = []
+    server.events.drain(lambda button, edge, remote_ms, local_ms: events.append((button, edge)))
+    return events
+
+
+def test_older_report_is_dropped(server):
+    encoder = ReportEncoder()
+    encoder.seq = 250
+    reports = [bytes(encoder.encode(BUTTON_UP if i % 2 else 0, BUTTON_UP if i else 0, i)) for i in range(10)]
+
+    assert server.receive_broadcast("pad", reports[0])
+    assert server.receive_broadcast("pad", reports[5])
+    # Sequence numbers wrap, so 0 (reports[6]) is ahead of 255 and 254 is behind it
+    assert not server.receive_broadcast("pad", reports[4])
+    assert server.receive_broadcast("pad", reports[6])
+    assert not server.receive_broadcast("pad", reports[5])
+    assert not server.receive_broadcast("pad", reports[1])
+    assert server._last_seq == 0
+    # Half the range ahead counts as behind
+    encoder.seq = 0x80
+    assert not server.receive_broadcast("pad", bytes(encoder.encode(0, 0, 0)))
+    encoder.seq = 0x7F
+    assert server.receive_broadcast("pad", bytes(encoder.encode(0, 0, 0)))
+
+
+def test_lost_reports_keep_their_edges(server):
+    encoder = ReportEncoder()
+    up = BUTTON_INDEX["Up"]
+    assert server.receive_broadcast("pad", bytes(encoder.encode(0, 0, 0)))
+
+    # A tap whose press report was lost shows up as a changed bit with no change of state
+    encoder.encode(BUTTON_UP, BUTTON_UP, 10)
+    assert server.receive_broadcast("pad", bytes(encoder.encode(0, BUTTON_UP, 20)))
+    assert drain(server) == [(up, EDGE_DOWN), (up, EDGE_UP)]
+    assert server.events.lost == 1
+    server.tick()
+    assert server.just_pressed == BUTTON_UP and server.just_released == BUTTON_UP
+    assert not server.pressed_mask
+
+    # A press whose report was lost is still seen from the next heartbeat
+    encoder.encode(BUTTON_UP, BUTTON_UP, 30)
+    encoder.encode(BUTTON_UP, 0, 40)
+    assert server.receive_broadcast("pad", bytes(encoder.encode(BUTTON_UP, 0, 50)))
+    assert drain(server) == [(up, EDGE_DOWN)]
+    assert server.events.lost == 3
+
+    # Let go and pressed again while the release was lost
+    encoder.encode(0, BUTTON_UP, 60)
+    assert server.receive_broadcast("pad", bytes(encoder.encode(BUTTON_UP, BUTTON_UP, 70)))
+    assert drain(server) == [(up, EDGE_UP), (up, EDGE_DOWN)]
+    assert server.pressed_mask == BUTTON_UP
+    assert server.events.lost == 4
+
+
+def test_first_report_has_nothing_to_recover(server):
+    # Following a gamepad mid-stream: its changed bits are relative to a report never seen
+    encoder = ReportEncoder()
+    encoder.seq = 40
+    assert server.receive_broadcast("pad", bytes(encoder.encode(0, BUTTON_UP, 0)))
+    assert drain(server) == []
+    assert server.events.lost == 0
+
+
+def test_dropped_reports_lose_no_taps(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        pair.start_pad(broadcast=True)
+        server = pair.start_robot(broadcast=True)
+        await wait_until(lambda: server.connected)
+        receive_broadcast = server.receive_broadcast
+
+        def lossy(device, data):
+            # Every report that has Up held goes missing
+            if data[1] & BUTTON_UP:
+                return False
+            return receive_broadcast(device, data)
+
+        server.receive_broadcast = lossy
+        up = pair.pad.pin(8)
+        server.events.clear()
+        for _ in range(TAPS):
+            await up.play(sim.machine.bounce(0))
+            await asyncio.sleep(0.1)
+            await up.play(sim.machine.bounce(1))
+            await asyncio.sleep(0.1)
+        assert not server.pressed_mask
+        assert server.events.lost >= TAPS
+        return drain(server)
+
+    up = BUTTON_INDEX["Up"]
+    assert asyncio.run(run()) == [(up, EDGE_DOWN), (up, EDGE_UP)] * TAPS
+
+
+def test_lossy_radio_loses_no_taps(gamepad_pair):
+    pair = gamepad_pair(sim.Radio(interval_ms=7.5, loss=0.5, seed=3))
+
+    async def run():
+        pair.start_pad(broadcast=True)
+        server = pair.start_robot(broadcast=True)
+        await wait_until(lambda: server.connected)
+        up = pair.pad.pin(8)
+        server.events.clear()
+        for _ in range(TAPS):
+            await up.play(sim.machine.bounce(0))
+            await asyncio.sleep(0.03)
+            await up.play(sim.machine.bounce(1))
+            await asyncio.sleep(0.2)
+        return drain(server)
+
+    up = BUTTON_INDEX["Up"]
+    assert asyncio.run(run()) == [(up, EDGE_DOWN), (up, EDGE_UP)] * TAPS
+
+
+def test_other_names_are_ignored(gamepad_pair, capsys):
+    pair = gamepad_pair()
+
+    async def run():
+        with sim.Board("stranger", pair.radio):
+            # Manufacturer data under the same company ID, but no name
+            stranger = asyncio.create_task(sim.aioble.advertise(
+                20000, connectable=False, manufacturer=(BROADCAST_COMPANY_ID, bytes(ReportEncoder().encode(0, 0, 0))),
+            ))
+        with sim.Board("robot", pair.radio):
+            from gamepad import GamePadServer
+            elsewhere = GamePadServer(device_name="OtherRobots", broadcast=True)
+            asyncio.create_task(elsewhere.main())
+        server = pair.start_robot(broadcast=True)
+        await asyncio.sleep(0.5)
+        assert not server.connected
+        pair.start_pad(broadcast=True)
+        await wait_until(lambda: server.connected)
+        assert server.peer.addr == pair.pad.addr
+        await asyncio.sleep(0.3)
+        assert not elsewhere.connected
+        stranger.cancel()
+
+    asyncio.run(run())
+
+
+def test_quiet_gamepad_is_let_go(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect(broadcast=True)
+        await pair.pad.pin(8).play(sim.machine.bounce(0))
+        await wait_until(lambda: server.pressed_mask & BUTTON_UP)
+        server.events.clear()
+        pair.stop_pad()
+        await wait_until(lambda: not server.connected)
+        assert not server.pressed_mask and server.peer is None
+        assert drain(server) == [(BUTTON_INDEX["Up"], EDGE_UP)]
+        # Switched back on, its count starts again from 0 and it is followed anew
+        pair.start_pad(broadcast=True)
+        await wait_until(lambda: server.connected)
+        await wait_until(lambda: server.pressed_mask & BUTTON_UP)
+
+    asyncio.run(run())
+
+
+def test_report_reaches_a_passive_scan(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        pair.start_pad(broadcast=True)
+        await asyncio.sleep(0.1)
+        advertisement = pair.pad.ble.advertisement
+        # Nothing spills into a scan response, which a passive scan never asks for
+        assert len(advertisement.adv_data) < 31
+        assert advertisement.resp_data is None
+        with sim.Board("robot", pair.radio):
+            async with sim.aioble.scan(500, interval_us=30000, window_us=30000) as scanner:
+                async for result in scanner:
+                    return list(result.manufacturer(BROADCAST_COMPANY_ID))
+
+    reports = asyncio.run(run())
+    assert len(reports) == 1 and len(reports[0][1]) == REPORT_SIZE
+
+
+def test_scan_response_needs_an_active_scan(radio):
+    report = bytes(REPORT_SIZE)
+
+    async def heard(active):
+        with sim.Board("pad", radio):
+            # Too much for one advertisement, so the report goes in the scan response
+            advertiser = asyncio.create_task(sim.aioble.advertise(
+                20000, connectable=False, name="KevsRobots", services=[sim.bluetooth.UUID(0x1848)],
+                manufacturer=(BROADCAST_COMPANY_ID, report),
+            ))
+        with sim.Board("robot", radio):
+            results = []
+            async with sim.aioble.scan(300, interval_us=30000, window_us=30000, active=active) as scanner:
+                async for result in scanner:
+                    results.append(list(result.manufacturer(BROADCAST_COMPANY_ID)))
+        advertiser.cancel()
+        return results
+
+    assert asyncio.run(heard(True))[-1] == [(BROADCAST_COMPANY_ID, report)]
+    assert all(not found for found in asyncio.run(heard(False)))
+
+
+def test_scan_restarts_without_losing_the_gamepad(gamepad_pair, monkeypatch):
+    pair = gamepad_pair()
+    monkeypatch.setattr(gamepad_receiver, "BROADCAST_RESCAN_MS", 200)
+    scans = []
+
+    class scan(sim.aioble.scan):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            scans.append(self)
+
+    monkeypatch.setattr(sim.aioble, "scan", scan)
+
+    async def run():
+        pair.start_pad(broadcast=True)
+        server = pair.start_robot(broadcast=True)
+        repeats = []
+        receive_broadcast = server.receive_broadcast
+
+        def received(device, data):
+            new = receive_broadcast(device, data)
+            if not new:
+                repeats.append(data)
+            return new
+
+        server.receive_broadcast = received
+        quiet = []
+        release_all = server.release_all
+
+        def released():
+            quiet.append(None)
+            release_all()
+
+        server.release_all = released
+
+        await asyncio.sleep(1.1)
+        assert server.connected
+        await pair.pad.pin(8).play(sim.machine.bounce(0))
+        await asyncio.sleep(0.1)
+        assert server.pressed_mask & BUTTON_UP
+        assert not quiet
+        return repeats
+
+    repeats = asyncio.run(run())
+    assert len(scans) >= 5
+    # Each scan only ever held the one gamepad's result
+    assert all(len(scanner._results) <= 1 for scanner in scans)
+    # A restarted scan hears the current advertisement again
+    assert repeats
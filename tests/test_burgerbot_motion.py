@@ -0,0 +1,149 @@
+# Burgerbot's non-blocking moves keep the event loop responsive
+
+import asyncio
+import time
+
+import metrics
+import sim
+from motor import SPEED_STEPS
+
+HALF = SPEED_STEPS // 2
+
+
+def make_bot():
+    with sim.Board("robot"):
+        from burgerbot import Burgerbot
+        # Set up now, so the motors' pins are on this board
+        return Burgerbot().begin()
+
+
+def stopped_after_us(motor, start_us):
+    """
+    When the motor's PWM was last set to 0, in us after start_us.
+    """
+    when, duty = motor.in2.history[-1]
+    assert duty == 0
+    return when - start_us
+
+
+def test_forward_async_does_not_stall_the_loop():
+    async def run():
+        with sim.Board("robot"):
+            from burgerbot import Burgerbot
+            bot = Burgerbot()
+            metrics.enable()
+            metrics.reset()
+            tasks = [
+                asyncio.create_task(bot.motion_task()),
+                asyncio.create_task(metrics.lag_probe()),
+            ]
+            start = time.monotonic()
+            move = asyncio.create_task(bot.forward_async(1.0))
+        await move
+        elapsed = time.monotonic() - start
+        for task in tasks:
+            task.cancel()
+
+        lag = metrics.snapshot()["histograms"][metrics.HISTOGRAM_NAMES[metrics.LOOP_LAG]]
+        # One probe per 10 ms, none of them held up by the move
+        assert lag["count"] >= 50
+        assert lag["max"] < 50_000
+        assert 1.0 <= elapsed < 1.1
+        left = bot.motors[0].in2
+        assert left.history[0][1] > 0
+        assert left.duty_u16() == 0
+
+    asyncio.run(run())
+
+
+def test_drive_returns_at_once():
+    async def run():
+        bot = make_bot()
+        task = asyncio.create_task(bot.motion_task())
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        bot.drive(0.5, 0.5, 0.2)
+        elapsed = time.monotonic() - start
+        assert elapsed < 0.005
+        # Already driving, nothing waits for the duration
+        assert [motor.step for motor in bot.motors] == [HALF, -HALF]
+        await asyncio.sleep(0.1)
+        assert [motor.step for motor in bot.motors] == [HALF, -HALF]
+        task.cancel()
+
+    asyncio.run(run())
+
+
+def test_drive_stops_when_the_duration_is_up():
+    async def run():
+        bot = make_bot()
+        task = asyncio.create_task(bot.motion_task())
+        await asyncio.sleep(0)
+        start = sim.machine._now_us()
+        bot.drive(0.5, 0.5, 0.2)
+        await asyncio.sleep(0.3)
+        task.cancel()
+        return bot, start
+
+    bot, start = asyncio.run(run())
+    for motor in bot.motors:
+        assert motor.step == 0
+        # ticks_ms() resolution can make the deadline up to 1 ms early
+        assert 199_000 <= stopped_after_us(motor, start) < 250_000
+
+
+def test_new_drive_replaces_the_running_one():
+    async def run():
+        bot = make_bot()
+        task = asyncio.create_task(bot.motion_task())
+        await asyncio.sleep(0)
+        start = sim.machine._now_us()
+        bot.drive(0.5, 0.5, 0.1)
+        await asyncio.sleep(0.05)
+        bot.drive(-0.5, -0.5, 0.2)
+        # Past the first deadline, the second drive keeps going
+        await asyncio.sleep(0.1)
+        assert [motor.step for motor in bot.motors] == [-HALF, HALF]
+        await asyncio.sleep(0.2)
+        task.cancel()
+        return bot, start
+
+    bot, start = asyncio.run(run())
+    for motor in bot.motors:
+        assert motor.step == 0
+        assert 249_000 <= stopped_after_us(motor, start) < 300_000
+        # Only the second drive's deadline stopped it
+        assert [duty for _, duty in motor.in2.history].count(0) == 1
+
+
+def test_drive_without_duration_keeps_going():
+    async def run():
+        bot = make_bot()
+        task = asyncio.create_task(bot.motion_task())
+        await asyncio.sleep(0)
+        bot.drive(0.5, 0.5, 0.05)
+        bot.set_velocity(0.5, 0.5)
+        await asyncio.sleep(0.15)
+        assert [motor.step for motor in bot.motors] == [HALF, -HALF]
+        task.cancel()
+
+    asyncio.run(run())
+
+
+def test_blocking_move_clears_the_drive_deadline():
+    async def run():
+        bot = make_bot()
+        task = asyncio.create_task(bot.motion_task())
+        await asyncio.sleep(0)
+        bot.drive(-0.5, -0.5, 0.05)
+        await asyncio.sleep(0.01)
+        # Blocks the loop past the drive's deadline
+        bot.forward(0.1)
+        steps = [motor.step for motor in bot.motors]
+        await asyncio.sleep(0.05)
+        # The blocking move replaced the drive, so its deadline doesn't stop it
+        assert steps[0] > 0
+        assert [motor.step for motor in bot.motors] == steps
+        task.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,43 @@
+# ButtonBank snapshots and scans of the simulated pins
+
+import pytest
+
+import sim
+from gamepad_controller import Button, ButtonBank
+
+# Pins out of order and across the 6-bit lookup tables, like the GamePad's
+PINS = (6, 7, 4, 5, 8, 9, 2, 3, 12, 11, 10)
+
+
+@pytest.fixture
+def pad():
+    return sim.Board("pad")
+
+
+def make_bank(pad):
+    with pad:
+        return ButtonBank([Button(pin) for pin in PINS])
+
+
+def test_snapshot_follows_pin_order(pad):
+    bank = make_bank(pad)
+    assert bank.snapshot() == 0
+    for index, pin in enumerate(PINS):
+        pad.pin(pin).drive(0)
+        assert bank.snapshot() == 1 << index
+        pad.pin(pin).drive(1)
+
+
+def test_scan_returns_press_and_release_masks(pad):
+    bank = make_bank(pad)
+    assert bank.scan() == (0, 0)
+    pad.pin(6).drive(0)  # A
+    pad.pin(12).drive(0)  # Start
+    assert bank.scan() == (0b1_0000_0001, 0)
+    assert bank.state == 0b1_0000_0001
+    # Nothing moved since the last scan
+    assert bank.scan() == (0, 0)
+    pad.pin(6).drive(1)
+    pad.pin(2).drive(0)  # Left
+    assert bank.scan() == (0b100_0000, 0b1)
+    assert bank.state == 0b1_0100_0000
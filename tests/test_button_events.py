@@ -0,0 +1,146 @@
+# ButtonEvents driven by scripted pin waveforms on the simulator
+
+import asyncio
+
+import pytest
+
+import sim
+from gamepad_controller import Button, ButtonBank, ButtonEvents
+
+
+@pytest.fixture
+def pad():
+    return sim.Board("pad")
+
+
+def make_events(pad, pins=(8, 9), **kwargs):
+    with pad:
+        bank = ButtonBank([Button(pin) for pin in pins])
+        return ButtonEvents(bank, **kwargs)
+
+
+async def collect(events, reports):
+    while True:
+        reports.append(await events.changed())
+
+
+def run(pad, events, script):
+    """
+    Runs script(reports) with a task collecting every (pressed, changed) from events.
+    """
+    async def main():
+        reports = []
+        collector = asyncio.create_task(collect(events, reports))
+        await asyncio.sleep(0.05)  # boot scan
+        await script(reports)
+        collector.cancel()
+        return reports
+
+    return asyncio.run(main())
+
+
+def test_bouncy_press_and_release(pad):
+    events = make_events(pad)
+    up = pad.pin(8)
+
+    async def script(reports):
+        # Bounces slower than the sample period, so the integrator has to ride them out
+        await up.play(sim.machine.bounce(0, edges=7, spacing_ms=3))
+        await asyncio.sleep(0.05)
+        await up.play(sim.machine.bounce(1, edges=7, spacing_ms=3))
+        await asyncio.sleep(0.05)
+
+    assert run(pad, events, script) == [(0b01, 0b01), (0b00, 0b01)]
+
+
+def test_buttons_are_independent(pad):
+    events = make_events(pad)
+    up = pad.pin(8)
+    down = pad.pin(9)
+
+    async def script(reports):
+        await up.play(sim.machine.bounce(0))
+        await asyncio.sleep(0.05)
+        await down.play(sim.machine.bounce(0))
+        await asyncio.sleep(0.05)
+        await up.play(sim.machine.bounce(1))
+        await asyncio.sleep(0.05)
+
+    assert run(pad, events, script) == [(0b01, 0b01), (0b11, 0b10), (0b10, 0b01)]
+
+
+def test_timestamp_is_first_edge(pad):
+    events = make_events(pad)
+    up = pad.pin(8)
+
+    async def script(reports):
+        pressed_at = sim.ticks_ms()
+        await up.play(sim.machine.bounce(0, edges=5, spacing_ms=2))
+        await asyncio.sleep(0.05)
+        assert reports == [(0b01, 0b01)]
+        # Reported from the first edge, not from when the bounce settled
+        assert sim.ticks_diff(events.timestamp, pressed_at) <= 1
+
+    run(pad, events, script)
+
+
+def test_idle_buttons_are_not_sampled(pad):
+    events = make_events(pad)
+    snapshots = []
+    snapshot = events.bank.snapshot
+
+    def counted():
+        snapshots.append(None)
+        return snapshot()
+
+    events.bank.snapshot = counted
+
+    async def script(reports):
+        snapshots.clear()
+        await asyncio.sleep(0.2)
+        assert not snapshots
+        await pad.pin(8).play(sim.machine.bounce(0))
+        await asyncio.sleep(0.05)
+        assert reports == [(0b01, 0b01)]
+        # Sampled until settled, then asleep again
+        sampled = len(snapshots)
+        assert 0 < sampled <= 10
+        await asyncio.sleep(0.2)
+        assert len(snapshots) == sampled
+
+    run(pad, events, script)
+
+
+def test_glitch_does_not_date_the_next_press(pad):
+    events = make_events(pad)
+    up = pad.pin(8)
+
+    async def script(reports):
+        # A spike shorter than the debounce window, filtered out
+        up.drive(0)
+        await asyncio.sleep(0.001)
+        up.drive(1)
+        await asyncio.sleep(0.5)
+        assert reports == []
+        pressed_at = sim.ticks_ms()
+        await up.play(sim.machine.bounce(0))
+        await asyncio.sleep(0.05)
+        assert reports == [(0b01, 0b01)]
+        assert 0 <= sim.ticks_diff(events.timestamp, pressed_at) <= 1
+
+    run(pad, events, script)
+
+
+def test_edge_burst_keeps_state(pad):
+    events = make_events(pad)
+    up = pad.pin(8)
+
+    async def script(reports):
+        # A burst of edges faster than the engine can wake
+        pressed_at = sim.ticks_ms()
+        for level in (0, 1) * 5 + (0,):
+            up.drive(level)
+        await asyncio.sleep(0.05)
+        assert sim.ticks_diff(events.timestamp, pressed_at) <= 1
+
+    assert run(pad, events, script) == [(0b01, 0b01)]
@@ -0,0 +1,122 @@
+# GamePadServer's button state: held buttons, latched edges and hold times
+
+import asyncio
+
+import sim
+from sim.bench import wait_until
+from gamepad_protocol import BUTTON_UP, BUTTON_LEFT, BUTTON_INDEX
+from gamepad_receiver import EDGE_UP, NO_TIMESTAMP
+
+UP_PIN = 8
+LEFT_PIN = 2
+
+
+async def hold(pair, pin, level):
+    """
+    Presses (level 0) or releases (level 1) a button and waits for the robot to see it.
+    """
+    server = pair.server
+    bit = BUTTON_UP if pin == UP_PIN else BUTTON_LEFT
+    await pair.pad.pin(pin).play(sim.machine.bounce(level))
+    await wait_until(lambda: bool(server.pressed_mask & bit) == (level == 0))
+
+
+def test_chord_and_latched_edges(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        await hold(pair, UP_PIN, 0)
+        await hold(pair, LEFT_PIN, 0)
+        # Both held together
+        assert server.pressed_mask == BUTTON_UP | BUTTON_LEFT
+        assert server.is_up and server.is_left
+        assert not server.is_down and not server.is_right and not server.is_a
+        assert server.pressed("Up") and server.pressed(BUTTON_LEFT)
+        assert not server.pressed("Down")
+
+        # Edges wait for the next tick, then last for exactly one
+        assert server.just_pressed == 0
+        server.tick()
+        assert server.just_pressed == BUTTON_UP | BUTTON_LEFT
+        assert server.just_released == 0
+        server.tick()
+        assert server.just_pressed == 0
+
+        await hold(pair, UP_PIN, 1)
+        assert not server.is_up and server.is_left
+        assert server.just_released == 0
+        server.tick()
+        assert server.just_released == BUTTON_UP
+        assert server.just_pressed == 0
+        server.tick()
+        assert server.just_released == 0
+
+    asyncio.run(run())
+
+
+def test_tap_between_ticks_is_not_lost(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        server.tick()
+        await hold(pair, UP_PIN, 0)
+        await asyncio.sleep(0.05)
+        await hold(pair, UP_PIN, 1)
+        # Over by the time the control loop looks, but still seen once
+        server.tick()
+        assert server.just_pressed == BUTTON_UP
+        assert server.just_released == BUTTON_UP
+        assert not server.is_up
+
+    asyncio.run(run())
+
+
+def test_held_ms(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        assert server.held_ms("Up") == 0
+        await hold(pair, UP_PIN, 0)
+        first = server.held_ms("Up")
+        await asyncio.sleep(0.2)
+        later = server.held_ms(BUTTON_UP)
+        assert 190 <= later - first <= 300
+        assert server.held_ms("Left") == 0
+
+        await hold(pair, UP_PIN, 1)
+        assert server.held_ms("Up") == 0
+        # A new press counts from its own start
+        await hold(pair, UP_PIN, 0)
+        assert server.held_ms("Up") < 100
+
+    asyncio.run(run())
+
+
+def test_disconnect_releases_held_buttons(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        await hold(pair, UP_PIN, 0)
+        await hold(pair, LEFT_PIN, 0)
+        server.tick()
+        server.events.clear()
+
+        await server.connection.disconnect()
+        await wait_until(lambda: not server.pressed_mask)
+        assert not server.is_up and not server.is_left
+        assert server.held_ms("Up") == 0
+        server.tick()
+        assert server.just_released == BUTTON_UP | BUTTON_LEFT
+        events = []
+        server.events.drain(lambda button, edge, remote_ms, local_ms: events.append((button, edge, remote_ms)))
+        # Not from the gamepad, so there is no remote timestamp
+        assert sorted(events) == sorted([
+            (BUTTON_INDEX["Up"], EDGE_UP, NO_TIMESTAMP),
+            (BUTTON_INDEX["Left"], EDGE_UP, NO_TIMESTAMP),
+        ])
+
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+# Debouncer replays of recorded contact behaviour
+
+from gamepad_controller import Debouncer
+
+SAMPLES = 4
+
+
+def replay(raw, samples=SAMPLES):
+    """
+    Feeds raw snapshots to a Debouncer.
+
+    Returns:
+        list: (sample index, state) for every sample that changed the debounced state.
+    """
+    debouncer = Debouncer(samples)
+    edges = []
+    for index, snapshot in enumerate(raw):
+        if debouncer.update(snapshot):
+            edges.append((index, debouncer.state))
+    return edges
+
+
+def test_bouncy_press_and_release_give_one_edge_each():
+    press = [1, 0, 1, 1, 0, 1, 0, 1] + [1] * SAMPLES
+    release = [0, 1, 0, 0, 1, 0] + [0] * SAMPLES
+    edges = replay([0] * SAMPLES + press + [1] * 10 + release + [0] * 10)
+    assert [state for _, state in edges] == [1, 0]
+
+
+def test_edge_once_stable_for_samples():
+    edges = replay([0] * SAMPLES + [1] * SAMPLES)
+    assert edges == [(2 * SAMPLES - 1, 1)]
+
+
+def test_short_glitches_give_no_edge():
+    for width in range(1, SAMPLES):
+        assert replay([0] * SAMPLES + [1] * width + [0] * 10) == []
+        assert replay([1] * SAMPLES + [0] * width + [1] * 10) == [(SAMPLES - 1, 1)]
+
+
+def test_fast_repeat_press_is_not_suppressed():
+    # Let go for just long enough to count as released, then press again
+    raw = [1] * SAMPLES + [0] * SAMPLES + [1] * SAMPLES
+    assert [state for _, state in replay(raw)] == [1, 0, 1]
+
+
+def test_lanes_are_independent():
+    # Button 0 held steady while button 1 bounces and settles down
+    raw = [0b01] * SAMPLES + [0b11, 0b01, 0b11, 0b01] + [0b11] * SAMPLES + [0b10] * SAMPLES
+    assert [state for _, state in replay(raw)] == [0b01, 0b11, 0b10]
+
+
+def test_settled():
+    debouncer = Debouncer(SAMPLES)
+    assert debouncer.settled
+    debouncer.update(1)
+    assert not debouncer.settled
+    for _ in range(SAMPLES - 1):
+        debouncer.update(1)
+    assert debouncer.settled
@@ -0,0 +1,95 @@
+# DriveMixer: throttle and turn to wheel speeds, read back from the simulated PWM
+
+import pytest
+
+import sim
+from motor import Motor, SPEED_STEPS, DUTY
+
+
+@pytest.fixture
+def board():
+    return sim.Board("robot")
+
+
+def make_mixer(board, **kwargs):
+    with board:
+        from burgerbot import DriveMixer
+        return DriveMixer(Motor(6, 7), Motor(8, 9), **kwargs)
+
+
+def driven(motor):
+    """
+    The signed speed in steps the motor's pins are driving.
+    """
+    duty = motor.in2.duty_u16()
+    step = DUTY.index(duty)
+    return step if motor.in1.value() else -step
+
+
+def wheels(mixer, throttle, turn):
+    """
+    Mixes and reads both wheels back from the pins, forward positive.
+    """
+    mixer.mix(throttle, turn)
+    left = driven(mixer.left_motor)
+    right = driven(mixer.right_motor) * mixer._right_sign
+    assert (left, right) == (mixer.left, mixer.right)
+    return left, right
+
+
+def test_deadband(board):
+    mixer = make_mixer(board, deadband=10)
+    assert wheels(mixer, 9, -9) == (0, 0)
+    assert wheels(mixer, -9, 0) == (0, 0)
+    # Only the small input is dropped, the other still counts
+    assert wheels(mixer, 40, 5) == (40, 40)
+    assert wheels(mixer, 10, 0) == (10, 10)
+    assert wheels(mixer, 0, -10) == (-10, 10)
+
+
+def test_trim(board):
+    right_slower = make_mixer(board, trim=10)
+    assert wheels(right_slower, 100, 0) == (100, 90)
+    # Rounded towards zero either way, so reversing mirrors going forward
+    assert wheels(right_slower, 55, 0) == (55, 49)
+    assert wheels(right_slower, -55, 0) == (-55, -49)
+
+    left_slower = make_mixer(board, trim=-10)
+    assert wheels(left_slower, 100, 0) == (90, 100)
+    assert wheels(left_slower, -100, 0) == (-90, -100)
+
+
+def test_out_of_range_is_scaled_together(board):
+    mixer = make_mixer(board)
+    # 140 and 20 don't fit; both shrink by the same factor
+    assert wheels(mixer, 80, 60) == (SPEED_STEPS, 14)
+    assert wheels(mixer, -80, -60) == (-SPEED_STEPS, -14)
+    assert wheels(mixer, -80, 60) == (-14, -SPEED_STEPS)
+    # A full spin only just fits and isn't scaled
+    assert wheels(mixer, 0, SPEED_STEPS) == (SPEED_STEPS, -SPEED_STEPS)
+
+
+def test_right_motor_sign(board):
+    mirrored = make_mixer(board)
+    mirrored.mix(50, 0)
+    # Mounted mirrored, so it turns backwards to drive forward
+    assert driven(mirrored.left_motor) == 50
+    assert driven(mirrored.right_motor) == -50
+
+    same_way = make_mixer(board, right_reversed=False)
+    same_way.mix(50, 0)
+    assert driven(same_way.right_motor) == 50
+
+
+def test_up_and_left_drive_an_arc(board):
+    mixer = make_mixer(board)
+    speed = 75
+    # What test_gamepad.py's control loop sends for Up+Left
+    left, right = wheels(mixer, speed, speed)
+    # Both wheels go forward at different speeds: an arc, not a spin on the spot
+    assert left == SPEED_STEPS and right == 0
+    left, right = wheels(mixer, speed // 2, speed // 2)
+    assert left > right >= 0
+    # Left alone does spin
+    left, right = wheels(mixer, 0, speed)
+    assert left == -right == speed
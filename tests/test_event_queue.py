@@ -0,0 +1,102 @@
+# Report bursts from GamePad to GamePadServer, drained like a control loop would
+
+import asyncio
+import time
+
+import pytest
+
+import metrics
+import sim
+from sim.bench import wait_until
+from gamepad_protocol import BUTTON_NAMES
+from gamepad_receiver import EDGE_DOWN, EDGE_UP, NOTIFY_QUEUE_SIZE
+
+DRAIN_MS = 100
+
+# Reports the pad may send ahead of the server; several connection events'
+# worth at 1 kHz, but never enough to fill the notification queue
+IN_FLIGHT = NOTIFY_QUEUE_SIZE // 2
+
+
+def send(gamepad, pressed, button):
+    """
+    Notifies a report toggling one button straight from the pad.
+
+    Returns:
+        tuple[int, tuple]: The new pressed mask and the (button, edge) it should queue.
+    """
+    bit = 1 << button
+    pressed ^= bit
+    characteristic = gamepad.button_characteristic
+    characteristic.write(gamepad.encoder.encode(pressed, bit, sim.ticks_ms()))
+    characteristic.notify(gamepad.connection)
+    return pressed, (button, EDGE_DOWN if pressed & bit else EDGE_UP)
+
+
+@pytest.mark.parametrize("count", [400, 2000])
+def test_every_report_reaches_the_queue(gamepad_pair, count):
+    pair = gamepad_pair()
+
+    async def run():
+        gamepad, server = await pair.connect()
+        received = []
+
+        def handle(button, edge, remote_ms, local_ms):
+            received.append((button, edge))
+
+        async def consumer():
+            while True:
+                server.events.drain(handle)
+                await asyncio.sleep(DRAIN_MS / 1000)
+
+        draining = asyncio.create_task(consumer())
+
+        # Reports at up to 1 kHz, toggling one button each. The pad waits for
+        # delivery once IN_FLIGHT are outstanding, so a stall on the host
+        # slows the burst down instead of overflowing the notification queue
+        sent = []
+        pressed = 0
+        start = time.monotonic()
+        for index in range(count):
+            await wait_until(lambda: len(sent) - len(received) - len(server.events) < IN_FLIGHT)
+            pressed, event = send(gamepad, pressed, index % len(BUTTON_NAMES))
+            sent.append(event)
+            await asyncio.sleep(max(0.0, start + (index + 1) / 1000 - time.monotonic()))
+
+        await wait_until(lambda: len(received) + len(server.events) == len(sent))
+        draining.cancel()
+        server.events.drain(handle)
+
+        assert received == sent
+        assert server.pressed_mask == pressed
+        assert server.events.overflows == 0
+        assert server.events.lost == 0
+
+    asyncio.run(run())
+
+
+def test_dropped_reports_are_counted(gamepad_pair):
+    pair = gamepad_pair()
+    extra = 8
+
+    async def run():
+        gamepad, server = await pair.connect()
+        metrics.enable()
+        metrics.reset()
+        # All sent before the next connection event, so they arrive together
+        pressed = 0
+        for index in range(NOTIFY_QUEUE_SIZE + extra):
+            pressed, _ = send(gamepad, pressed, index % len(BUTTON_NAMES))
+        # and a robot busy past that event only gets to them once they are all
+        # in. Otherwise the reader may run between two of them and make room
+        time.sleep(0.02)
+        await wait_until(lambda: server.events.lost)
+        await asyncio.sleep(0.1)
+        # The newest are all decoded, so the state ends up right
+        assert server.pressed_mask == pressed
+        return server
+
+    server = asyncio.run(run())
+    # but the oldest were dropped, and that shows
+    assert server.events.lost == extra
+    assert metrics.counters[metrics.REPORTS_DROPPED] == extra
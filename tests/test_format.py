@@ -0,0 +1,34 @@
+# Report format negotiation across centrals
+
+import asyncio
+
+from sim.bench import wait_until
+from gamepad_protocol import FORMAT_BINARY, FORMAT_TEXT, NO_PROFILE
+
+
+def test_second_robot_after_text_only_robot_gets_binary(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def text_only(characteristic, expected=None):
+        # An older central that asks for text reports
+        await characteristic.write(bytes((FORMAT_TEXT,)), True)
+        return FORMAT_TEXT
+
+    async def run():
+        gamepad = pair.start_pad()
+
+        old = pair.start_robot("old robot")
+        old.negotiate_format = text_only
+        await wait_until(lambda: old.handles and gamepad.connected)
+        await wait_until(lambda: gamepad.format == FORMAT_TEXT)
+        for task in old.tasks:
+            task.cancel()
+        await wait_until(lambda: not gamepad.connected)
+
+        server = pair.start_robot()
+        await wait_until(lambda: server.handles and gamepad.connected)
+        await wait_until(lambda: gamepad.format == FORMAT_BINARY)
+        assert server.format == FORMAT_BINARY
+        assert gamepad.format_characteristic.read() == bytes((FORMAT_BINARY, NO_PROFILE))
+
+    asyncio.run(run())
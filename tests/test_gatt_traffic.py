@@ -0,0 +1,212 @@
+# GATT traffic per button press, GamePad to GamePadServer on the simulator
+
+import asyncio
+
+import aioble
+import bluetooth
+import pytest
+
+import sim
+from sim.bench import wait_until
+import gamepad_receiver
+from gamepad_protocol import BUTTON_UP, BUTTON_INDEX
+from gamepad_receiver import EDGE_DOWN, EDGE_UP
+
+PRESSES = 10
+UP = BUTTON_INDEX["Up"]
+
+
+async def press_up(pad, server):
+    """
+    Presses and lets go of Up with a bouncing contact.
+
+    Returns:
+        list: (button, edge) of every event the server queued.
+    """
+    server.events.clear()
+    up = pad.pin(8)
+    for _ in range(PRESSES):
+        await up.play(sim.machine.bounce(0))
+        await wait_until(lambda: server.pressed_mask & BUTTON_UP)
+        await asyncio.sleep(0.05)
+        await up.play(sim.machine.bounce(1))
+        await wait_until(lambda: not server.pressed_mask & BUTTON_UP)
+        await asyncio.sleep(0.05)
+    events = []
+    server.events.drain(lambda button, edge, remote_ms, local_ms: events.append((button, edge)))
+    return events
+
+
+def test_one_notification_per_edge_and_no_reads(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        pad = pair.pad
+        assert server.notifying
+        link = server.connection._link
+        gatt_ops = link.gatt_ops
+        notifications = link.notifications
+        events = await press_up(pad, server)
+        # A press and a release each, nothing else on the air
+        assert link.notifications - notifications == 2 * PRESSES
+        assert link.gatt_ops - gatt_ops == 0
+        assert events == [(UP, EDGE_DOWN), (UP, EDGE_UP)] * PRESSES
+
+    asyncio.run(run())
+
+
+def test_read_fallback_polls(gamepad_pair, monkeypatch):
+    pair = gamepad_pair()
+    # A remote whose button characteristic can't notify
+    monkeypatch.setattr(gamepad_receiver, "_FLAG_NOTIFY", 0)
+
+    async def run():
+        _, server = await pair.connect()
+        pad = pair.pad
+        assert not server.notifying
+        link = server.connection._link
+        gatt_ops = link.gatt_ops
+        events = await press_up(pad, server)
+        reads = link.gatt_ops - gatt_ops
+        assert events == [(UP, EDGE_DOWN), (UP, EDGE_UP)] * PRESSES
+        # Polling keeps the link busy whether or not anything changed
+        assert reads > 4 * PRESSES
+
+    asyncio.run(run())
+
+
+def test_changed_layout_is_rediscovered(gamepad_pair, capsys):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        pad = pair.pad
+        cached = dict(server.handles)
+        with pad:
+            import aioble
+            # New firmware with a service in front of the gamepad's shifts every handle
+            extra = aioble.Service(bluetooth.UUID(0x181A))
+            spare = aioble.Characteristic(extra, bluetooth.UUID(0x2A6E), read=True, write=True, notify=True)
+            aioble.register_services(extra, *pad.ble.services)
+        spare_cccd = pad.ble.attributes[spare._end_handle]
+        await server.connection.disconnect()
+        await wait_until(lambda: server.connected and server.handles and server.handles != cached)
+        assert "Cached handles are stale" in capsys.readouterr().out
+        # The stale CCCD handle now belongs to the new service and was never written
+        assert not spare_cccd.values
+        assert spare.read() == b""
+        events = await press_up(pad, server)
+        assert events == [(UP, EDGE_DOWN), (UP, EDGE_UP)] * PRESSES
+
+    asyncio.run(run())
+
+
+def notifying_value(service):
+    # A characteristic whose value a looser check would take for a format
+    return aioble.Characteristic(service, bluetooth.UUID(0x2A19), read=True, notify=True, initial=b"\x00\x00")
+
+
+def notifying_spare(service):
+    return aioble.Characteristic(service, bluetooth.UUID(0x2A6E), read=True, write=True, notify=True)
+
+
+def plain(service):
+    return aioble.Characteristic(service, bluetooth.UUID(0x2A19), read=True, write=True)
+
+
+# New firmware layouts that put, at the cached format handle (6):
+# another characteristic's 2-byte value, with a CCCD at the cached CCCD handle (4),
+# or a CCCD, which reads 0x0000 on a new connection
+@pytest.mark.parametrize("layout", [(notifying_spare, notifying_value), (plain, notifying_spare)])
+def test_stale_handles_fail_the_format_read(gamepad_pair, capsys, layout):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        pad = pair.pad
+        (entry,) = server.handles.values()
+        assert entry[7] == 6 and entry[5] == 4
+        with pad:
+            extra = aioble.Service(bluetooth.UUID(0x181A))
+            spares = [make(extra) for make in layout]
+            aioble.register_services(extra, *pad.ble.services)
+        cccds = [pad.ble.attributes[spare._end_handle] for spare in spares if spare.can_notify]
+        await pair.reconnect()
+        # Caught by the read, before anything was written
+        assert "Cached handles are stale, rediscovering: format characteristic read" in capsys.readouterr().out
+        assert all(not cccd.values for cccd in cccds)
+        assert all(spare.read() in (b"", b"\x00\x00") for spare in spares)
+        events = await press_up(pad, server)
+        assert events == [(UP, EDGE_DOWN), (UP, EDGE_UP)] * PRESSES
+
+    asyncio.run(run())
+
+
+def test_pad_without_format_is_not_cached(gamepad_pair, capsys):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        pad = pair.pad
+        # Older firmware: nothing only the gamepad's own attributes would return
+        (service,) = pad.ble.services
+        service.characteristics.remove(pair.gamepad.format_characteristic)
+        with pad:
+            aioble.register_services(service)
+        await pair.reconnect()
+        assert server.handles == {}
+        capsys.readouterr()
+        # Every connection discovers the service again
+        assert await pair.reconnect() > 3
+        assert "Cached handles" not in capsys.readouterr().out
+        events = await press_up(pad, server)
+        assert events == [(UP, EDGE_DOWN), (UP, EDGE_UP)] * PRESSES
+
+    asyncio.run(run())
+
+
+def test_disconnect_is_not_an_error(gamepad_pair, capsys):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        for _ in range(3):
+            await pair.reconnect()
+        events = await press_up(pair.pad, server)
+        assert events == [(UP, EDGE_DOWN), (UP, EDGE_UP)] * PRESSES
+
+    asyncio.run(run())
+    assert "Error" not in capsys.readouterr().out
+
+
+def test_failed_cleanup_keeps_reading(gamepad_pair, capsys, monkeypatch):
+    pair = gamepad_pair()
+
+    async def run():
+        gamepad, server = await pair.connect()
+        pad = pair.pad
+        connection = server.connection
+
+        def broken(value):
+            raise ValueError("bad report")
+
+        async def gone(timeout_ms=2000):
+            raise aioble.DeviceDisconnectedError()
+
+        # A report that can't be handled, on a link that is already going away
+        monkeypatch.setattr(server.decoder, "decode", broken)
+        monkeypatch.setattr(connection, "disconnect", gone)
+        await pad.pin(8).play(sim.machine.bounce(0))
+        await wait_until(lambda: "Error while disconnecting" in capsys.readouterr().out)
+        monkeypatch.undo()
+
+        await pair.reconnect()
+        await pad.pin(8).play(sim.machine.bounce(1))
+        # Let the pad settle on the release, or the next press cuts it short
+        # and the debouncer rightly drops it
+        await wait_until(lambda: not gamepad.pressed)
+        events = await press_up(pad, server)
+        assert events == [(UP, EDGE_DOWN), (UP, EDGE_UP)] * PRESSES
+
+    asyncio.run(run())
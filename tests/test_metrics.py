@@ -0,0 +1,89 @@
+# Metrics: counters, histograms, packing and the connection update hook
+
+import asyncio
+import struct
+
+import metrics
+import sim
+from sim.bench import wait_until
+from gamepad_protocol import BUTTON_UP
+
+
+def test_counter_indices_match_names():
+    for index, name in enumerate(metrics.COUNTER_NAMES):
+        assert getattr(metrics, name.upper()) == index
+    for index, name in enumerate(metrics.HISTOGRAM_NAMES):
+        assert getattr(metrics, name[:-len("_us")].upper()) == index
+    # Added after the diagnostics layout was first published, so it goes last
+    assert metrics.REPORTS_DROPPED == len(metrics.COUNTER_NAMES) - 1
+    assert len(metrics.counters) == len(metrics.COUNTER_NAMES)
+
+
+def test_histogram_bucket_boundaries():
+    bounds = metrics.BUCKETS_US
+    for bound in bounds:
+        # Each bound is the top of its own bucket
+        metrics.observe(metrics.OLED_SHOW, bound)
+        metrics.observe(metrics.OLED_SHOW, bound + 1)
+    metrics.observe(metrics.OLED_SHOW, -5)
+    histogram = metrics.snapshot()["histograms"]["oled_show_us"]
+    buckets = histogram["buckets"]
+    assert len(buckets) == len(bounds) + 1
+    # -5 counts as 0, in the first bucket; every bound + 1 lands one bucket up
+    assert buckets == [2] * len(bounds) + [1]
+    assert histogram["count"] == 2 * len(bounds) + 1
+    assert histogram["max"] == bounds[-1] + 1
+    # Other histograms are untouched
+    assert metrics.snapshot()["histograms"]["loop_lag_us"]["count"] == 0
+
+
+def test_pack_layout():
+    for index in range(len(metrics.COUNTER_NAMES)):
+        metrics.record(index, 0x01020304 * (index + 1))
+    packed = metrics.pack()
+    assert len(packed) == 4 * len(metrics.COUNTER_NAMES)
+    assert list(struct.unpack(f"<{len(metrics.COUNTER_NAMES)}L", packed)) == list(metrics.counters)
+    offset = 4 * metrics.REPORTS_DROPPED
+    assert packed[offset:offset + 4] == bytes((0x2C, 0x21, 0x16, 0x0B))
+
+    # A buffer handed in is filled in place
+    metrics.count(metrics.EVENTS_SENT)
+    again = metrics.pack(packed)
+    assert again is packed
+    assert packed[:4] == struct.pack("<L", 0x01020305)
+
+
+def test_connection_update_is_parsed():
+    metrics.enable()
+    metrics.watch_connection()
+    # conn_handle, interval in 1.25 ms units, latency, timeout in 10 ms units, status
+    sim.aioble.core.dispatch(27, (0, 6, 2, 400, 0))
+    counters = metrics.snapshot()["counters"]
+    assert counters["conn_updates"] == 1
+    assert counters["conn_interval_us"] == 7500
+    assert counters["conn_latency"] == 2
+    assert counters["supervision_timeout_ms"] == 4000
+
+    # A failed update and other events change nothing
+    sim.aioble.core.dispatch(27, (0, 24, 0, 100, 0x3B))
+    sim.aioble.core.dispatch(3, (0, 1, bytes(6)))
+    assert metrics.snapshot()["counters"] == counters
+
+
+def test_disabled_records_nothing(gamepad_pair):
+    pair = gamepad_pair()
+    metrics.watch_connection()
+
+    async def run():
+        _, server = await pair.connect()
+        probe = asyncio.create_task(metrics.lag_probe())
+        sim.aioble.core.dispatch(27, (0, 6, 0, 400, 0))
+        await pair.pad.pin(8).play(sim.machine.bounce(0))
+        await wait_until(lambda: server.pressed_mask & BUTTON_UP)
+        await pair.reconnect()
+        probe.cancel()
+
+    asyncio.run(run())
+    snapshot = metrics.snapshot()
+    assert not any(snapshot["counters"].values())
+    assert not any(histogram["count"] for histogram in snapshot["histograms"].values())
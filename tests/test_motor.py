@@ -0,0 +1,155 @@
+# Motor pin writes and MotorRamp slewing, from the simulator's pin recordings
+
+import asyncio
+
+import pytest
+
+import sim
+from sim.bench import wait_until
+from motor import Motor, MotorRamp, SPEED_STEPS, DUTY
+
+
+@pytest.fixture
+def board():
+    return sim.Board("robot")
+
+
+def make_motor(board):
+    with board:
+        return Motor(6, 7)
+
+
+def signed_steps(motor):
+    """
+    Replays the recorded in1 and in2 writes into the speeds the motor was driven at.
+
+    Returns:
+        list: Signed speed in steps after every duty write.
+    """
+    writes = [(t, 0, level) for t, level in motor.in1.history]
+    writes += [(t, 1, duty) for t, duty in motor.in2.history]
+    writes.sort()
+    direction = 1
+    steps = []
+    for _, pin, value in writes:
+        if pin == 0:
+            direction = value
+        else:
+            step = round(value * SPEED_STEPS / 65535)
+            steps.append(step if direction else -step)
+    return steps
+
+
+def test_repeated_speed_writes_once(board):
+    motor = make_motor(board)
+    for _ in range(100):
+        motor.speed(0.5)
+    # One direction write and one duty write, the other 99 calls are elided
+    assert motor.in1.writes + motor.in2.writes == 2
+
+
+def test_repeated_drive_writes_once(board):
+    with board:
+        from burgerbot import Burgerbot
+        bot = Burgerbot()
+        for _ in range(100):
+            bot.drive(0.5, 0.5)
+    for motor in bot.motors:
+        assert motor.in1.writes + motor.in2.writes == 2
+
+
+def test_reversal_ramps_through_zero(board):
+    motor = make_motor(board)
+    ramp = MotorRamp([motor], accel=10.0)
+
+    async def run():
+        task = asyncio.create_task(ramp.task())
+        await asyncio.sleep(0)
+        motor.speed(1.0)
+        await asyncio.sleep(0.3)
+        assert motor.step == SPEED_STEPS
+        motor.speed(-1.0)
+        await asyncio.sleep(0.3)
+        assert motor.step == -SPEED_STEPS
+        task.cancel()
+
+    asyncio.run(run())
+    steps = signed_steps(motor)
+    assert steps[-1] == -SPEED_STEPS
+    reversal = steps[steps.index(SPEED_STEPS):]
+    assert len(reversal) > 2 * SPEED_STEPS // ramp.accel_steps
+    assert 0 in reversal
+    for previous, step in zip(reversal, reversal[1:]):
+        assert abs(step - previous) <= ramp.accel_steps
+        # Never straight from one direction to the other
+        assert previous * step >= 0
+
+
+def test_no_writes_while_idle(board):
+    motor = make_motor(board)
+    ramp = MotorRamp([motor], accel=10.0)
+
+    async def run():
+        task = asyncio.create_task(ramp.task())
+        await asyncio.sleep(0)
+        motor.speed(0.5)
+        await asyncio.sleep(0.2)
+        writes = motor.in1.writes + motor.in2.writes
+        for _ in range(20):
+            motor.speed(0.5)
+            await asyncio.sleep(0.01)
+        assert motor.in1.writes + motor.in2.writes == writes
+        task.cancel()
+
+    asyncio.run(run())
+
+
+def test_duty_table():
+    assert len(DUTY) == SPEED_STEPS + 1
+    assert DUTY[0] == 0
+    assert DUTY[SPEED_STEPS] == 65535
+    assert all(a < b for a, b in zip(DUTY, DUTY[1:]))
+    for step in range(SPEED_STEPS + 1):
+        assert DUTY[step] == int(step / SPEED_STEPS * 65535)
+
+
+def test_default_reversal_rate(board):
+    motor = make_motor(board)
+    ramp = MotorRamp([motor])
+
+    async def run():
+        task = asyncio.create_task(ramp.task())
+        await asyncio.sleep(0)
+        motor.speed(1.0)
+        await wait_until(lambda: motor.step == SPEED_STEPS)
+        motor.in2.history.clear()
+        motor.speed(-1.0)
+        await wait_until(lambda: motor.step == -SPEED_STEPS)
+        task.cancel()
+
+    asyncio.run(run())
+    # Full forward to full reverse at 4 speeds per second: one duty write per
+    # 10 ms period, 0.5 s apart from the first to the last, plus wake-up lateness
+    writes = motor.in2.history
+    assert len(writes) == 2 * SPEED_STEPS // ramp.accel_steps
+    assert 0.48 <= (writes[-1][0] - writes[0][0]) / 1_000_000 < 0.75
+
+
+def test_stopping_is_not_ramped(board):
+    motor = make_motor(board)
+    ramp = MotorRamp([motor], accel=1.0)
+
+    async def run():
+        task = asyncio.create_task(ramp.task())
+        await asyncio.sleep(0)
+        motor.speed(0.5)
+        await asyncio.sleep(0.6)
+        assert motor.step == SPEED_STEPS // 2
+        motor.stop()
+        assert motor.step == 0
+        assert motor.in2.duty_u16() == 0
+        motor.brake()
+        assert motor.in1.value() == 1 and motor.in2.duty_u16() == 65535
+        task.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,117 @@
+# Connection profiles: the planned reconnect at the gamepad's interval
+
+import asyncio
+
+import pytest
+
+import sim
+from sim.bench import wait_until
+from gamepad_protocol import PROFILES
+
+
+@pytest.fixture
+def radio():
+    """
+    A radio slower than every profile, so a profile's interval always shows.
+    """
+    return sim.Radio(interval_ms=30, seed=1)
+
+
+def test_profile_reconnect_is_not_an_error(gamepad_pair, capsys):
+    pair = gamepad_pair()
+    interval_us = PROFILES["racing"][0]
+
+    async def run():
+        gamepad, server = await pair.connect("racing")
+        await wait_until(lambda: server.notifying and server.conn_interval_us == interval_us)
+        assert server.connection._link.interval_ms == interval_us / 1000
+        return gamepad
+
+    gamepad = asyncio.run(run())
+    assert gamepad.connections == 2
+    output = capsys.readouterr().out
+    assert f"Reconnecting with a {interval_us} us connection interval" in output
+    assert "Error" not in output
+
+
+async def restart(pair, profile):
+    """
+    Restarts the pad with another profile while the robot keeps its cached handles.
+    """
+    pair.start_pad(profile)
+    server = pair.server
+    connection = server.connection
+    await connection.disconnect()
+    await wait_until(lambda: server.connection is not connection and server.notifying)
+
+
+def test_profile_added_after_caching(gamepad_pair, capsys):
+    pair = gamepad_pair()
+    interval_us = PROFILES["racing"][0]
+
+    async def run():
+        _, server = await pair.connect()
+        assert server.profiles == {}
+
+        await restart(pair, "racing")
+        await wait_until(lambda: server.notifying and server.conn_interval_us == interval_us)
+        assert f"Reconnecting with a {interval_us} us connection interval" in capsys.readouterr().out
+        assert server.connection._link.interval_ms == interval_us / 1000
+        assert list(server.profiles.values()) == [PROFILES["racing"]]
+
+        # Already at its interval, so the next reconnect doesn't read the PPCP again.
+        # Format read and write, then the CCCD write
+        assert await pair.reconnect() == 3
+
+    asyncio.run(run())
+
+
+def test_reconnect_without_profile_skips_discovery(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        for _ in range(3):
+            # Format read and write, then the CCCD write; no PPCP lookup
+            assert await pair.reconnect() == 3
+        assert server.profiles == {}
+        assert server.conn_interval_us == 0
+
+    asyncio.run(run())
+
+
+def test_profile_changed_while_cached(gamepad_pair, capsys):
+    pair = gamepad_pair()
+    racing, battery = PROFILES["racing"][0], PROFILES["battery"][0]
+
+    async def run():
+        _, server = await pair.connect("racing")
+        await wait_until(lambda: server.notifying and server.conn_interval_us == racing)
+        await restart(pair, "battery")
+        await wait_until(lambda: server.notifying and server.conn_interval_us == battery)
+        assert server.connection._link.interval_ms == battery / 1000
+        assert list(server.profiles.values()) == [PROFILES["battery"]]
+        assert await pair.reconnect() == 3
+
+    asyncio.run(run())
+    output = capsys.readouterr().out
+    # The format characteristic reads a new profile code, so the cached handles go
+    assert "Cached handles are stale, rediscovering: format characteristic read" in output
+    assert f"Reconnecting with a {battery} us connection interval" in output
+
+
+def test_profile_removed_while_cached(gamepad_pair, capsys):
+    pair = gamepad_pair()
+    racing = PROFILES["racing"][0]
+
+    async def run():
+        _, server = await pair.connect("racing")
+        await wait_until(lambda: server.notifying and server.conn_interval_us == racing)
+        await restart(pair, None)
+        await wait_until(lambda: server.notifying and server.conn_interval_us == 0)
+        assert server.connection._link.interval_ms == 30
+        assert server.profiles == {}
+        assert await pair.reconnect() == 3
+
+    asyncio.run(run())
+    assert "Reconnecting with the default connection interval" in capsys.readouterr().out
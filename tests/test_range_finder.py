@@ -0,0 +1,127 @@
+# RangeFinder against the simulator's ultrasonic sensor
+
+import asyncio
+
+import pytest
+
+import metrics
+import sim
+from burgerbot import RangeFinder, MM_PER_US, FILTER_EMA
+
+
+@pytest.fixture
+def board():
+    return sim.Board("robot")
+
+
+def make_range_finder(board, **sensor):
+    with board:
+        finder = RangeFinder(trigger_pin=0, echo_pin=1)
+    sensor = sim.machine.Ultrasonic(board.pin(0), board.pin(1), seed=1, **sensor)
+    return finder, sensor
+
+
+def sample_for(finder, seconds, during=None):
+    async def run():
+        task = asyncio.create_task(finder.sample_task(period_ms=20))
+        probe = asyncio.create_task(metrics.lag_probe())
+        if during is None:
+            await asyncio.sleep(seconds)
+        else:
+            await during()
+        task.cancel()
+        probe.cancel()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+
+def test_jittery_echoes_stay_within_tolerance(board):
+    jitter_us = 100
+    finder, sensor = make_range_finder(board, distance_cm=50, jitter_us=jitter_us)
+    sample_for(finder, 0.5)
+    assert sensor.triggers >= 10
+    assert finder.timeouts == 0
+    assert finder.value == pytest.approx(500, abs=jitter_us * MM_PER_US + 1)
+    assert not finder.running
+
+
+def test_missing_echoes_count_as_timeouts(board):
+    finder, sensor = make_range_finder(board, distance_cm=50, missing=1.0)
+    metrics.enable()
+    metrics.reset()
+    sample_for(finder, 0.5)
+    assert sensor.triggers >= 10
+    # The last measurement may have been cut short by the cancel
+    assert sensor.triggers - 1 <= finder.timeouts <= sensor.triggers
+    assert finder.value is None
+    # Waiting for an echo that never comes doesn't block the event loop. A
+    # blocking wait holds up about half the probes by over 10 ms; the host
+    # only does that now and then
+    lag = metrics.snapshot()["histograms"][metrics.HISTOGRAM_NAMES[metrics.LOOP_LAG]]
+    late = sum(lag["buckets"][metrics.BUCKETS_US.index(10_000) + 1:])
+    assert lag["count"] >= 40
+    assert late <= lag["count"] // 10
+
+
+def test_out_of_range_echo_is_a_timeout(board):
+    finder, sensor = make_range_finder(board, distance_cm=500)
+    sample_for(finder, 0.3)
+    assert sensor.triggers - 1 <= finder.timeouts <= sensor.triggers
+    assert finder.value is None
+
+
+def test_distance_is_cached_while_sampling(board):
+    finder, sensor = make_range_finder(board, distance_cm=30)
+
+    async def during():
+        await asyncio.sleep(0.2)
+        assert finder.running
+        triggers = sensor.triggers
+        readings = [finder.distance for _ in range(100)]
+        # No measurement of its own, just the latest filtered value
+        assert sensor.triggers == triggers
+        assert readings == [finder.value] * 100
+        # Host scheduling can stretch an echo edge by a few us
+        assert finder.value == pytest.approx(300, abs=3)
+
+    sample_for(finder, 0, during)
+
+
+def test_distance_measures_when_not_sampling(board):
+    finder, sensor = make_range_finder(board, distance_cm=30)
+    assert finder.distance == pytest.approx(300, abs=1)
+    assert sensor.triggers == 1
+
+
+def width_us(mm):
+    return int(mm / MM_PER_US)
+
+
+def test_median_drops_an_outlier(board):
+    with board:
+        finder = RangeFinder(window=5)
+    for mm in (300, 302, 1500, 298, 301):
+        finder._add(width_us(mm))
+    # A stray echo off something further away doesn't move the reading
+    assert finder.value == pytest.approx(300, abs=2)
+    # The window only remembers the last five
+    for _ in range(3):
+        finder._add(width_us(600))
+    assert finder.value == pytest.approx(600, abs=1)
+
+
+def test_ema_smooths_a_step(board):
+    with board:
+        finder = RangeFinder(filter=FILTER_EMA, alpha=64)
+    finder._add(width_us(300))
+    # The first reading is taken as it is
+    assert finder.value == pytest.approx(300, abs=1)
+    readings = []
+    for _ in range(20):
+        finder._add(width_us(600))
+        readings.append(finder.value)
+    # A quarter of the way there after one reading, then closing in steadily
+    assert readings[0] == pytest.approx(375, abs=2)
+    assert readings == sorted(readings)
+    assert readings[-1] == pytest.approx(600, abs=3)
@@ -0,0 +1,57 @@
+# Reconnecting to the last gamepad, against scanning for it
+
+import asyncio
+
+import sim
+from sim.bench import wait_until
+import gamepad_receiver
+from gamepad_protocol import BUTTON_UP
+
+
+def test_direct_reconnect_skips_an_advertising_event(gamepad_pair):
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+
+        async def reconnect(forget):
+            if forget:
+                server.peer = None
+            dropped = server.connection
+            advertisements = pair.radio.advertisements
+            await dropped.disconnect()
+            await wait_until(lambda: server.connected and server.connection is not dropped)
+            return pair.radio.advertisements - advertisements
+
+        # Straight to the known address, on the first event after the drop
+        assert await reconnect(False) == 1
+        # A scan finds the gamepad on that event and connects on the next one
+        assert await reconnect(True) == 2
+
+    asyncio.run(run())
+
+
+def test_stale_address_falls_back_to_a_scan(gamepad_pair, monkeypatch, capsys):
+    # Quicker to give up, but still longer than the pad's 250 ms advertising interval
+    monkeypatch.setattr(gamepad_receiver, "CONNECT_TIMEOUT_MS", 300)
+    monkeypatch.setattr(gamepad_receiver, "BACKOFF_MIN_MS", 20)
+    pair = gamepad_pair()
+
+    async def run():
+        _, server = await pair.connect()
+        old = server.peer
+        # The pad comes back under another address, so the last one never answers
+        pair.stop_pad()
+        await wait_until(lambda: not server.connected)
+        pair.pad = sim.Board("new pad", pair.radio)
+        pair.start_pad()
+        await wait_until(lambda: server.notifying and server.peer != old)
+        assert bytes(server.peer.addr) == pair.pad.addr
+        await pair.pad.pin(8).play(sim.machine.bounce(0))
+        await wait_until(lambda: server.pressed_mask & BUTTON_UP)
+
+    asyncio.run(run())
+    output = capsys.readouterr().out
+    attempts = gamepad_receiver.RECONNECT_ATTEMPTS
+    assert f"Reconnect attempt {attempts} failed" in output
+    assert f"Reconnect attempt {attempts + 1}" not in output
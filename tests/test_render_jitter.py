@@ -0,0 +1,97 @@
+# Button scan loop jitter with the OLED render task running
+
+import asyncio
+import random
+import time
+
+import sim
+from sim.bench import percentile
+
+STORM_S = 1.0
+PINS = (8, 9, 6, 7)  # Up, Down, A, B
+
+
+async def storm(pad, seed):
+    """
+    Mashes several buttons at random for STORM_S, with contact bounce.
+    """
+    rng = random.Random(seed)
+
+    async def mash(pin):
+        level = 1
+        end = time.monotonic() + STORM_S
+        while time.monotonic() < end:
+            level = 1 - level
+            await pin.play(sim.machine.bounce(level))
+            await asyncio.sleep(rng.uniform(0.01, 0.04))
+        await pin.play(sim.machine.bounce(1))
+
+    await asyncio.gather(*(mash(pad.pin(pin)) for pin in PINS))
+
+
+def scan_lateness(render, pair):
+    """
+    Runs monitor_buttons through a press storm.
+
+    Returns:
+        tuple[list, list]: How late each debounce sample came after the one
+        before it, in ms, and the simulated I2C bus time of each frame drawn, in ms.
+    """
+    async def run():
+        gamepad = pair.start_pad(run=False)
+        with pair.pad:
+            events = gamepad.button_events
+            sample = events._sample
+            samples = []
+
+            def timed():
+                # Only samples taken sample_ms after the previous one count
+                following = events._active
+                samples.append((time.monotonic(), following))
+                return sample()
+
+            events._sample = timed
+            screen = gamepad.screen
+            i2c = screen.oled.i2c
+            draw = screen.render
+            bus_ms = []
+
+            def measured():
+                # What the transfers sleep for, whatever the host's scheduling
+                sent = i2c.bytes + i2c.transactions
+                draw()
+                sent = i2c.bytes + i2c.transactions - sent
+                bus_ms.append(9 * sent / i2c.freq * 1000)
+
+            screen.render = measured
+            tasks = [asyncio.create_task(gamepad.monitor_buttons())]
+            if render:
+                tasks.append(asyncio.create_task(gamepad.screen.render_task()))
+        await asyncio.sleep(0.1)
+        samples.clear()
+        bus_ms.clear()
+        await storm(pair.pad, seed=1)
+        for task in tasks:
+            task.cancel()
+        lateness = []
+        for (previous, _), (now, following) in zip(samples, samples[1:]):
+            if following:
+                lateness.append((now - previous) * 1000 - events.sample_ms)
+        return lateness, bus_ms
+
+    return asyncio.run(run())
+
+
+def test_render_task_keeps_scan_jitter_bounded(gamepad_pair):
+    alone, frames = scan_lateness(False, gamepad_pair())
+    assert frames == []
+    rendering, frames = scan_lateness(True, gamepad_pair(sim.Radio(seed=1)))
+    assert len(alone) > 100 and len(rendering) > 100
+    # A frame only redraws the changed lines, so it holds a sample up by a
+    # few ms of bus time at most
+    assert max(frames) < 5
+    # and most samples aren't held up at all. Host scheduling noise swamps
+    # the tail on both runs, so only the medians are compared
+    assert percentile(rendering, 0.5) < percentile(alone, 0.5) + 1
+    # Every press in the storm is coalesced into at most one frame per frame_ms
+    assert 0 < len(frames) <= STORM_S * 1000 / 50 + 2